@@ -0,0 +1,66 @@
+"""
+    Import time benchmark, guards against regressions of the lazy loading of motupy.
+
+    Each module is imported in a fresh interpreter (python -X importtime) and the script fails (exit code 1) when
+        i) the import takes longer than the time budget, or
+        ii) a heavy dependency that parsing does not need (ete3, scikit-bio, scipy, matplotlib, seaborn, statsmodels, pandas) gets imported.
+
+    usage: python benchmarks/import_time.py [budget in seconds, default 1.0] [repeats, default 5]
+"""
+import subprocess
+import sys
+
+MODULES = ['motupy', 'motupy.dataprocessing']
+HEAVY_MODULES = ['ete3', 'skbio', 'scipy', 'matplotlib', 'seaborn', 'statsmodels', 'pandas']
+
+def import_time(module):
+    """
+    Parameters
+    ------------
+    module: str,
+        name of the module to import
+
+    Returns
+    ------------
+    seconds: float,
+        cumulative import time of the module reported by python -X importtime
+
+    loaded: list [str],
+        heavy modules found in sys.modules after the import
+    """
+    check = 'import sys, %s; print(",".join(m for m in %r if m in sys.modules))'%(module, HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', check], capture_output=True, text=True, check=True)
+
+    seconds = 0.0
+    for line in result.stderr.splitlines():
+        tokens = [t.strip() for t in line.split('|')]
+        if len(tokens) == 3 and tokens[2] == module:
+            seconds = int(tokens[1])/1e6
+    loaded = [m for m in result.stdout.strip().split(',') if m]
+
+    return seconds, loaded
+
+def main(budget=1.0, repeats=5):
+    failed = False
+    for module in MODULES:
+        timings = []
+        for _ in range(repeats):
+            seconds, loaded = import_time(module)
+            timings.append(seconds)
+        best = min(timings)
+
+        print('%s\t%.3fs (best of %s)\theavy modules loaded: %s'%(module, best, repeats, ', '.join(loaded) if loaded else 'none'))
+        if best > budget:
+            print('[REGRESSION] %s takes more than %.3fs to import'%(module, budget))
+            failed = True
+        if loaded:
+            print('[REGRESSION] %s imports %s'%(module, ', '.join(loaded)))
+            failed = True
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    budget = float(arguments[0]) if len(arguments) > 0 else 1.0
+    repeats = int(arguments[1]) if len(arguments) > 1 else 5
+    sys.exit(main(budget, repeats))
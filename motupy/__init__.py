@@ -1,3 +1,27 @@
 from motupy.dataprocessing import *
-from motupy.timeseries import *
-from motupy.utils import *
\ No newline at end of file
+from motupy.dataprocessing import __all__ as _dataprocessing_all
+
+## the analysis and time series tools are loaded lazily, on first use
+import importlib as _importlib
+import sys as _sys
+from motupy._lazy import LazyModule as _LazyModule
+
+_lazy_names = {"timedecay": "motupy.timeseries",
+               "describe": "motupy.utils",
+               "utils": "motupy.utils",
+               "EDA": "motupy.utils",
+               "visualise": "motupy.utils"}
+
+__all__ = list(_dataprocessing_all) + list(_lazy_names)
+
+def __getattr__(name):
+    if name in _lazy_names:
+        value = getattr(_importlib.import_module(_lazy_names[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names))
+
+_sys.modules[__name__].__class__ = _LazyModule ## importing motupy.utils does not hide the utils class
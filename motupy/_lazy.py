@@ -0,0 +1,15 @@
+"""
+    Module class of the packages exporting their names lazily (see motupy.__init__, motupy.utils and motupy.timeseries).
+"""
+import types
+
+class LazyModule(types.ModuleType):
+    """
+    The exported classes have the same names as the submodules defining them (e.g. motupy.utils.describe).
+    Importing such a submodule directly binds the module object to that name in its package, which would then hide the class
+    from the package __getattr__. The binding is skipped for the names of _lazy_names, so they always resolve to the class.
+    """
+    def __setattr__(self, name, value):
+        if isinstance(value, types.ModuleType) and name in self.__dict__.get('_lazy_names', ()):
+            return ## the submodule stays reachable through sys.modules, the name is resolved by __getattr__
+        super().__setattr__(name, value)
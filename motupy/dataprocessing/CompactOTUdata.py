@@ -0,0 +1,134 @@
+"""
+    CompactOTUdata object is an array based, read only copy of an OTUdata for keeping many samples in memory.
+    The data will be stored as sorted numpy arrays {taxids: int32 taxa id, counts: int64 read counts or float32 relative abundance,
+    rank_codes/kingdom_codes: int8 index into BASIC_RANKS/KINGDOMS, -1 for none} instead of a dictionary and eleven sets per sample,
+    and it does not hold a taxonomy backend. otufile, ranks and superkingdom are built from the arrays when asked for.
+"""
+import numpy as np
+from .OTUdata import SUPERKINGDOM_TAXIDS
+from .TaxonomyIndex import BASIC_RANKS
+
+KINGDOMS = list(SUPERKINGDOM_TAXIDS.values())
+
+class CompactOTUdata:
+    __slots__ = ['file_id', 'cumulated', 'clade_relative', 'taxids', 'counts', 'rank_codes', 'kingdom_codes']
+
+    def __init__(self, otudata):
+        """
+        Creates CompactOTUdata object from an OTUdata
+
+        Parameters
+        ------------
+        otudata: OTUdata(),
+            the sample to copy, it can be dropped afterwards
+
+        Returns
+        ------------
+        N/A
+
+        """
+        self.file_id = otudata.file_id
+        self.cumulated = otudata.cumulated
+        self.clade_relative = getattr(otudata, 'clade_relative', False)
+
+        taxids = np.fromiter(otudata.otufile.keys(), dtype=np.int64, count=len(otudata.otufile))
+        counts = np.array(list(otudata.otufile.values()))
+        order = np.argsort(taxids)
+        self.taxids = taxids[order].astype(np.int32)
+        if counts.dtype.kind in 'iub':
+            self.counts = counts[order].astype(np.int64)
+        else:
+            self.counts = counts[order].astype(np.float32)
+
+        self.rank_codes = np.full(len(self.taxids), -1, dtype=np.int8)
+        for code, rank in enumerate(BASIC_RANKS):
+            self.rank_codes[np.isin(self.taxids, list(otudata.ranks[rank]))] = code
+
+        self.kingdom_codes = np.full(len(self.taxids), -1, dtype=np.int8)
+        for code, kingdom in enumerate(KINGDOMS):
+            self.kingdom_codes[np.isin(self.taxids, list(otudata.superkingdom[kingdom]))] = code
+
+    @property
+    def basic_ranks(self):
+        return list(BASIC_RANKS)
+
+    @property
+    def otufile(self):
+        """
+        reads dictionary {key: taxa id, value: read counts/relative abundance}, built on every access (changes to it are not kept)
+        """
+        return dict(zip(self.taxids.tolist(), self.counts.tolist()))
+
+    @property
+    def ranks(self):
+        """
+        dictionary {key: basic rank, value: set of taxa id}, built on every access
+        """
+        return {rank: set(self.taxids[self.rank_codes == code].tolist()) for code, rank in enumerate(BASIC_RANKS)}
+
+    @property
+    def superkingdom(self):
+        """
+        dictionary {key: superkingdom name, value: set of taxa id}, built on every access
+        """
+        return {kingdom: set(self.taxids[self.kingdom_codes == code].tolist()) for code, kingdom in enumerate(KINGDOMS)}
+
+    def get_clade_read_counts(self):
+        """
+        Same as OTUdata.get_clade_read_counts(), summed over the arrays.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        clade_read_counts : dict,
+            a dictionary where key = a taxanomy rank
+                                value = total read counts in the given taxanomy rank.
+        """
+        totals = np.bincount(self.rank_codes[self.rank_codes >= 0], weights=self.counts[self.rank_codes >= 0], minlength=len(BASIC_RANKS))
+        present = np.bincount(self.rank_codes[self.rank_codes >= 0], minlength=len(BASIC_RANKS)) > 0
+        return {rank: totals[code].item() for code, rank in enumerate(BASIC_RANKS) if present[code]}
+
+    def turn_reads_to_clade_relative_abundance(self):
+        """
+        Same as OTUdata.turn_reads_to_clade_relative_abundance(), the OTUdata must have been cumulated before it was copied.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        N/A
+        """
+        if not self.cumulated:
+            print('[ERROR] turn_reads_to_clade_relative_abundance: CompactOTUdata can not be cumulated, run OTUdata.taxa_cumulation() before copying it')
+            return
+        if self.clade_relative:
+            return
+
+        ranked = self.rank_codes >= 0
+        totals = np.bincount(self.rank_codes[ranked], weights=self.counts[ranked], minlength=len(BASIC_RANKS))
+        counts = self.counts.astype(np.float64)
+        counts[ranked] = counts[ranked]/totals[self.rank_codes[ranked]]
+        self.counts = counts.astype(np.float32)
+        self.clade_relative = True
+
+    def select_rank(self, desired_ranks):
+        """
+
+        Parameters
+        ------------
+        desired_ranks : list [str],
+            the desired taxanomy_ranks made up of str
+
+        Returns
+        ------------
+        desired_rank_otufile : dict,
+            the dict file containing taxa id keys from only the desired ranks
+        """
+        codes = [BASIC_RANKS.index(rank.lower()) for rank in desired_ranks]
+        selected = np.isin(self.rank_codes, codes)
+        return dict(zip(self.taxids[selected].tolist(), self.counts[selected].tolist()))
@@ -1,11 +1,15 @@
 """
     GeneData object is for storing and processing single sample of gene data, be it metabolic potential (DNA) or metabolic activity (RNA)
-    The data will be stored as a dictionary {key: Gene ID, value: read counts/relative abundance}
+    The data will be stored as a dictionary {key: Gene ID, value: read counts/relative abundance},
+    or as arrays of gene id codes (of an IdInterner shared e.g. by a GeneNest) and values.
 """
 from .humann2_output import *
+from .compressed_input import strip_compression_extension
+from .StratifiedGeneTable import StratifiedGeneTable
+import numpy as np
 
 class GeneData:
-    def __init__(self, file_loc, input_type, verbose=0, extension=None):
+    def __init__(self, file_loc, input_type, verbose=0, extension=None, numeric=False, stratified=False, genes=None, gene_ids=None, gene_pattern=None):
         """
         Creates OTUdata object for manipulation/transformation
 
@@ -17,6 +21,20 @@ class GeneData:
         input_type: str,
             what type of taxa profiling tool was used to generate the file, "E.g. Humann2"
 
+        numeric: boolean,
+            if True the abundances are parsed into float, otherwise they are kept as the strings of the file
+
+        stratified: boolean,
+            if True the stratified rows ('gene|taxa') are also read, into self.stratified (a one sample StratifiedGeneTable, float32 values),
+            otherwise they are skipped and self.stratified is None
+
+        genes: IdInterner(),
+            gene id code table, if given the gene id are interned as they are read and the sample is kept as
+            self.gene_codes (int32) and self.values instead of self.genefile (None), the stratified rows use the same table
+
+        gene_ids, gene_pattern:
+            gene id allow-list and regular expression, applied while the file is read, see humann2_output.stream_h2_rows()
+
         Returns
         ------------
         N/A
@@ -25,6 +43,10 @@ class GeneData:
 
         self.file_id = ''
         self.verbose = verbose
+        self.stratified = None
+        self.genefile = None
+        self.gene_codes = None
+        self.values = None
 
         if extension is None:
             self.file_id = self.process_file_name(file_loc)
@@ -33,8 +55,52 @@ class GeneData:
 
         if input_type.lower()  not in ['humann2']:
             print("[ERROR] only 'humann2_mergedgenefamilies input type supported")
-        if input_type.lower() == 'humann2':
-            self.genefile = read_h2(file_loc)
+        if input_type.lower() == 'humann2' and not stratified and genes is None:
+            self.genefile = dict(stream_h2(file_loc, numeric, gene_ids, gene_pattern))
+        elif input_type.lower() == 'humann2':
+            self.read_rows(file_loc, numeric, stratified, genes, gene_ids, gene_pattern)
+
+    def read_rows(self, file_loc, numeric=False, stratified=False, genes=None, gene_ids=None, gene_pattern=None):
+        """
+        Reads the file in one pass, the unstratified rows into self.genefile (or self.gene_codes/self.values if genes is given)
+        and the stratified rows into self.stratified. Genes and taxa are interned as they are read, so each distinct string is held once.
+
+        Parameters
+        ------------
+        file_loc: str,
+            location/file name of the humann2 output file
+
+        numeric, stratified, genes, gene_ids, gene_pattern:
+            see __init__()
+
+        Returns
+        ------------
+        N/A
+        """
+        if genes is None:
+            self.genefile = {}
+        gene_codes, values = [], []
+        if stratified:
+            self.stratified = StratifiedGeneTable(genes=genes)
+        stratified_gene_codes, taxon_codes, stratified_values = [], [], []
+        for gene, taxon, value in stream_h2_rows(file_loc, numeric, gene_ids, gene_pattern):
+            if taxon is None:
+                if genes is None:
+                    self.genefile[gene] = value
+                else:
+                    gene_codes.append(genes.intern(gene))
+                    values.append(value)
+            elif stratified:
+                stratified_gene_codes.append(self.stratified.genes.intern(gene))
+                taxon_codes.append(self.stratified.taxa.intern(taxon))
+                stratified_values.append(float(value))
+
+        if genes is not None:
+            self.gene_codes = np.array(gene_codes, dtype=np.int32)
+            self.values = np.array(values, dtype=np.float32 if numeric else object)
+        if stratified:
+            self.stratified.add_coded_sample(self.file_id, np.array(stratified_gene_codes, dtype=np.int32), np.array(taxon_codes, dtype=np.int32), np.array(stratified_values, dtype=np.float32))
+            if self.verbose >= 1 : print('[STRATIFIED ROWS] %s rows in %s taxa'%(len(stratified_values), len(self.stratified.taxa)))
 
 
     def process_file_name(self, file_loc):
@@ -65,7 +131,7 @@ class GeneData:
             the name/location of the file being processed
         
         ext : str,
-            the known/desired extension used to cut off the name for the id generation
+            the known/desired extension used to cut off the name for the id generation, a compression extension (.gz/.bz2/.xz) after it is also cut off
 
         Returns
         ------------
@@ -74,6 +140,6 @@ class GeneData:
         """
         slash_split = file_loc.split('/')
         slash_split = slash_split[-1]
-        id_name = slash_split.replace(ext, '')
+        id_name = strip_compression_extension(slash_split.replace(ext, '')) ## e.g. sample1.out.gz gives sample1 with ext '.out' or '.out.gz'
         
         return id_name
\ No newline at end of file
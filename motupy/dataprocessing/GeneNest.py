@@ -1,10 +1,16 @@
 """
     GeneNest object is for storing and processing multiple sample of gene data.
-    The data will be stored as a dictionary {key: sample_ID, value: GeneData object}
+    The data will be stored as a dictionary {key: sample_ID, value: (gene id codes, values) arrays of the sample},
+    the gene id strings are held once for the whole nest in an IdInterner (self.genes) and the matrix is aligned on their int32 codes.
+    to_dict()/get_genefile() give the samples back in the former {sample_ID: {gene id: value}} layout.
+    The columns of every matrix/dataframe of the nest are the gene id in sorted order.
 """
-import pandas as pd 
+import numpy as np
 from .GeneData import GeneData
-import os 
+from .StratifiedGeneTable import StratifiedGeneTable
+from .IdInterner import IdInterner
+from .SampleCache import pack_gene_sample, unpack_gene_sample
+import os
 
 class GeneNest:
     def __init__(self, verbose = 0):
@@ -19,11 +25,15 @@ class GeneNest:
         ------------
         N/A
 
-        """ 
+        """
         self.verbose = verbose
+        self.numeric = False
         self.nest = {}
+        self.genes = IdInterner()
+        self.store = None
+        self.stratified = None
 
-    def build_from_folder(self, input_folder, input_type, extension=None):
+    def build_from_folder(self, input_folder, input_type, extension=None, numeric=False, n_jobs=1, cache=None, store=None, stratified=False, gene_ids=None, gene_pattern=None):
         """
         Creates OTUnest object for manipulation/transformation
 
@@ -35,34 +45,253 @@ class GeneNest:
         input_type: str,
             what type of taxa profiling tool was used to generate the file, "E.g. Kaiju"
 
+        numeric: boolean,
+            if True the abundances are parsed into float and to_dataframe() gives a float32 matrix (NaN where a sample lacks a gene),
+            otherwise they are kept as the strings of the files
+
+        n_jobs: int,
+            number of worker processes reading the files, 1 reads them in this process.
+            The samples are added to the nest in the same order as with n_jobs=1.
+
+        cache: SampleCache(),
+            on-disk cache of parsed samples, files unchanged since they were cached (with the same parameters) are loaded from it
+
+        store: MatrixStore(),
+            out-of-core storage for cohorts that do not fit in memory, the samples are written into the store as they are read
+            instead of being kept in self.nest, and the store is returned instead of a dataframe
+
+        stratified: boolean,
+            if True the stratified rows ('gene|taxa') of every sample are also read, into self.stratified
+            (a StratifiedGeneTable of (sample, gene, taxon, value) codes), the returned table is still the unstratified one
+
+        gene_ids: list/set [str],
+            only these gene id are kept, the rows of other genes are skipped while the files are read
+
+        gene_pattern: str,
+            regular expression (re.search) the kept gene id have to match, applied while the files are read
+
         Returns
         ------------
         N/A
 
-        """ 
+        """
         self.nest = {}
+        self.genes = IdInterner()
+        self.numeric = numeric
+        self.store = store
+        self.stratified = StratifiedGeneTable(genes=self.genes) if stratified else None
 
         files = [f for f in os.listdir(input_folder) if extension in f]
-        files_dir = [input_folder+'/'+f for f in files]
-        for f, n in zip(files_dir, files):
-            if self.verbose>=1 : print(n)
-            tmpGeneData = GeneData(f, input_type, self.verbose, extension)
-            
-            self.nest[tmpGeneData.file_id] = tmpGeneData.genefile
+        if gene_ids is not None:
+            gene_ids = frozenset(gene_ids)
+        tasks = [(input_folder+'/'+f, input_type, extension, numeric, stratified, gene_ids, gene_pattern, cache) for f in files]
+
+        if n_jobs > 1 and len(tasks) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                for sample in executor.map(build_gene_sample, tasks, chunksize=max(1, len(tasks)//(n_jobs*4))):
+                    self.add_sample(*sample)
+        else:
+            for task in tasks:
+                if self.verbose>=1 : print(task[0].split('/')[-1])
+                self.add_sample(*build_gene_sample(task, self.verbose, self.genes)) ## interned straight into self.genes
+
+        if store is not None:
+            store.flush()
+            return store
 
         return self.to_dataframe()
 
-    def to_dataframe(self):
+    def add_sample(self, file_id, gene_codes, values, genes=None, stratified=None):
         """
-        Turns OTUnest nest object from dictionary to a pandas dataframe.
+        Adds one sample read by build_gene_sample() to the nest (or to self.store).
 
         Parameters
         ------------
-        N/A 
+        file_id: str,
+            sample id
+
+        gene_codes: numpy array,
+            int32 gene id codes of the sample
+
+        values: numpy array,
+            value of every gene (float32 if numeric, strings of the file otherwise)
+
+        genes: IdInterner(),
+            code table of gene_codes, if it is not self.genes (e.g. a sample read in a worker process) the codes are remapped onto self.genes
+
+        stratified: StratifiedGeneTable(),
+            stratified rows of the sample, merged into self.stratified (codes remapped onto its genes/taxa)
+
+        Returns
+        ------------
+        N/A
+        """
+        if genes is not None and genes is not self.genes:
+            gene_codes = self.genes.remap(genes)[gene_codes]
+
+        if self.store is not None:
+            self.store.add_sample(file_id, self.genes.lookup(gene_codes).tolist(), values)
+        else:
+            self.nest[file_id] = (gene_codes, values)
+        if stratified is not None and self.stratified is not None:
+            self.stratified.merge(stratified)
+
+    def get_genefile(self, sample_id):
+        """
+        Parameters
+        ------------
+        sample_id: str,
+            sample id
+
+        Returns
+        ------------
+        genefile: dict,
+            dictionary of the sample as GeneData.genefile, where:
+                key : gene id
+                value : value of the gene
+        """
+        gene_codes, values = self.nest[sample_id]
+        return dict(zip(self.genes.lookup(gene_codes).tolist(), np.asarray(values).tolist()))
+
+    def to_dict(self):
+        """
+        Gives the nest back in the layout it had before the gene id were interned.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        nest: dict,
+            {sample id: {gene id: value}}, see get_genefile()
+        """
+        return {sample_id: self.get_genefile(sample_id) for sample_id in self.nest}
+
+    def to_dataframe(self, sparse=False):
+        """
+        Turns GeneNest nest object from dictionary to a pandas dataframe, columns are the sorted gene id (as in to_scipy_sparse()).
+
+        Parameters
+        ------------
+        sparse: boolean,
+            if True the dataframe has sparse float columns built from to_scipy_sparse() (no dense intermediate),
+            genes missing from a sample are the sparse fill value
 
         Returns
         ------------
         pandas dataframe object
+            float32 values filled straight into a (samples x genes) matrix if the nest was built with numeric=True
+
+        """
+        import pandas as pd ## pandas is only imported when a dataframe is built, parsing does not need it
+        if sparse:
+            matrix, sample_ids, genes = self.to_scipy_sparse()
+            return pd.DataFrame.sparse.from_spmatrix(matrix, index=sample_ids, columns=genes)
+
+        codes = self.get_gene_codes()
+        gene_column = np.full(len(self.genes), -1, dtype=np.int64)
+        gene_column[codes] = np.arange(len(codes))
+
+        if self.numeric:
+            matrix = np.full((len(self.nest), len(codes)), np.nan, dtype=np.float32)
+        else:
+            matrix = np.full((len(self.nest), len(codes)), np.nan, dtype=object)
+        for row, (gene_codes, values) in enumerate(self.nest.values()):
+            matrix[row, gene_column[gene_codes]] = values
+
+        return pd.DataFrame(matrix, index=list(self.nest.keys()), columns=self.genes.lookup(codes))
+
+    def get_gene_codes(self):
+        """
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        codes: numpy array,
+            codes of the genes found in at least one sample of the nest, ordered by gene id (the column order of the nest matrices)
+        """
+        filled = [gene_codes for gene_codes, _ in self.nest.values() if len(gene_codes) > 0]
+        if not filled:
+            return np.zeros(0, dtype=np.int32)
+        codes = np.unique(np.concatenate(filled))
+        return codes[np.argsort(self.genes.lookup(codes).astype(str), kind='stable')]
+
+    def to_scipy_sparse(self):
+        """
+        Builds the (samples x genes) matrix of the nest directly in CSR format from the gene id codes of the samples.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        matrix: scipy sparse csr matrix,
+            float32 if the nest was built with numeric=True, float64 otherwise
+
+        sample_ids: numpy array,
+            sample id of every row
+
+        genes: numpy array,
+            sorted gene id of every column
+        """
+        from scipy import sparse ## scipy is only imported when needed, parsing does not need it
+
+        dtype = np.float32 if self.numeric else np.float64
+        codes = self.get_gene_codes()
+        gene_column = np.full(len(self.genes), -1, dtype=np.int64)
+        gene_column[codes] = np.arange(len(codes))
+
+        indptr = np.zeros(len(self.nest)+1, dtype=np.int64)
+        indices = [np.zeros(0, dtype=np.int64)]
+        data = [np.zeros(0, dtype=dtype)]
+        for row, (gene_codes, values) in enumerate(self.nest.values()):
+            columns = gene_column[gene_codes]
+            column_order = np.argsort(columns, kind='stable')
+            indices.append(columns[column_order])
+            data.append(np.asarray(values)[column_order].astype(dtype))
+            indptr[row+1] = indptr[row] + len(columns)
+
+        matrix = sparse.csr_matrix((np.concatenate(data), np.concatenate(indices), indptr), shape=(len(self.nest), len(codes)))
+
+        return matrix, np.array(list(self.nest.keys())), self.genes.lookup(codes).astype(str)
+
+def build_gene_sample(task, verbose=0, genes=None):
+    """
+    Reads one file of GeneNest.build_from_folder(), in this process or in a worker process.
+
+    Parameters
+    ------------
+    task: tuple,
+        (file location, input_type, extension, numeric, stratified, gene_ids, gene_pattern, SampleCache() or None)
+
+    verbose: int,
+        verbose level of the GeneData
+
+    genes: IdInterner(),
+        gene id code table to intern into (GeneNest.genes in this process), a new one for the sample if None (worker process)
+
+    Returns
+    ------------
+    sample: tuple,
+        (file_id, gene codes, values, IdInterner() of the codes, StratifiedGeneTable() of the sample or None), see GeneNest.add_sample()
+    """
+    file_loc, input_type, extension, numeric, stratified, gene_ids, gene_pattern, cache = task
+    if cache is not None:
+        params = ('gene', input_type.lower(), extension, numeric, stratified, sorted(gene_ids) if gene_ids is not None else None, gene_pattern)
+        arrays = cache.load(file_loc, params)
+        if arrays is not None:
+            return unpack_gene_sample(arrays)
+
+    if genes is None:
+        genes = IdInterner()
+    tmpGeneData = GeneData(file_loc, input_type, verbose, extension, numeric, stratified, genes, gene_ids, gene_pattern)
+
+    if cache is not None:
+        cache.store(file_loc, params, pack_gene_sample(tmpGeneData.file_id, tmpGeneData.gene_codes, tmpGeneData.values, genes, tmpGeneData.stratified))
 
-        """ 
-        return pd.DataFrame(self.nest).transpose()
+    return tmpGeneData.file_id, tmpGeneData.gene_codes, tmpGeneData.values, genes, tmpGeneData.stratified
@@ -0,0 +1,92 @@
+"""
+    IdInterner object is a string to int32 code table (e.g. for gene id or taxa names), every distinct string is held once
+    and given the next code, so samples can keep arrays of codes instead of their own copies of the strings.
+"""
+import numpy as np
+
+class IdInterner:
+    def __init__(self, names=None):
+        """
+        Creates IdInterner object
+
+        Parameters
+        ------------
+        names: list [str],
+            strings to intern first, their codes follow the list order
+
+        Returns
+        ------------
+        N/A
+
+        """
+        self.codes = {}
+        self.names = []
+        if names is not None:
+            self.intern_many(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        """
+        Parameters
+        ------------
+        name: str,
+            the string to intern
+
+        Returns
+        ------------
+        code: int,
+            code of the string, a new string gets the next code
+        """
+        code = self.codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self.codes[name] = code
+            self.names.append(name)
+        return code
+
+    def intern_many(self, names):
+        """
+        Parameters
+        ------------
+        names: list [str],
+            the strings to intern
+
+        Returns
+        ------------
+        codes: numpy array,
+            int32 code of every string
+        """
+        return np.fromiter((self.intern(name) for name in names), dtype=np.int32, count=len(names))
+
+    def lookup(self, codes):
+        """
+        Parameters
+        ------------
+        codes: list/array [int],
+            codes given by intern()/intern_many()
+
+        Returns
+        ------------
+        names: numpy array,
+            string of every code, only the requested codes are read so a lookup per sample does not copy the whole table
+        """
+        codes = np.asarray(codes, dtype=np.int64).ravel()
+        names = np.empty(len(codes), dtype=object)
+        names[:] = [self.names[code] for code in codes.tolist()]
+        return names
+
+    def remap(self, other):
+        """
+        Parameters
+        ------------
+        other: IdInterner(),
+            another interner, e.g. of a sample read in a worker process
+
+        Returns
+        ------------
+        mapping: numpy array,
+            int32 array where mapping[code in other] = code of the same string in this interner (strings new to it are interned)
+        """
+        return self.intern_many(other.names)
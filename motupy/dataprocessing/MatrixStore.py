@@ -0,0 +1,336 @@
+"""
+    MatrixStore object is an out-of-core (samples x features) count matrix for cohorts that do not fit in memory.
+    Samples are written incrementally into CSR shards (shard_00000.npz, ... of shard_size samples each), next to a sample index
+    (samples.npy), a feature index (features.npy, taxa id or gene id) and a store.json listing the shards.
+    The indexes and store.json are only saved by flush(), once all samples are added, and every file is replaced atomically.
+    Coverage filtering, relative abundance and CLR go through the shards one at a time, so memory depends on the shard size only.
+"""
+import json
+import os
+import numpy as np
+
+class MatrixStore:
+    def __init__(self, store_dir, shard_size=1000):
+        """
+        Creates MatrixStore object, an existing store in store_dir is opened (and can be appended to), otherwise an empty one is created
+
+        Parameters
+        ------------
+        store_dir: str,
+            folder of the store files
+
+        shard_size: int,
+            number of samples buffered in memory before they are written out as one shard
+
+        Returns
+        ------------
+        N/A
+
+        """
+        self.store_dir = store_dir
+        self.shard_size = shard_size
+        self.shards = []
+        self.samples = []
+        self.features = []
+        self.feature_column = {}
+        self.buffer_ids = []
+        self.buffer_columns = []
+        self.buffer_values = []
+
+        os.makedirs(store_dir, exist_ok=True)
+        if os.path.exists(os.path.join(store_dir, 'store.json')):
+            with open(os.path.join(store_dir, 'store.json'), 'r') as meta_file:
+                self.shards = json.load(meta_file)['shards']
+            self.samples = np.load(os.path.join(store_dir, 'samples.npy')).tolist()
+            self.features = np.load(os.path.join(store_dir, 'features.npy')).tolist()
+            self.feature_column = {feature: column for column, feature in enumerate(self.features)}
+
+    def get_columns(self, features):
+        """
+        Parameters
+        ------------
+        features: list,
+            taxa id or gene id, features new to the store are added at the end of the feature index
+
+        Returns
+        ------------
+        columns: numpy array,
+            column of every feature
+        """
+        columns = np.zeros(len(features), dtype=np.int64)
+        for position, feature in enumerate(features):
+            if feature not in self.feature_column:
+                self.feature_column[feature] = len(self.features)
+                self.features.append(feature)
+            columns[position] = self.feature_column[feature]
+        return columns
+
+    def add_sample(self, sample_id, features, values):
+        """
+        Adds one sample, written out with the next full shard (or by flush()).
+
+        Parameters
+        ------------
+        sample_id: str,
+            sample id
+
+        features: list,
+            taxa id or gene id of the sample
+
+        values: list,
+            read counts/abundance of every feature, numeric strings (GeneNest default) are parsed into float
+
+        Returns
+        ------------
+        N/A
+        """
+        values = np.asarray(values)
+        if values.dtype.kind not in 'iufb':
+            values = values.astype(np.float64)
+
+        self.buffer_ids.append(sample_id)
+        self.buffer_columns.append(self.get_columns(list(features)))
+        self.buffer_values.append(values)
+        if len(self.buffer_ids) >= self.shard_size:
+            self.write_buffer()
+
+    def add_chunk(self, sample_ids, matrix, features):
+        """
+        Adds a block of samples as one shard, e.g. a transformed chunk of another store.
+
+        Parameters
+        ------------
+        sample_ids: list,
+            sample id of every row
+
+        matrix: scipy sparse csr matrix,
+            (samples x features) block
+
+        features: list,
+            taxa id or gene id of every column of the matrix
+
+        Returns
+        ------------
+        N/A
+        """
+        self.write_buffer()
+        columns = self.get_columns(list(features))
+        self.write_shard(list(sample_ids), matrix.indptr, columns[matrix.indices], matrix.data)
+
+    def flush(self):
+        """
+        Writes the buffered samples as a shard and saves the sample/feature indexes, to be called once all samples are added
+        (the shards written before do not save the indexes, so adding samples stays linear in the number of shards).
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        N/A
+        """
+        self.write_buffer()
+        self.write_indexes()
+
+    def write_buffer(self):
+        """
+        Writes the buffered samples as a shard, if any.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        N/A
+        """
+        if self.buffer_ids:
+            indptr = np.zeros(len(self.buffer_ids)+1, dtype=np.int64)
+            indptr[1:] = np.cumsum([len(columns) for columns in self.buffer_columns])
+            orders = [np.argsort(columns, kind='stable') for columns in self.buffer_columns]
+            indices = np.concatenate([columns[order] for columns, order in zip(self.buffer_columns, orders)])
+            data = np.concatenate([values[order] for values, order in zip(self.buffer_values, orders)])
+            sample_ids = self.buffer_ids
+            self.buffer_ids, self.buffer_columns, self.buffer_values = [], [], []
+            self.write_shard(sample_ids, indptr, indices, data)
+
+    def write_shard(self, sample_ids, indptr, indices, data):
+        """
+        Parameters
+        ------------
+        sample_ids: list,
+            sample id of every row of the shard
+
+        indptr, indices, data: numpy arrays,
+            CSR arrays of the shard, indices being columns of the store feature index
+
+        Returns
+        ------------
+        N/A
+        """
+        shard_file = 'shard_%05d.npz'%len(self.shards)
+        np.savez(os.path.join(self.store_dir, shard_file), indptr=indptr, indices=indices, data=data)
+        self.shards.append({'file': shard_file, 'rows': len(sample_ids)})
+        self.samples.extend(sample_ids)
+
+    def write_indexes(self):
+        """
+        Saves samples.npy, features.npy and then store.json, each one is written to a temporary file renamed over the old one,
+        so a reader (or a crash) never sees a half written index.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        N/A
+        """
+        for file_name, index in [('samples.npy', np.array(self.samples, dtype=str)), ('features.npy', np.array(self.features))]:
+            tmp_path = os.path.join(self.store_dir, '%s.%s.tmp'%(file_name, os.getpid()))
+            with open(tmp_path, 'wb') as index_file:
+                np.save(index_file, index)
+            os.replace(tmp_path, os.path.join(self.store_dir, file_name))
+
+        tmp_path = os.path.join(self.store_dir, 'store.json.%s.tmp'%os.getpid())
+        with open(tmp_path, 'w') as meta_file:
+            json.dump({'shards': self.shards, 'n_samples': len(self.samples), 'n_features': len(self.features)}, meta_file)
+        os.replace(tmp_path, os.path.join(self.store_dir, 'store.json'))
+
+    def iter_chunks(self):
+        """
+        Goes through the store one shard at a time.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        generator of (sample ids, scipy sparse csr matrix) tuples, the matrices have one column per feature of the store
+        """
+        from scipy import sparse ## scipy is only imported when needed, parsing does not need it
+
+        if self.buffer_ids:
+            self.flush()
+        start = 0
+        for shard in self.shards:
+            with np.load(os.path.join(self.store_dir, shard['file'])) as arrays:
+                matrix = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=(shard['rows'], len(self.features)))
+            yield self.samples[start:start+shard['rows']], matrix
+            start += shard['rows']
+
+    def new_store(self, output_dir):
+        """
+        Parameters
+        ------------
+        output_dir: str,
+            folder of a new store
+
+        Returns
+        ------------
+        store: MatrixStore(),
+            empty store with the same shard size, None if output_dir already holds a store (it is not overwritten)
+        """
+        store = MatrixStore(output_dir, self.shard_size)
+        if store.shards:
+            print('[ERROR] %s already holds a MatrixStore, use another output folder'%output_dir)
+            return None
+        return store
+
+    def filter_otu_coverage(self, output_dir, otu_coverage=0.0025):
+        """
+        Same as EDA.filter_otu_coverage(), selects the features found (non zero) in a given fraction of samples, in two passes over the shards.
+
+        Parameters
+        ------------
+        output_dir: str,
+            folder of the filtered store
+
+        otu_coverage: float or int,
+            the fraction of samples (float) or the number of samples (int) covered by the OTU
+
+        Returns
+        ------------
+        store: MatrixStore(),
+            the filtered store (None if output_dir already holds a store)
+        """
+        coverage = np.zeros(len(self.features), dtype=np.int64)
+        for _, matrix in self.iter_chunks():
+            coverage += np.bincount(matrix.indices[matrix.data != 0], minlength=len(self.features))
+
+        if isinstance(otu_coverage, float):
+            threshold = otu_coverage*len(self.samples)
+        else:
+            threshold = otu_coverage
+        kept = np.flatnonzero(coverage >= threshold)
+        kept_features = [self.features[column] for column in kept.tolist()]
+
+        store = self.new_store(output_dir)
+        if store is None:
+            return None
+        for sample_ids, matrix in self.iter_chunks():
+            store.add_chunk(sample_ids, matrix[:, kept], kept_features)
+        store.flush()
+
+        return store
+
+    def relative_abundance(self, output_dir):
+        """
+        Turns every sample into relative abundance (divided by the sample total), one shard at a time.
+
+        Parameters
+        ------------
+        output_dir: str,
+            folder of the relative abundance store
+
+        Returns
+        ------------
+        store: MatrixStore(),
+            the relative abundance store (float64, None if output_dir already holds a store)
+        """
+        from scipy import sparse ## scipy is only imported when needed, parsing does not need it
+
+        store = self.new_store(output_dir)
+        if store is None:
+            return None
+        for sample_ids, matrix in self.iter_chunks():
+            totals = np.asarray(matrix.sum(axis=1), dtype=np.float64).ravel()
+            scale = np.divide(1.0, totals, out=np.zeros_like(totals), where=totals != 0)
+            store.add_chunk(sample_ids, (sparse.diags(scale) @ matrix.astype(np.float64)).tocsr(), self.features)
+        store.flush()
+
+        return store
+
+    def clr(self, output_file, pseudocount=0.55):
+        """
+        Centred log-ratio transformation of every sample, zeroes are replaced with pseudocount first (as in EDA.aitchison_distance_matrix()).
+        The CLR values are dense, they are written one shard at a time into a memory-mapped .npy file.
+
+        Parameters
+        ------------
+        output_file: str,
+            location of the .npy file
+
+        pseudocount: float,
+            value replacing the zeroes
+
+        Returns
+        ------------
+        clr: numpy memmap,
+            float32 matrix of shape (n samples, n features), rows/columns follow self.samples/self.features
+        """
+        if self.buffer_ids:
+            self.flush()
+        clr = np.lib.format.open_memmap(output_file, mode='w+', dtype=np.float32, shape=(len(self.samples), len(self.features)))
+        start = 0
+        for sample_ids, matrix in self.iter_chunks():
+            dense = matrix.toarray().astype(np.float64)
+            dense[dense == 0] = pseudocount
+            log_dense = np.log(dense)
+            clr[start:start+len(sample_ids)] = log_dense - log_dense.mean(axis=1, keepdims=True)
+            start += len(sample_ids)
+        clr.flush()
+
+        return clr
@@ -3,10 +3,21 @@
     The data will be stored as a dictionary {key: OTU taxa id number, value: read counts/relative abundance}
 """
 from .kaiju_output import *
-from ete3 import NCBITaxa
-from .replacement_taxa import get_dict
+from .kraken2_output import read_kraken2, read_bracken
+from .metaphlan_output import read_metaphlan
+from .input_detection import detect_input_type
+from .compressed_input import strip_compression_extension
+from .TaxonomyCache import get_shared_cache
+from .TaxonomyMigration import TaxonomyMigration
+from .TaxonomyIndex import resolve_lineages as lineage_matrix, assign_clades
+from .cumulation import cumulate_reads
+import numpy as np
+
+SUPERKINGDOM_TAXIDS = {10239: 'virus', 2: 'bacteria', 2759: 'eukaryote', 2157: 'archaea'} ## in order of precedence
+REPORT_INPUT_TYPES = ['kraken2', 'metaphlan'] ## input types carrying their own lineages
+
 class OTUdata:
-    def __init__(self, file_loc, input_type, artifact_threshold=0, verbose=0, extension=None, include_strains=False):
+    def __init__(self, file_loc, input_type, artifact_threshold=0, verbose=0, extension=None, include_strains=False, ncbi=None, migration=None, kingdoms=None):
         """
         Creates OTUdata object for manipulation/transformation
 
@@ -17,6 +28,20 @@ class OTUdata:
 
         input_type: str,
             what type of taxa profiling tool was used to generate the file, "E.g. Kaiju"
+            ('kaiju raw' reads the per-read kaiju output and counts the reads itself).
+            'kraken2' (kraken2/bracken report) and 'metaphlan' take the lineages from the file itself, without taxonomy lookups,
+            'bracken' reads the re-estimated reads of a bracken output, 'auto' detects the type from the file content (see detect_input_type())
+
+        ncbi: NCBITaxa() or TaxonomyIndex(),
+            taxonomy backend used for lineage/rank lookups, if None the process-wide TaxonomyCache (get_shared_cache()) is used.
+            A TaxonomyIndex(snapshot=...) opened once can be shared by every OTUdata at no start-up cost.
+
+        migration: TaxonomyMigration(),
+            taxa id migration table (merged/deleted taxa id) applied right after reading, if None only replacement_taxa.get_dict() is applied
+
+        kingdoms: list [str],
+            superkingdoms to keep ('virus', 'bacteria', 'eukaryote', 'archaea'), the other taxa id are dropped right after reading,
+            before any rank/cumulation work is done on them (also applied to the reads given to add_reads()). None keeps every taxa id
 
         Returns
         ------------
@@ -27,8 +52,15 @@ class OTUdata:
         self.file_id = ''
         self.include_strains = include_strains
         self.verbose = verbose
-        self.ncbi = NCBITaxa()
+        if ncbi is None:
+            ncbi = get_shared_cache()
+        self.ncbi = ncbi
         self.cumulated = False
+        self.clade_relative = False
+        self.lineage_table = None
+        self.kingdoms = kingdoms
+        if kingdoms is not None and not set(kingdoms) <= set(SUPERKINGDOM_TAXIDS.values()):
+            print('[ERROR] kingdoms should be among %s'%list(SUPERKINGDOM_TAXIDS.values()))
         self.basic_ranks = ['superkingdom',
                         'phylum',
                         'class',
@@ -53,16 +85,34 @@ class OTUdata:
         else:
             self.file_id = self.process_file_name_with_known_extension(file_loc, extension)
 
-        if input_type.lower()  not in ['kaiju','old kaiju','old kaiju v2']:
-            print("[ERROR] only 'kaiju','old kaiju','old kaiju v2' input type supported")
+        if input_type.lower() == 'auto':
+            input_type = detect_input_type(file_loc) or input_type
+            if self.verbose >= 1 : print('[INPUT TYPE] %s detected as %s'%(file_loc, input_type))
+
+        self.otufile = {}
+        if input_type.lower()  not in ['kaiju','kaiju raw','old kaiju','old kaiju v2','kraken2','bracken','metaphlan']:
+            print("[ERROR] only 'kaiju','kaiju raw','old kaiju','old kaiju v2','kraken2','bracken','metaphlan','auto' input type supported")
         if input_type.lower() == 'kaiju':
-            self.otufile = read_kj(file_loc, artifact_threshold)
+            self.otufile = dict(stream_kj(file_loc, artifact_threshold))
+
+        if input_type.lower() == 'kaiju raw':
+            self.otufile = dict(stream_kj_raw(file_loc, artifact_threshold))
         
         if input_type.lower() == 'old kaiju':
-            self.otufile = read_old_kj(file_loc, artifact_threshold)
+            self.otufile = dict(stream_old_kj(file_loc, artifact_threshold, self.ncbi))
 
         if input_type.lower() == 'old kaiju v2':
-            self.otufile = read_old_kjV2(file_loc, artifact_threshold)
+            self.otufile = dict(stream_old_kjV2(file_loc, artifact_threshold, self.ncbi))
+
+        if input_type.lower() == 'kraken2':
+            self.otufile, self.lineage_table = read_kraken2(file_loc, artifact_threshold)
+
+        if input_type.lower() == 'bracken':
+            self.otufile = read_bracken(file_loc, artifact_threshold)
+
+        if input_type.lower() == 'metaphlan':
+            self.otufile, self.lineage_table = read_metaphlan(file_loc, artifact_threshold, self.ncbi)
+            self.cumulated = True ## every MetaPhlAn clade already holds the abundance of its members
 
         #root_id = [-1, 1, 131567]
         root_id = [-1]
@@ -70,15 +120,19 @@ class OTUdata:
             if root in self.otufile:
                 del self.otufile[root]
 
-        ### these two are problematic ncbi taxa id that have been deleted, I am now replacing them with their updated taxa id
-        
-        fix_taxa = get_dict()
-        for k,v in fix_taxa.items():
-            if k in self.otufile:
-                self.otufile[v] = self.otufile[k]
-                del self.otufile[k]
-
-        self.update_ranks()
+        ### problematic ncbi taxa id that have been merged/deleted are replaced with their updated taxa id, in one vectorised remap
+        if migration is None:
+            migration = TaxonomyMigration(verbose=self.verbose)
+        self.migration = migration
+        if self.lineage_table is None: ## the lineages of a report are consistent with its own taxa id, they are not migrated
+            self.otufile = migration.migrate_dict(self.otufile)
+
+        lineages = self.resolve_lineages()
+        if self.kingdoms is not None:
+            kept = self.kingdom_mask(lineages)
+            self.otufile = {taxid: count for (taxid, count), keep in zip(self.otufile.items(), kept.tolist()) if keep}
+            lineages = lineages[kept]
+        self.update_ranks(lineages)
         self.update_superkingdom()
 
     
@@ -90,7 +144,7 @@ class OTUdata:
             the name/location of the file being processed
         
         ext : str,
-            the known/desired extension used to cut off the name for the id generation
+            the known/desired extension used to cut off the name for the id generation, a compression extension (.gz/.bz2/.xz) after it is also cut off
 
         Returns
         ------------
@@ -99,7 +153,7 @@ class OTUdata:
         """
         slash_split = file_loc.split('/')
         slash_split = slash_split[-1]
-        id_name = slash_split.replace(ext, '')
+        id_name = strip_compression_extension(slash_split.replace(ext, '')) ## e.g. sample1.out.gz gives sample1 with ext '.out' or '.out.gz'
         
         return id_name
 
@@ -127,9 +181,8 @@ class OTUdata:
     def taxa_cumulation(self):
         """
         Goes through all the taxa_id (keys) in the dict.
-        For each of the taxa_id, it iteratively goes through their lineage using ete3 NCBITaxa.get_lineage().
-        As it goes through lineage of taxa_id, it finds if there is a key in the dict corresponding to the taxa_id.
-        If the key for the taxa_id is not found, it will be created and read counts from lower rank will be added to it.
+        The basic rank lineage of every taxa_id is resolved in one call (resolve_lineages()), ancestors not in the dict are created
+        and the read counts are added up from lower to higher rank in a single bottom-up pass, see cumulation.cumulate_reads().
 
         Parameters
         ------------
@@ -149,34 +202,175 @@ class OTUdata:
                 del self.otufile[root]
         if not self.cumulated:
             taxid_key_list = list(self.otufile.keys())
-            for taxid_key in taxid_key_list:
-                ordered_lineage = self.transform_lineage(taxid_key)
+            lineages = self.resolve_lineages(taxid_key_list)
+            nodes, node_counts, node_ranks, node_rows = cumulate_reads(taxid_key_list, [self.otufile[taxid] for taxid in taxid_key_list], lineages)
+
+            ## taxa id without any basic rank in their lineage have nothing to cumulate into and are kept as they are
+            no_lineage = ~lineages.any(axis=1)
+            otufile = {taxid: self.otufile[taxid] for taxid, missing in zip(taxid_key_list, no_lineage.tolist()) if missing}
+            otufile.update(zip(nodes.tolist(), node_counts.tolist()))
+            self.otufile = otufile
+
+            superkingdom_column = self.basic_ranks.index('superkingdom')
+            for taxid, rank_index, superkingdom_taxid in zip(nodes.tolist(), node_ranks.tolist(), lineages[node_rows, superkingdom_column].tolist()):
+                self.ranks[self.basic_ranks[rank_index]].add(taxid)
+                self.add_superkingdom(taxid, superkingdom_taxid)
+
+            if self.verbose >=1 : print('[TAXA CUMULATION] %s taxa id cumulated into %s basic rank taxa id'%(len(taxid_key_list), len(nodes)))
+            if self.verbose >=2 :
+                names = self.ncbi.get_taxid_translator(nodes.tolist())
+                for taxid in nodes.tolist():
+                    print('[UPDATING PARENT ID READS] TAX ID %s \tNAME %s READS %s'%(taxid, names.get(taxid, 'not found'), self.otufile[taxid]))
 
-                if taxid_key != ordered_lineage[0]: ## if the current taxid(taxid_key) is not the lowest rank (not strain/subsps i.e. anything beyond species level)
-                    self.update_dictfile(ordered_lineage[0], taxid_key)
+            self.cumulated = True
 
-                    self.update_one_rank(ordered_lineage[0])
-                    self.update_one_superkingdom(ordered_lineage[0])
+    def add_reads(self, otudict):
+        """
+        Adds the reads of another run of the same sample (e.g. a top-up sequencing run) into the OTUdata without re-reading it.
+        If the OTUdata is already cumulated only the new reads are cumulated (see cumulation.cumulate_reads()) and added onto the lineages
+        they touch, so the cost depends on the size of otudict and not of the whole profile. The result is the same as cumulating both runs together.
 
-                for taxid in ordered_lineage[1:]:
-                    if taxid not in self.otufile:
-                        self.otufile[taxid] = 0
-                    
-                    self.update_one_rank(taxid)
-                    self.update_one_superkingdom(taxid)
+        Parameters
+        ------------
+        otudict: dict,
+            reads dictionary with key = taxa id, value = read counts, as read by read_kj() (not cumulated)
 
-            
-            flipped_ranks = self.basic_ranks[::-1]
+        Returns
+        ------------
+        N/A
+        """
+        if self.clade_relative:
+            print('[ERROR] add_reads: reads can not be added after turn_reads_to_clade_relative_abundance()')
+            return
+
+        root_id = [-1, 1, 131567] if self.cumulated else [-1]
+        otudict = {taxid: reads for taxid, reads in otudict.items() if taxid not in root_id}
+        if self.lineage_table is None:
+            otudict = self.migration.migrate_dict(otudict)
+        if not otudict:
+            return
+
+        taxid_key_list = list(otudict.keys())
+        lineages = self.resolve_lineages(taxid_key_list)
+        if self.kingdoms is not None:
+            kept = self.kingdom_mask(lineages)
+            taxid_key_list = [taxid for taxid, keep in zip(taxid_key_list, kept.tolist()) if keep]
+            lineages = lineages[kept]
+            if not taxid_key_list:
+                return
 
-            for i, r in enumerate(flipped_ranks[:-1]): ## this reverses it to start from sps rank, so sps read count will be added to genus and genus to family and so on. 
-                parent_rank = flipped_ranks[i+1]
-                for taxid in self.ranks[r]:
-                    parent_taxid = self.find_parent_taxid(taxid, parent_rank, flipped_ranks)
-                    self.otufile[parent_taxid] += self.otufile[taxid]
-                    
-                    if self.verbose >=1 : print('[UPDATING PARENT ID READS] TAX ID %s \tNAME %s updated to %s with\nTAX ID %s \tNAME %s READS %s'%(parent_taxid, self.ncbi.get_taxid_translator([parent_taxid])[parent_taxid], self.otufile[parent_taxid], taxid, self.ncbi.get_taxid_translator([taxid])[taxid], self.otufile[taxid]))
+        if not self.cumulated:
+            for taxid in taxid_key_list:
+                self.otufile[taxid] = self.otufile.get(taxid, 0) + otudict[taxid]
+            for taxid, lineage_row in zip(taxid_key_list, lineages):
+                for rank, ancestor in zip(self.basic_ranks, lineage_row):
+                    if ancestor == taxid:
+                        self.ranks[rank].add(taxid)
+            for taxid, superkingdom_taxid in zip(taxid_key_list, self.assign_superkingdoms(taxid_key_list).tolist()):
+                self.add_superkingdom(taxid, superkingdom_taxid)
+            return
+
+        nodes, node_counts, node_ranks, node_rows = cumulate_reads(taxid_key_list, [otudict[taxid] for taxid in taxid_key_list], lineages)
+        for taxid, missing in zip(taxid_key_list, (~lineages.any(axis=1)).tolist()):
+            if missing: ## no basic rank in its lineage, kept as it is (as in taxa_cumulation())
+                self.otufile[taxid] = self.otufile.get(taxid, 0) + otudict[taxid]
+
+        superkingdom_column = self.basic_ranks.index('superkingdom')
+        for taxid, reads, rank_index, superkingdom_taxid in zip(nodes.tolist(), node_counts.tolist(), node_ranks.tolist(), lineages[node_rows, superkingdom_column].tolist()):
+            self.otufile[taxid] = self.otufile.get(taxid, 0) + reads
+            self.ranks[self.basic_ranks[rank_index]].add(taxid)
+            self.add_superkingdom(taxid, superkingdom_taxid)
+
+        if self.verbose >=1 : print('[ADDING READ COUNTS] %s taxa id added onto %s basic rank taxa id'%(len(taxid_key_list), len(nodes)))
+
+    def merge(self, other):
+        """
+        Merges another OTUdata of the same sample (e.g. a top-up sequencing run) into this one, see add_reads().
+        An OTUdata that is already cumulated is added taxa id by taxa id, its reads are not cumulated a second time.
 
-            self.cumulated = True
+        Parameters
+        ------------
+        other: OTUdata(),
+            the OTUdata to merge in, it is left unchanged
+
+        Returns
+        ------------
+        N/A
+        """
+        if self.clade_relative or other.clade_relative:
+            print('[ERROR] merge: OTUdata can not be merged after turn_reads_to_clade_relative_abundance()')
+            return
+
+        if not other.cumulated:
+            self.add_reads(other.otufile)
+            return
+
+        if not self.cumulated:
+            self.taxa_cumulation()
+        for taxid, reads in other.otufile.items():
+            self.otufile[taxid] = self.otufile.get(taxid, 0) + reads
+        for rank in self.ranks.keys():
+            self.ranks[rank].update(other.ranks[rank])
+        for sk in self.superkingdom.keys():
+            self.superkingdom[sk].update(other.superkingdom[sk])
+
+    def resolve_lineages(self, taxids=None):
+        """
+        Resolves the basic rank lineage of many taxa id in one call, see TaxonomyIndex.resolve_lineages().
+
+        Parameters
+        ------------
+        taxids: list/array [int],
+            NCBI Taxanomy IDs, if None every taxa id (key) in self.otufile is used
+
+        Returns
+        ------------
+        lineages: numpy array,
+            int32 matrix of shape (n taxa id, 7 basic ranks) holding the taxa id of the ancestor at each rank, 0 where the lineage has no such rank.
+        """
+        if taxids is None:
+            taxids = list(self.otufile.keys())
+
+        if self.lineage_table is not None: ## lineages given by the report itself (kraken2/metaphlan), no taxonomy lookup
+            missing = (0,)*len(self.basic_ranks)
+            return np.array([self.lineage_table.get(int(taxid), missing) for taxid in taxids], dtype=np.int32).reshape(len(taxids), len(self.basic_ranks))
+
+        return lineage_matrix(self.ncbi, taxids, self.basic_ranks)
+
+    def kingdom_mask(self, lineages):
+        """
+        Parameters
+        ------------
+        lineages: numpy array,
+            lineage table from resolve_lineages()
+
+        Returns
+        ------------
+        kept: numpy array,
+            boolean mask of the rows whose superkingdom is in self.kingdoms (every row if self.kingdoms is None)
+        """
+        if self.kingdoms is None:
+            return np.ones(len(lineages), dtype=bool)
+        kept_taxids = [taxid for taxid, kingdom in SUPERKINGDOM_TAXIDS.items() if kingdom in self.kingdoms]
+        return np.isin(lineages[:, self.basic_ranks.index('superkingdom')], kept_taxids)
+
+    def assign_superkingdoms(self, taxids):
+        """
+        Parameters
+        ------------
+        taxids: list [int],
+            NCBI Taxanomy IDs
+
+        Returns
+        ------------
+        superkingdoms: numpy array,
+            superkingdom taxa id (10239, 2, 2759 or 2157) of every taxa id, 0 if its lineage has none.
+            Taken from the lineage table of the report if there is one, see TaxonomyIndex.assign_clades() otherwise.
+        """
+        if self.lineage_table is not None:
+            return self.resolve_lineages(taxids)[:, self.basic_ranks.index('superkingdom')]
+
+        return assign_clades(self.ncbi, taxids, list(SUPERKINGDOM_TAXIDS))
 
     def transform_lineage(self, taxanomy_id):
         """
@@ -193,8 +387,10 @@ class OTUdata:
 
         """
         tmp_lineage = []
-        for taxid in self.ncbi.get_lineage(taxanomy_id):
-            if self.ncbi.get_rank([taxid])[taxid] in self.basic_ranks:
+        lineage = self.ncbi.get_lineage(taxanomy_id)
+        lineage_ranks = self.ncbi.get_rank(lineage) ## one lookup for the whole lineage instead of one per ancestor
+        for taxid in lineage:
+            if lineage_ranks[taxid] in self.basic_ranks:
                 tmp_lineage.append(taxid) 
 
         return tmp_lineage[::-1]# invert list, so lowest rank appears first
@@ -227,7 +423,7 @@ class OTUdata:
 
             self.otufile[taxanomy_id] = self.otufile[dictionary_key]
         
-        taxid_rank = self.ncbi.get_rank([dictionary_key])[dictionary_key] 
+        taxid_rank = self.ncbi.get_rank([dictionary_key]).get(dictionary_key, 'not found')
         if taxid_rank not in self.basic_ranks:
             del self.otufile[dictionary_key]
 
@@ -247,16 +443,29 @@ class OTUdata:
         ------------
         N/A
         """
-        for taxid in  self.otufile.keys():
-            taxid = int(taxid)
-            if 10239 in self.ncbi.get_lineage(taxid):
-                self.superkingdom['virus'].add((taxid))
-            elif 2 in self.ncbi.get_lineage(taxid):
-                self.superkingdom['bacteria'].add((taxid))
-            elif 2759 in self.ncbi.get_lineage(taxid):
-                self.superkingdom['eukaryote'].add((taxid))
-            elif 2157 in self.ncbi.get_lineage(taxid):
-                self.superkingdom['archaea'].add((taxid))
+        taxid_key_list = [int(taxid) for taxid in self.otufile.keys()]
+        superkingdoms = self.assign_superkingdoms(taxid_key_list)
+        for taxid, superkingdom_taxid in zip(taxid_key_list, superkingdoms):
+            self.add_superkingdom(taxid, int(superkingdom_taxid))
+
+    def add_superkingdom(self, taxid, superkingdom_taxid):
+        """
+        Adds a taxa id to self.superkingdom given the superkingdom taxa id of its lineage.
+
+        Parameters
+        ------------
+        taxid: int,
+            the ncbi taxanomy id to be added into self.superkingdom dictionary
+
+        superkingdom_taxid: int,
+            the ncbi taxanomy id of the superkingdom in its lineage (10239, 2, 2759 or 2157), anything else is ignored
+
+        Returns
+        ------------
+        N/A
+        """
+        if superkingdom_taxid in SUPERKINGDOM_TAXIDS:
+            self.superkingdom[SUPERKINGDOM_TAXIDS[superkingdom_taxid]].add(taxid)
 
     def update_one_superkingdom(self, taxid):
         """
@@ -272,16 +481,9 @@ class OTUdata:
         N/A
         """
         taxid = int(taxid)
-        if 10239 in self.ncbi.get_lineage(taxid):
-            self.superkingdom['virus'].add((taxid))
-        elif 2 in self.ncbi.get_lineage(taxid):
-            self.superkingdom['bacteria'].add((taxid))
-        elif 2759 in self.ncbi.get_lineage(taxid):
-            self.superkingdom['eukaryote'].add((taxid))
-        elif 2157 in self.ncbi.get_lineage(taxid):
-            self.superkingdom['archaea'].add((taxid))
+        self.add_superkingdom(taxid, int(self.assign_superkingdoms([taxid])[0]))
 
-    def update_ranks(self):
+    def update_ranks(self, lineages=None):
         """
         Process done right after reading otu data into a dictionary.
         This method collects all the taxa id in the dictionary's keys and group them into their respective taxanomy rank 
@@ -289,17 +491,21 @@ class OTUdata:
 
         Parameters
         ------------
-        N/A
+        lineages: numpy array,
+            lineage table of the dictionary's keys from resolve_lineages(), computed if None
 
         Returns
         ------------
         N/A
         """
-        for taxid in self.otufile.keys():
+        if lineages is None:
+            lineages = self.resolve_lineages()
+
+        for taxid, lineage_row in zip(self.otufile.keys(), lineages):
             taxid = int(taxid)
-            taxid_rank = self.ncbi.get_rank([taxid])[taxid] 
-            if taxid_rank in self.ranks:
-                self.ranks[taxid_rank].add(taxid)
+            for rank, ancestor in zip(self.basic_ranks, lineage_row): ## a taxa id at a basic rank appears in its own lineage row
+                if ancestor == taxid:
+                    self.ranks[rank].add(taxid)
 
     def update_one_rank(self, taxid):
         """
@@ -379,10 +585,14 @@ class OTUdata:
         clade_read_counts = self.get_clade_read_counts()
 
         for rank in self.basic_ranks: ## to iterate through every single basic taxanomic ranks
+            if rank not in clade_read_counts: ## no taxa id at this rank, e.g. every one of them was in a dropped kingdom
+                continue
             total_rank_reads = clade_read_counts[rank]
             for taxid in self.ranks[rank]: ## to iterate through every single taxid that belongs to the given taxanomic rank
                 self.otufile[taxid] = self.otufile[taxid]/total_rank_reads
 
+        self.clade_relative = True
+
     def get_clade_read_counts(self):
         """
         Generate a dictionary with total clade read counts, refer below:
@@ -428,6 +638,27 @@ class OTUdata:
 
         return desired_rank_otufile
 
+    def keep_ranks(self, desired_ranks):
+        """
+        Keeps only the taxa id of the desired ranks in self.otufile, self.ranks and self.superkingdom (see select_rank()).
+
+        Parameters
+        ------------
+        desired_ranks : list [str], 
+            the desired taxanomy_ranks made up of str
+
+        Returns
+        ------------
+        N/A
+        """
+        desired_ranks = [rank.lower() for rank in desired_ranks]
+        self.otufile = self.select_rank(desired_ranks)
+        for rank in self.basic_ranks:
+            if rank not in desired_ranks:
+                self.ranks[rank] = set()
+        for sk in self.superkingdom.keys():
+            self.superkingdom[sk] = {taxid for taxid in self.superkingdom[sk] if taxid in self.otufile}
+
     def identify_strain(self):
         """
         TO DO
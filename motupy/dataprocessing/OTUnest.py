@@ -2,17 +2,29 @@
     OTUnest object is for storing and processing multiple sample of OTU data.
     The data will be stored as a dictionary {key: sample_ID, value: OTUData object}
 """
-import pandas as pd 
-from .OTUdata import OTUdata
+import numpy as np
+from .OTUdata import OTUdata, SUPERKINGDOM_TAXIDS, REPORT_INPUT_TYPES
+from .input_detection import detect_input_type
+from .TaxonomyIndex import resolve_lineages as lineage_matrix, assign_clades, resolve_named_lineages
+from .TaxonomyMigration import TaxonomyMigration
+from .kaiju_output import stream_kj_table, get_file_id
+from .cumulation import cumulate_reads
+from .TaxonomyCache import get_shared_cache
+from .SampleCache import pack_otu_sample, unpack_otu_sample
+from .sparse_matrix import nest_to_csr
 import os 
 class OTUnest:
-    def __init__(self, verbose = 0):
+    def __init__(self, verbose = 0, ncbi=None, migration=None):
         """
         Creates OTUnest object for manipulation/transformation
 
         Parameters
         ------------
-        N/A
+        ncbi: NCBITaxa() or TaxonomyIndex(),
+            taxonomy backend shared by every OTUdata built by the nest, if None the process-wide TaxonomyCache (get_shared_cache()) is used
+
+        migration: TaxonomyMigration(),
+            taxa id migration table applied to every sample as it is read, see OTUdata
 
         Returns
         ------------
@@ -20,6 +32,8 @@ class OTUnest:
 
         """ 
         self.verbose = verbose
+        self.ncbi = ncbi
+        self.migration = migration
         self.basic_ranks = ['superkingdom',
                         'phylum',
                         'class',
@@ -41,8 +55,9 @@ class OTUnest:
 
         
         self.nest = {}
+        self.store = None
 
-    def build_from_folder(self, input_folder, input_type, extension=None, artifact_threshold=0, make_clade_relative=True, cumulate=False):
+    def build_from_folder(self, input_folder, input_type, extension=None, artifact_threshold=0, make_clade_relative=True, cumulate=False, cohort_cumulation=False, n_jobs=1, cache=None, store=None, kingdoms=None, ranks=None):
         """
         Creates OTUnest object for manipulation/transformation
 
@@ -52,7 +67,34 @@ class OTUnest:
             folder location of the input files (taxa profiling output file)
 
         input_type: str,
-            what type of taxa profiling tool was used to generate the file, "E.g. Kaiju"
+            what type of taxa profiling tool was used to generate the file, "E.g. Kaiju", see OTUdata() for the supported types
+            ('auto' detects the type of every file from its content)
+
+        cohort_cumulation: boolean,
+            if True the samples are read without cumulation and the whole nest is cumulated at once by cohort_taxa_cumulation()
+            (and turned into clade relative abundance if make_clade_relative), instead of one sample at a time.
+            Not used for kraken2/metaphlan reports, their samples are cumulated from their own lineages without taxonomy lookups
+
+        n_jobs: int,
+            number of worker processes reading (and cumulating) the files, 1 reads them in this process.
+            Every worker opens its own taxonomy backend once (see worker_backend()), the ranks/superkingdom sets are merged here
+            and the samples are added to the nest in the same order as with n_jobs=1.
+
+        cache: SampleCache(),
+            on-disk cache of parsed samples, files unchanged since they were cached (with the same parameters) are loaded from it
+            instead of being parsed and cumulated again, not used when the taxonomy has no database file (see taxonomy_fingerprint())
+
+        store: MatrixStore(),
+            out-of-core storage for cohorts that do not fit in memory, the samples are written into the store as they are read
+            instead of being kept in self.nest, and the store is returned instead of a dataframe (cohort_cumulation is not available)
+
+        kingdoms: list [str],
+            superkingdoms to keep ('virus', 'bacteria', 'eukaryote', 'archaea'), the other taxa id are dropped right after each file is read
+            (see OTUdata()), so no rank/cumulation work is done on them. None keeps every taxa id
+
+        ranks: list [str],
+            basic ranks to keep (e.g. ['species']), applied to every sample before it is added to the nest/store
+            (after the whole nest is cumulated with cohort_cumulation). None keeps every rank
 
         Returns
         ------------
@@ -60,38 +102,594 @@ class OTUnest:
 
         """ 
         self.nest = {}
+        self.store = store
+        if store is not None and cohort_cumulation:
+            print('[ERROR] cohort_cumulation needs the samples in memory, it is not available with a MatrixStore')
+            cohort_cumulation = False
 
         files = [f for f in os.listdir(input_folder) if extension in f]
-        files_dir = [input_folder+'/'+f for f in files]
-        for f, n in zip(files_dir, files):
-            if self.verbose>=1 : print(n)
-            tmpOTUdata = OTUdata(f, input_type, artifact_threshold, self.verbose, extension)
-            
+        if cohort_cumulation and any((detect_input_type(input_folder+'/'+f) if input_type.lower() == 'auto' else input_type.lower()) in REPORT_INPUT_TYPES for f in files):
+            if self.verbose >= 1 : print('[COHORT CUMULATION] not used for kraken2/metaphlan reports, samples are cumulated one at a time')
+            cohort_cumulation = False
+        if cache is not None and taxonomy_fingerprint(self.ncbi) is None:
+            print('[CACHE] the taxonomy has no database file to key the cached samples on, the cache is not used')
+            cache = None
+        tasks = [(input_folder+'/'+f, input_type, extension, artifact_threshold, make_clade_relative, cumulate, cohort_cumulation, kingdoms, ranks, cache) for f in files]
+
+        if n_jobs > 1 and len(tasks) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker, initargs=(worker_backend(self.ncbi), self.migration, self.verbose)) as executor:
+                samples = executor.map(build_sample, tasks, chunksize=max(1, len(tasks)//(n_jobs*4)))
+                for sample in samples:
+                    self.add_sample(*sample)
+        else:
+            for task in tasks:
+                if self.verbose>=1 : print(task[0].split('/')[-1])
+                self.add_sample(*build_sample(task, self.ncbi, self.migration, self.verbose))
+
+        if cohort_cumulation and (make_clade_relative or cumulate):
+            self.cohort_taxa_cumulation(make_clade_relative)
+        if cohort_cumulation and ranks is not None:
+            self.keep_ranks(ranks)
+
+        if store is not None:
+            store.flush()
+            return store
+
+        return self.to_dataframe()
+
+    def build_from_kaiju_table(self, file_loc, lineage_ranks=None, extension=None, artifact_threshold=0, make_clade_relative=True, cumulate=False, kingdoms=None, ranks=None):
+        """
+        Creates OTUnest object from one kaiju2table output merging many samples, read in a single streaming pass.
+        If kaiju2table was run with -l, the lineages are taken from the names of the taxon_name column without per taxa id lookups:
+        the distinct names of the file are translated at once with TaxonomyIndex.resolve_named_lineages(), homonyms (e.g. 'Bacillus')
+        being told apart by the rank above, and a numeric name is taken as a taxa id. The taxonomy lineage (resolve_lineages()) is only
+        looked up for the taxa id without -l names, or whose names are ambiguous or do not resolve to the taxa id of the row.
+        A taxa id the taxonomy does not hold keeps the lineage of its names, its own taxa id standing for a lowest name that is not found.
+
+        Parameters
+        ------------
+        file_loc: str,
+            location/file name of the kaiju2table output file
+
+        lineage_ranks: list [str],
+            the ranks given to kaiju2table -l, in the same order, if None the 7 basic ranks
+
+        extension: str,
+            the known/desired extension cut off the file column to get the sample id, see OTUdata.process_file_name_with_known_extension()
+
+        artifact_threshold: int,
+            threshold for artifact range, if it is lower than threshold, the OTU is not added to the sample
+
+        make_clade_relative, cumulate: boolean,
+            as in build_from_folder()
+
+        kingdoms, ranks: list [str],
+            as in build_from_folder(), the rows of other kingdoms are dropped before cumulation
+
+        Returns
+        ------------
+        pandas dataframe object
+
+        """
+        if lineage_ranks is None:
+            lineage_ranks = self.basic_ranks
+        ncbi = self.ncbi
+        if ncbi is None:
+            ncbi = get_shared_cache()
+        migration = self.migration
+        if migration is None:
+            migration = TaxonomyMigration(verbose=self.verbose)
+
+        self.store = None
+        samples = {}
+        for file_column, taxid, count, lineage in stream_kj_table(file_loc, artifact_threshold):
+            sample = samples.setdefault(get_file_id(file_column, extension), ([], [], []))
+            sample[0].append(taxid)
+            sample[1].append(count)
+            sample[2].append(lineage)
+
+        ## the -l names give the lineage of a taxa id without taxonomy lookups, every distinct (taxa id, names) pair is resolved once
+        samples = {file_id: (migration.migrate_array(taxids), counts, lineages) for file_id, (taxids, counts, lineages) in samples.items()}
+        pairs = {} ## (taxa id, lineage names) to their row in the named lineage table
+        for taxids, _, lineages in samples.values():
+            for taxid, lineage in zip(taxids.tolist(), lineages):
+                if taxid > 0 and len(lineage) == len(lineage_ranks):
+                    pairs.setdefault((taxid, lineage), len(pairs))
+        basic_columns = [self.basic_ranks.index(rank) if rank in self.basic_ranks else -1 for rank in lineage_ranks]
+        named_lineages = [[(column, name) for name, column in zip(lineage, basic_columns) if column >= 0 and name != 'NA'] for _, lineage in pairs]
+        named_table, ambiguous = resolve_named_lineages(ncbi, named_lineages, self.basic_ranks)
+
+        ## the names are kept when their lowest one resolves to the taxa id of the row itself
+        lowest_columns = np.array([named[-1][0] if named else 0 for named in named_lineages], dtype=np.int64)
+        pair_taxids = np.array([taxid for taxid, _ in pairs], dtype=np.int64)
+        named_resolved = named_table[np.arange(len(pairs)), lowest_columns] == pair_taxids
+        named_resolved[list(ambiguous)] = False
+        named_resolved = np.append(named_resolved, False) ## row -1 of the rows without -l names
+
+        ## the taxonomy is only looked up for the taxa id without -l names, or whose names are ambiguous or do not lead to them
+        named_rows = {}
+        for file_id, (taxids, _, lineages) in samples.items():
+            named_rows[file_id] = np.array([pairs.get(key, -1) for key in zip(taxids.tolist(), lineages)], dtype=np.int64)
+        looked_up = [taxids[~named_resolved[named_rows[file_id]]] for file_id, (taxids, _, _) in samples.items()]
+        lookup_taxids = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)]+looked_up))
+        lookup_lineages = np.asarray(lineage_matrix(ncbi, lookup_taxids, self.basic_ranks), dtype=np.int64).reshape(len(lookup_taxids), len(self.basic_ranks))
+
+        self.nest = {}
+        for file_id, (taxids, counts, lineages) in samples.items():
+            rows = named_rows[file_id]
+            named = named_resolved[rows]
+            lineages_table = np.zeros((len(taxids), len(self.basic_ranks)), dtype=np.int64)
+            lineages_table[named] = named_table[rows[named]]
+            lineages_table[~named] = lookup_lineages[np.searchsorted(lookup_taxids, taxids[~named])]
+
+            ## a taxa id the taxonomy does not hold keeps the lineage of its names, it stands for a lowest name that is not found
+            for row in np.flatnonzero(~named & (rows >= 0) & ~lineages_table.any(axis=1)).tolist():
+                lineages_table[row] = named_table[rows[row]]
+                if named_lineages[rows[row]]:
+                    lowest_column = named_lineages[rows[row]][-1][0]
+                    if lineages_table[row, lowest_column] == 0:
+                        lineages_table[row, lowest_column] = taxids[row]
+
+            kept = taxids > 0 ## deleted taxa id
+            if kingdoms is not None:
+                kept &= np.isin(lineages_table[:, self.basic_ranks.index('superkingdom')], [taxid for taxid, kingdom in SUPERKINGDOM_TAXIDS.items() if kingdom in kingdoms])
+            self.add_table_sample(file_id, taxids[kept], np.asarray(counts, dtype=np.int64)[kept], lineages_table[kept], make_clade_relative, cumulate)
+
+        if ranks is not None:
+            self.keep_ranks(ranks)
+
+        return self.to_dataframe()
+
+    def add_table_sample(self, file_id, taxids, counts, lineages, make_clade_relative=True, cumulate=False):
+        """
+        Adds one sample of build_from_kaiju_table() to the nest given the lineage table of its taxa id,
+        cumulation and clade relative abundance are computed from the table (see cumulation.cumulate_reads()).
+
+        Parameters
+        ------------
+        file_id: str,
+            sample id
+
+        taxids: numpy array,
+            NCBI Taxanomy IDs of the sample
+
+        counts: numpy array,
+            read counts of every taxa id
+
+        lineages: numpy array,
+            lineage table of the taxa id, columns are self.basic_ranks
+
+        make_clade_relative, cumulate: boolean,
+            as in build_from_folder()
+
+        Returns
+        ------------
+        N/A
+        """
+        ranks = {rank: set() for rank in self.basic_ranks}
+        superkingdom = {sk: set() for sk in self.superkingdom.keys()}
+        superkingdom_column = self.basic_ranks.index('superkingdom')
+        for taxid, superkingdom_taxid in zip(taxids.tolist(), lineages[:, superkingdom_column].tolist()):
+            if superkingdom_taxid in SUPERKINGDOM_TAXIDS:
+                superkingdom[SUPERKINGDOM_TAXIDS[superkingdom_taxid]].add(taxid)
+
+        if make_clade_relative or cumulate:
+            nodes, node_counts, node_ranks, node_rows = cumulate_reads(taxids, counts, lineages)
+            no_lineage = ~lineages.any(axis=1)
+            otufile = dict(zip(taxids[no_lineage].tolist(), counts[no_lineage].tolist()))
             if make_clade_relative:
-                tmpOTUdata.turn_reads_to_clade_relative_abundance()
-            elif cumulate:
-                tmpOTUdata.taxa_cumulation()
-                
-            for rank in self.ranks.keys():
-                self.ranks[rank].update(tmpOTUdata.ranks[rank])
-            for sk in self.superkingdom.keys():
-                self.superkingdom[sk].update(tmpOTUdata.superkingdom[sk])
+                rank_totals = np.bincount(node_ranks, weights=node_counts, minlength=len(self.basic_ranks))
+                node_counts = node_counts/rank_totals[node_ranks]
+            otufile.update(zip(nodes.tolist(), node_counts.tolist()))
+            members = zip(nodes.tolist(), node_ranks.tolist(), lineages[node_rows, superkingdom_column].tolist())
+        else:
+            otufile = dict(zip(taxids.tolist(), counts.tolist()))
+            rows, columns = np.nonzero(lineages == taxids[:, None]) ## a taxa id at a basic rank appears in its own lineage row
+            members = zip(taxids[rows].tolist(), columns.tolist(), lineages[rows, superkingdom_column].tolist())
+
+        for taxid, rank_index, superkingdom_taxid in members:
+            ranks[self.basic_ranks[rank_index]].add(taxid)
+            if superkingdom_taxid in SUPERKINGDOM_TAXIDS:
+                superkingdom[SUPERKINGDOM_TAXIDS[superkingdom_taxid]].add(taxid)
+
+        self.add_sample(file_id, otufile, ranks, superkingdom)
+
+    def add_sample(self, file_id, otufile, ranks, superkingdom):
+        """
+        Adds one sample read by build_sample() to the nest (or to self.store) and merges its ranks/superkingdom sets into the nest ones.
+
+        Parameters
+        ------------
+        file_id: str,
+            sample id
+
+        otufile: dict,
+            reads dictionary of the sample
+
+        ranks: dict,
+            OTUdata.ranks of the sample
+
+        superkingdom: dict,
+            OTUdata.superkingdom of the sample
+
+        Returns
+        ------------
+        N/A
+        """
+        for rank in self.ranks.keys():
+            self.ranks[rank].update(ranks[rank])
+        for sk in self.superkingdom.keys():
+            self.superkingdom[sk].update(superkingdom[sk])
+
+        if self.store is not None:
+            self.store.add_sample(file_id, list(otufile.keys()), list(otufile.values()))
+        else:
+            self.nest[file_id] = otufile
+
+    def keep_ranks(self, desired_ranks):
+        """
+        Keeps only the taxa id of the desired ranks in every sample of the nest, in self.ranks and in self.superkingdom.
+
+        Parameters
+        ------------
+        desired_ranks : list [str], 
+            the desired taxanomy_ranks made up of str
+
+        Returns
+        ------------
+        N/A
+        """
+        desired_ranks = [rank.lower() for rank in desired_ranks]
+        kept = set()
+        for rank in self.basic_ranks:
+            if rank in desired_ranks:
+                kept.update(self.ranks[rank])
+            else:
+                self.ranks[rank] = set()
+        for sample_id, otufile in self.nest.items():
+            self.nest[sample_id] = {taxid: value for taxid, value in otufile.items() if taxid in kept}
+        for sk in self.superkingdom.keys():
+            self.superkingdom[sk] = self.superkingdom[sk] & kept
+
+    def build_ancestry_matrix(self, taxids):
+        """
+        Builds the sparse (taxa id x basic rank taxa id) ancestry matrix used by cohort_taxa_cumulation().
+        Row i has a 1 in the column of every basic rank taxa id in the lineage of taxids[i] (itself included if it is at a basic rank).
+        A taxa id without any basic rank in its lineage keeps a column of its own, as it is left untouched by OTUdata.taxa_cumulation().
+
+        Parameters
+        ------------
+        taxids: numpy array [int],
+            NCBI Taxanomy IDs (rows of the matrix)
+
+        Returns
+        ------------
+        ancestry: scipy sparse csr matrix,
+            int64 matrix of shape (n taxa id, n nodes)
+
+        nodes: numpy array,
+            taxa id of every column of the matrix
+
+        node_ranks: numpy array,
+            index into self.basic_ranks of the rank of every column, -1 for the taxa id without basic rank
+        """
+        from scipy import sparse ## scipy is only imported when needed, parsing does not need it
+
+        ncbi = self.ncbi
+        if ncbi is None:
+            ncbi = get_shared_cache()
+
+        lineages = lineage_matrix(ncbi, taxids, self.basic_ranks)
+        leaf_rows, rank_columns = np.nonzero(lineages)
+        node_taxids = lineages[leaf_rows, rank_columns].astype(np.int64)
+
+        no_lineage = np.flatnonzero(~lineages.any(axis=1))
+        leaf_rows = np.r_[leaf_rows, no_lineage]
+        node_taxids = np.r_[node_taxids, np.asarray(taxids, dtype=np.int64)[no_lineage]]
+        rank_columns = np.r_[rank_columns, np.full(len(no_lineage), -1)]
+
+        nodes, node_columns = np.unique(node_taxids, return_inverse=True)
+        node_ranks = np.full(len(nodes), -1, dtype=np.int64)
+        node_ranks[node_columns] = rank_columns
 
-            self.nest[tmpOTUdata.file_id] = tmpOTUdata.otufile
+        ancestry = sparse.csr_matrix((np.ones(len(leaf_rows), dtype=np.int64), (leaf_rows, node_columns)), shape=(len(taxids), len(nodes)))
+
+        return ancestry, nodes, node_ranks
+
+    def cohort_taxa_cumulation(self, make_clade_relative=False):
+        """
+        Cumulates every (not yet cumulated) sample of the nest at once, giving the same result as OTUdata.taxa_cumulation() on each sample.
+        The (samples x taxa id) count matrix is multiplied by the (taxa id x basic rank taxa id) ancestry matrix,
+        which is built once from the union of the taxa id of the nest, so the cost does not grow with a per sample lineage walk.
+
+        Parameters
+        ------------
+        make_clade_relative: boolean,
+            also turn the cumulated reads into clade relative abundance, see OTUdata.turn_reads_to_clade_relative_abundance()
+
+        Returns
+        ------------
+        N/A
+        """
+        from scipy import sparse ## scipy is only imported when needed, parsing does not need it
+
+        sample_ids = list(self.nest.keys())
+        taxids = set()
+        for otufile in self.nest.values():
+            taxids.update(otufile.keys())
+        taxids.difference_update([-1, 1, 131567]) ## root ids are removed before cumulation, as in OTUdata.taxa_cumulation()
+        taxids = np.array(sorted(taxids), dtype=np.int64)
+        taxid_column = {taxid: column for column, taxid in enumerate(taxids.tolist())}
+
+        rows, columns, values = [], [], []
+        for row, sample_id in enumerate(sample_ids):
+            for taxid, count in self.nest[sample_id].items():
+                if taxid in taxid_column:
+                    rows.append(row)
+                    columns.append(taxid_column[taxid])
+                    values.append(count)
+        counts = sparse.csr_matrix((values, (rows, columns)), shape=(len(sample_ids), len(taxids)))
+
+        ancestry, nodes, node_ranks = self.build_ancestry_matrix(taxids)
+        cumulated = (counts @ ancestry.astype(counts.dtype)).tocsr()
+        cumulated.eliminate_zeros()
+
+        for rank_index, rank in enumerate(self.basic_ranks):
+            self.ranks[rank].update(nodes[node_ranks == rank_index].tolist())
+        superkingdoms = assign_clades(self.ncbi if self.ncbi is not None else get_shared_cache(), nodes, list(SUPERKINGDOM_TAXIDS))
+        for taxid, superkingdom_taxid in zip(nodes.tolist(), superkingdoms.tolist()):
+            if superkingdom_taxid in SUPERKINGDOM_TAXIDS:
+                self.superkingdom[SUPERKINGDOM_TAXIDS[superkingdom_taxid]].add(taxid)
+
+        if make_clade_relative:
+            cumulated = cumulated.astype(np.float64).tocoo()
+            ranked = node_ranks >= 0
+            rank_indicator = sparse.csr_matrix((np.ones(int(ranked.sum())), (np.flatnonzero(ranked), node_ranks[ranked])), shape=(len(nodes), len(self.basic_ranks)))
+            clade_read_counts = np.asarray((cumulated @ rank_indicator).todense()) ## (samples x ranks) total reads of every rank
+            entry_ranks = node_ranks[cumulated.col]
+            scaled = entry_ranks >= 0
+            totals = clade_read_counts[cumulated.row[scaled], entry_ranks[scaled]]
+            cumulated.data[scaled] = cumulated.data[scaled]/totals
+            cumulated = cumulated.tocsr()
+
+        for row, sample_id in enumerate(sample_ids):
+            start, end = cumulated.indptr[row], cumulated.indptr[row+1]
+            self.nest[sample_id] = dict(zip(nodes[cumulated.indices[start:end]].tolist(), cumulated.data[start:end].tolist()))
+
+    def resolve_lineages(self, taxids=None):
+        """
+        Resolves the basic rank lineage of every taxa id in the nest in one call, see TaxonomyIndex.resolve_lineages().
+
+        Parameters
+        ------------
+        taxids: list/array [int],
+            NCBI Taxanomy IDs, if None the union of the taxa id of every sample in the nest is used
+
+        Returns
+        ------------
+        pandas dataframe object
+            rows = taxa id, columns = basic ranks, each value is the taxa id of the ancestor at the rank (0 if there is none)
+        """
+        if taxids is None:
+            taxids = set()
+            for otufile in self.nest.values():
+                taxids.update(otufile.keys())
+            taxids = sorted(taxids)
+
+        ncbi = self.ncbi
+        if ncbi is None:
+            ncbi = get_shared_cache()
+
+        import pandas as pd ## pandas is only imported when a dataframe is built, parsing does not need it
+        return pd.DataFrame(lineage_matrix(ncbi, taxids, self.basic_ranks), index=taxids, columns=self.basic_ranks)
+
+    def migrate(self, migration):
+        """
+        Migrates an already built nest to an updated taxonomy without re-parsing the raw files,
+        every sample and the ranks/superkingdom sets are remapped with the migration table.
+
+        Parameters
+        ------------
+        migration: TaxonomyMigration(),
+            taxa id migration table, e.g. TaxonomyMigration(taxdump='taxdump.tar.gz')
+
+        Returns
+        ------------
+        pandas dataframe object
+
+        """ 
+        for sample_id in self.nest.keys():
+            self.nest[sample_id] = migration.migrate_dict(self.nest[sample_id])
+        for rank in self.ranks.keys():
+            self.ranks[rank] = migration.migrate_set(self.ranks[rank])
+        for sk in self.superkingdom.keys():
+            self.superkingdom[sk] = migration.migrate_set(self.superkingdom[sk])
 
         return self.to_dataframe()
 
-    def to_dataframe(self):
+    def to_dataframe(self, sparse=False):
         """
         Turns OTUnest nest object from dictionary to a pandas dataframe.
 
         Parameters
         ------------
-        N/A 
+        sparse: boolean,
+            if True the dataframe has sparse columns built from to_scipy_sparse() (no dense intermediate),
+            read counts keep an integer dtype and taxa id missing from a sample are the sparse fill value (0 for read counts)
 
         Returns
         ------------
         pandas dataframe object
 
         """ 
+        import pandas as pd ## pandas is only imported when a dataframe is built, parsing does not need it
+        if sparse:
+            matrix, sample_ids, taxids = self.to_scipy_sparse()
+            return pd.DataFrame.sparse.from_spmatrix(matrix, index=sample_ids, columns=taxids)
+
         return pd.DataFrame(self.nest).transpose()
+
+    def to_scipy_sparse(self):
+        """
+        Builds the (samples x taxa id) matrix of the nest directly in CSR format, see sparse_matrix.nest_to_csr().
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        matrix: scipy sparse csr matrix,
+            int64 for read counts, float64 for relative abundance
+
+        sample_ids: numpy array,
+            sample id of every row
+
+        taxids: numpy array,
+            sorted taxa id of every column
+        """
+        return nest_to_csr(self.nest)
+
+worker_ncbi = None
+worker_migration = None
+worker_verbose = 0
+
+def worker_backend(ncbi):
+    """
+    Describes a taxonomy backend so that a worker process can open its own copy, instead of receiving a pickled copy of the whole taxonomy.
+
+    Parameters
+    ------------
+    ncbi: NCBITaxa(), TaxonomyIndex(), TaxonomyCache() or None,
+        the taxonomy backend of the nest, None stands for get_shared_cache()
+
+    Returns
+    ------------
+    backend: tuple,
+        (kind, location), kind being 'snapshot' or 'index' (TaxonomyIndex snapshot or taxa.sqlite), 'ete3' (taxa.sqlite) or 'shared' (the worker's own get_shared_cache())
+    """
+    if ncbi is None:
+        ncbi = get_shared_cache()
+    if hasattr(ncbi, 'get_backend'): ## TaxonomyCache, its backend is opened in the worker (behind the worker's own cache)
+        ncbi = ncbi.backend
+    if ncbi is None:
+        return ('shared', None)
+    if getattr(ncbi, 'snapshot', None) is not None:
+        return ('snapshot', ncbi.snapshot)
+    if hasattr(ncbi, 'resolve_lineages'):
+        return ('index', ncbi.dbfile)
+    return ('ete3', getattr(ncbi, 'dbfile', None))
+
+def taxonomy_fingerprint(ncbi):
+    """
+    Identifies the taxonomy database of a backend for the SampleCache key, so samples parsed with another
+    (or an updated) taxonomy are not loaded from the cache. Only the database file is used, not the kind of backend,
+    so a shared cache gives the same key before and after it opens its ete3 backend, and an index of a taxa.sqlite the same key as ete3.
+
+    Parameters
+    ------------
+    ncbi: NCBITaxa(), TaxonomyIndex(), TaxonomyCache() or None,
+        see worker_backend()
+
+    Returns
+    ------------
+    fingerprint: tuple,
+        (location, size, modification time) of the taxa.sqlite or TaxonomyIndex snapshot of the backend,
+        ete3's default taxa.sqlite for a shared cache whose backend is not opened yet,
+        None if the taxonomy has no database file (e.g. a TaxonomyIndex loaded in memory), its samples can not be cached
+    """
+    kind, location = worker_backend(ncbi)
+    if location is None and kind in ('shared', 'ete3'):
+        location = os.path.join(os.environ.get('HOME', '/'), '.etetoolkit', 'taxa.sqlite') ## NCBITaxa() default database
+    if location is None:
+        return None
+    location = os.path.abspath(location)
+    try:
+        status = os.stat(location)
+    except OSError:
+        return (location,)
+    return (location, status.st_size, status.st_mtime_ns)
+
+def init_worker(backend, migration, verbose):
+    """
+    Process pool initializer, opens the taxonomy backend of the worker once.
+
+    Parameters
+    ------------
+    backend: tuple,
+        from worker_backend()
+
+    migration: TaxonomyMigration(),
+        taxa id migration table of the nest
+
+    verbose: int,
+        verbose level of the nest
+
+    Returns
+    ------------
+    N/A
+    """
+    global worker_ncbi, worker_migration, worker_verbose
+    kind, location = backend
+    cache = get_shared_cache()
+    if kind == 'snapshot':
+        from .TaxonomyIndex import TaxonomyIndex
+        cache.set_backend(TaxonomyIndex(snapshot=location))
+    elif kind == 'index':
+        from .TaxonomyIndex import TaxonomyIndex
+        cache.set_backend(TaxonomyIndex(location))
+    elif kind == 'ete3' and location is not None:
+        from ete3 import NCBITaxa
+        cache.set_backend(NCBITaxa(dbfile=location))
+    worker_ncbi = cache
+    worker_migration = migration
+    worker_verbose = verbose
+
+def build_sample(task, ncbi=None, migration=None, verbose=None):
+    """
+    Reads (and cumulates) one file of OTUnest.build_from_folder(), in this process or in a worker process.
+
+    Parameters
+    ------------
+    task: tuple,
+        (file location, input_type, extension, artifact_threshold, make_clade_relative, cumulate, cohort_cumulation, kingdoms, ranks, SampleCache() or None)
+
+    ncbi, migration, verbose:
+        as in OTUnest, the ones given to init_worker() are used when None
+
+    Returns
+    ------------
+    sample: tuple,
+        (file_id, otufile, ranks, superkingdom), see OTUnest.add_sample()
+    """
+    file_loc, input_type, extension, artifact_threshold, make_clade_relative, cumulate, cohort_cumulation, kingdoms, ranks, cache = task
+    if ncbi is None:
+        ncbi = worker_ncbi
+    if migration is None:
+        migration = worker_migration
+    if verbose is None:
+        verbose = worker_verbose
+
+    if cache is not None:
+        params = ('otu', input_type.lower(), extension, artifact_threshold, make_clade_relative, cumulate, cohort_cumulation, kingdoms, ranks,
+                  taxonomy_fingerprint(ncbi), migration.fingerprint() if migration is not None else None)
+        arrays = cache.load(file_loc, params)
+        if arrays is not None:
+            return unpack_otu_sample(arrays)
+
+    tmpOTUdata = OTUdata(file_loc, input_type, artifact_threshold, verbose, extension, ncbi=ncbi, migration=migration, kingdoms=kingdoms)
+
+    if cohort_cumulation:
+        pass ## cumulated for the whole nest by OTUnest.cohort_taxa_cumulation()
+    elif make_clade_relative:
+        tmpOTUdata.turn_reads_to_clade_relative_abundance()
+    elif cumulate:
+        tmpOTUdata.taxa_cumulation()
+    if ranks is not None and not cohort_cumulation:
+        tmpOTUdata.keep_ranks(ranks)
+
+    if cache is not None:
+        cache.store(file_loc, params, pack_otu_sample(tmpOTUdata.file_id, tmpOTUdata.otufile, tmpOTUdata.ranks, tmpOTUdata.superkingdom, tmpOTUdata.cumulated, tmpOTUdata.clade_relative))
+
+    return tmpOTUdata.file_id, tmpOTUdata.otufile, tmpOTUdata.ranks, tmpOTUdata.superkingdom
@@ -0,0 +1,282 @@
+"""
+    SampleCache object is an on-disk cache of parsed samples, so unchanged input files are not parsed and cumulated again on every run.
+    Every entry is a compact columnar .npz file (taxa id / gene id, counts, rank and superkingdom codes, cumulated/clade relative flags,
+    interned stratified gene rows)
+    named after a key made of the file path, size and modification time and of the parse parameters
+    (for OTU samples these include the taxonomy database and taxa id migration table fingerprints, see OTUnest.build_sample()).
+    The cache has a size cap, the least recently used entries are evicted first.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+from .TaxonomyIndex import BASIC_RANKS
+from .CompactOTUdata import KINGDOMS
+from .StratifiedGeneTable import StratifiedGeneTable
+from .IdInterner import IdInterner
+
+SAMPLE_CACHE_VERSION = 1
+
+class SampleCache:
+    def __init__(self, cache_dir, max_size=2*1024**3, verbose=0):
+        """
+        Creates SampleCache object
+
+        Parameters
+        ------------
+        cache_dir: str,
+            folder of the cache entries, created if missing
+
+        max_size: int,
+            maximum total size of the entries in bytes, the least recently used entries are removed above it (None for no cap)
+
+        verbose: int,
+            prints cache hits/evictions when >= 1
+
+        Returns
+        ------------
+        N/A
+
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.verbose = verbose
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_key(self, file_loc, params):
+        """
+        Parameters
+        ------------
+        file_loc: str,
+            location of the input file
+
+        params: tuple,
+            parse parameters changing the parsed sample (input type, artifact_threshold, cumulation, ...), must have a stable repr()
+
+        Returns
+        ------------
+        key: str,
+            hex digest of the file path, size, modification time and parse parameters
+        """
+        status = os.stat(file_loc)
+        fingerprint = json.dumps([SAMPLE_CACHE_VERSION, os.path.abspath(file_loc), status.st_size, status.st_mtime_ns, repr(params)])
+        return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+    def get_entry_path(self, key):
+        """
+        Parameters
+        ------------
+        key: str,
+            from get_key()
+
+        Returns
+        ------------
+        path: str,
+            location of the entry file
+        """
+        return os.path.join(self.cache_dir, key+'.npz')
+
+    def load(self, file_loc, params):
+        """
+        Parameters
+        ------------
+        file_loc: str,
+            location of the input file
+
+        params: tuple,
+            parse parameters, see get_key()
+
+        Returns
+        ------------
+        arrays: dict,
+            the arrays of the entry, None if the file is not cached (or was changed since)
+        """
+        path = self.get_entry_path(self.get_key(file_loc, params))
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+        except (OSError, ValueError): ## missing, evicted meanwhile by another process or unreadable
+            return None
+
+        os.utime(path) ## marks the entry as recently used
+        if self.verbose >= 1 : print('[SAMPLE CACHE] %s loaded from cache'%file_loc)
+        return arrays
+
+    def store(self, file_loc, params, arrays):
+        """
+        Parameters
+        ------------
+        file_loc: str,
+            location of the input file
+
+        params: tuple,
+            parse parameters, see get_key()
+
+        arrays: dict,
+            the arrays to store, e.g. from pack_otu_sample()
+
+        Returns
+        ------------
+        N/A
+        """
+        path = self.get_entry_path(self.get_key(file_loc, params))
+        tmp_path = '%s.%s.tmp.npz'%(path[:-4], os.getpid())
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path) ## readers never see a half written entry
+
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache is below max_size.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        N/A
+        """
+        if self.max_size is None:
+            return
+
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz') and '.tmp.' not in name:
+                try:
+                    status = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((status.st_mtime_ns, status.st_size, name))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total_size -= size
+            if self.verbose >= 1 : print('[SAMPLE CACHE] %s evicted'%name)
+
+    def clear(self):
+        """
+        Removes every entry, to be called e.g. after the taxonomy database was updated.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        N/A
+        """
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
+
+def pack_otu_sample(file_id, otufile, ranks, superkingdom, cumulated=False, clade_relative=False):
+    """
+    Parameters
+    ------------
+    file_id, otufile, ranks, superkingdom, cumulated, clade_relative:
+        as in OTUdata
+
+    Returns
+    ------------
+    arrays: dict,
+        columnar arrays of the sample, see SampleCache.store()
+    """
+    rank_taxids = [taxid for rank in BASIC_RANKS for taxid in ranks[rank]]
+    rank_codes = [code for code, rank in enumerate(BASIC_RANKS) for _ in ranks[rank]]
+    kingdom_taxids = [taxid for kingdom in KINGDOMS for taxid in superkingdom[kingdom]]
+    kingdom_codes = [code for code, kingdom in enumerate(KINGDOMS) for _ in superkingdom[kingdom]]
+
+    return {'file_id': np.array(file_id),
+            'taxids': np.fromiter(otufile.keys(), dtype=np.int64, count=len(otufile)),
+            'counts': np.array(list(otufile.values())),
+            'rank_taxids': np.array(rank_taxids, dtype=np.int64),
+            'rank_codes': np.array(rank_codes, dtype=np.int8),
+            'kingdom_taxids': np.array(kingdom_taxids, dtype=np.int64),
+            'kingdom_codes': np.array(kingdom_codes, dtype=np.int8),
+            'flags': np.array([cumulated, clade_relative])}
+
+def unpack_otu_sample(arrays):
+    """
+    Parameters
+    ------------
+    arrays: dict,
+        from pack_otu_sample() or SampleCache.load()
+
+    Returns
+    ------------
+    sample: tuple,
+        (file_id, otufile, ranks, superkingdom), as given to OTUnest.add_sample()
+    """
+    otufile = dict(zip(arrays['taxids'].tolist(), arrays['counts'].tolist()))
+    ranks = {rank: set(arrays['rank_taxids'][arrays['rank_codes'] == code].tolist()) for code, rank in enumerate(BASIC_RANKS)}
+    superkingdom = {kingdom: set(arrays['kingdom_taxids'][arrays['kingdom_codes'] == code].tolist()) for code, kingdom in enumerate(KINGDOMS)}
+
+    return str(arrays['file_id']), otufile, ranks, superkingdom
+
+def pack_gene_sample(file_id, gene_codes, values, genes, stratified=None):
+    """
+    Parameters
+    ------------
+    file_id, gene_codes, values, stratified:
+        as in GeneData
+
+    genes: IdInterner(),
+        code table of gene_codes (and of the stratified genes), only the strings of the sample are stored
+
+    Returns
+    ------------
+    arrays: dict,
+        columnar arrays of the sample, see SampleCache.store()
+    """
+    values = np.asarray(values)
+    arrays = {'file_id': np.array(file_id),
+            'genes': genes.lookup(gene_codes).astype(str),
+            'values': values.astype(str) if values.dtype == object else values}
+    if stratified is not None:
+        _, stratified_gene_codes, taxon_codes, stratified_values = stratified.to_coo()
+        used_genes, stratified_gene_codes = np.unique(stratified_gene_codes, return_inverse=True) ## codes of a shared table are renumbered
+        arrays.update({'stratified_genes': stratified.genes.lookup(used_genes).astype(str),
+                    'stratified_taxa': np.array(stratified.taxa.names, dtype=str),
+                    'stratified_gene_codes': stratified_gene_codes.astype(np.int32),
+                    'stratified_taxon_codes': taxon_codes,
+                    'stratified_values': stratified_values})
+
+    return arrays
+
+def unpack_gene_sample(arrays):
+    """
+    Parameters
+    ------------
+    arrays: dict,
+        from pack_gene_sample() or SampleCache.load()
+
+    Returns
+    ------------
+    sample: tuple,
+        (file_id, gene codes, values, IdInterner() of the codes, stratified), as given to GeneNest.add_sample(),
+        stratified is None if the sample was cached without its stratified rows
+    """
+    file_id = str(arrays['file_id'])
+    genes = IdInterner(arrays['genes'].tolist())
+    gene_codes = genes.intern_many(arrays['genes'].tolist())
+    values = arrays['values']
+    values = np.array(values.tolist(), dtype=object) if values.dtype.kind == 'U' else values
+    stratified = None
+    if 'stratified_values' in arrays:
+        stratified = StratifiedGeneTable()
+        stratified.genes.intern_many(arrays['stratified_genes'].tolist())
+        stratified.taxa.intern_many(arrays['stratified_taxa'].tolist())
+        stratified.add_coded_sample(file_id, arrays['stratified_gene_codes'], arrays['stratified_taxon_codes'], arrays['stratified_values'])
+
+    return file_id, gene_codes, values, genes, stratified
@@ -0,0 +1,188 @@
+"""
+    StratifiedGeneTable object is for storing the stratified rows of humann2 gene families ('gene|taxa') of many samples.
+    The rows are kept as a sparse COO table of (sample, gene, taxon, value) where genes and taxa are int32 codes of shared IdInterner tables,
+    so no (samples x genes x taxa) dense matrix is ever built. Marginalising over taxa gives the (samples x genes) table
+    and marginalising over genes the (samples x taxa) table.
+"""
+import numpy as np
+from .IdInterner import IdInterner
+
+class StratifiedGeneTable:
+    def __init__(self, genes=None, taxa=None):
+        """
+        Creates StratifiedGeneTable object
+
+        Parameters
+        ------------
+        genes: IdInterner(),
+            gene id code table, can be shared with other tables (e.g. of a GeneNest), a new one if None
+
+        taxa: IdInterner(),
+            taxa code table, a new one if None
+
+        Returns
+        ------------
+        N/A
+
+        """
+        self.genes = genes if genes is not None else IdInterner()
+        self.taxa = taxa if taxa is not None else IdInterner()
+        self.samples = []
+        self.chunks = [] ## (sample codes, gene codes, taxon codes, values) arrays of the samples added since the last to_coo()
+
+    def __len__(self):
+        return sum(len(chunk[3]) for chunk in self.chunks)
+
+    def add_sample(self, sample_id, genes, taxa, values):
+        """
+        Parameters
+        ------------
+        sample_id: str,
+            sample id
+
+        genes: list [str],
+            gene id of every stratified row
+
+        taxa: list [str],
+            taxa of every stratified row (e.g. 'g__Escherichia.s__Escherichia_coli' or 'unclassified')
+
+        values: list [float],
+            abundance of every stratified row
+
+        Returns
+        ------------
+        N/A
+        """
+        self.add_coded_sample(sample_id, self.genes.intern_many(genes), self.taxa.intern_many(taxa), values)
+
+    def add_coded_sample(self, sample_id, gene_codes, taxon_codes, values):
+        """
+        Same as add_sample() with the genes and taxa already given as codes of self.genes/self.taxa.
+
+        Parameters
+        ------------
+        sample_id: str,
+            sample id
+
+        gene_codes, taxon_codes: numpy arrays,
+            int32 codes of every stratified row
+
+        values: numpy array,
+            abundance of every stratified row
+
+        Returns
+        ------------
+        N/A
+        """
+        sample_codes = np.full(len(values), len(self.samples), dtype=np.int32)
+        self.samples.append(sample_id)
+        self.chunks.append((sample_codes, np.asarray(gene_codes, dtype=np.int32), np.asarray(taxon_codes, dtype=np.int32), np.asarray(values, dtype=np.float32)))
+
+    def merge(self, other):
+        """
+        Adds every sample of another table (e.g. of one GeneData, read in a worker process), its codes are remapped onto self.genes/self.taxa.
+
+        Parameters
+        ------------
+        other: StratifiedGeneTable(),
+            the table to merge in, it is left unchanged
+
+        Returns
+        ------------
+        N/A
+        """
+        sample_codes, gene_codes, taxon_codes, values = other.to_coo()
+        if other.genes is not self.genes: ## a shared table needs no remap
+            gene_codes = self.genes.remap(other.genes)[gene_codes]
+        if other.taxa is not self.taxa:
+            taxon_codes = self.taxa.remap(other.taxa)[taxon_codes]
+
+        offset = len(self.samples)
+        self.samples.extend(other.samples)
+        self.chunks.append((sample_codes + np.int32(offset), gene_codes, taxon_codes, values))
+
+    def to_coo(self):
+        """
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        sample_codes, gene_codes, taxon_codes: numpy arrays,
+            int32 sample (position in self.samples), gene (self.genes) and taxon (self.taxa) code of every stratified row
+
+        values: numpy array,
+            float32 abundance of every stratified row
+        """
+        if len(self.chunks) != 1:
+            if self.chunks:
+                self.chunks = [tuple(np.concatenate(arrays) for arrays in zip(*self.chunks))]
+            else:
+                return (np.zeros(0, dtype=np.int32),)*3 + (np.zeros(0, dtype=np.float32),)
+        return self.chunks[0]
+
+    def marginalise(self, axis='taxon'):
+        """
+        Sums the stratified rows over taxa or over genes.
+
+        Parameters
+        ------------
+        axis: str,
+            'taxon' sums over the taxa of every gene, giving a (samples x genes) table,
+            'gene' sums over the genes of every taxon, giving a (samples x taxa) table
+
+        Returns
+        ------------
+        matrix: scipy sparse csr matrix,
+            float64 sums, one column per code of self.genes or self.taxa
+
+        sample_ids: list,
+            sample id of every row
+
+        features: numpy array,
+            gene id or taxa of every column
+        """
+        from scipy import sparse ## scipy is only imported when needed, parsing does not need it
+
+        sample_codes, gene_codes, taxon_codes, values = self.to_coo()
+        if axis == 'taxon':
+            columns, interner = gene_codes, self.genes
+        elif axis == 'gene':
+            columns, interner = taxon_codes, self.taxa
+        else:
+            print("[ERROR] marginalise: axis should be 'taxon' or 'gene'")
+            return None
+
+        ## duplicates (sample, column) entries are summed by the csr conversion
+        matrix = sparse.coo_matrix((values.astype(np.float64), (sample_codes, columns)), shape=(len(self.samples), len(interner))).tocsr()
+
+        return matrix, list(self.samples), np.array(interner.names, dtype=object)
+
+    def get_gene(self, gene):
+        """
+        Taxon resolved abundance of one gene.
+
+        Parameters
+        ------------
+        gene: str,
+            gene id
+
+        Returns
+        ------------
+        matrix: scipy sparse csr matrix,
+            float64 (samples x taxa) abundance of the gene, one column per code of self.taxa
+
+        sample_ids: list,
+            sample id of every row
+
+        taxa: numpy array,
+            taxa of every column
+        """
+        from scipy import sparse ## scipy is only imported when needed, parsing does not need it
+
+        sample_codes, gene_codes, taxon_codes, values = self.to_coo()
+        selected = gene_codes == self.genes.codes.get(gene, -1)
+        matrix = sparse.coo_matrix((values[selected].astype(np.float64), (sample_codes[selected], taxon_codes[selected])), shape=(len(self.samples), len(self.taxa))).tocsr()
+
+        return matrix, list(self.samples), np.array(self.taxa.names, dtype=object)
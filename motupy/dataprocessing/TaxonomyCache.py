@@ -0,0 +1,370 @@
+"""
+    TaxonomyCache object is a bounded LRU cache in front of a taxonomy backend (ete3 NCBITaxa or TaxonomyIndex).
+    It offers the same lookup methods as ete3 NCBITaxa so it can be given anywhere a backend is expected.
+
+    One cache is shared by the whole process (see get_shared_cache()), it is the default backend of OTUdata, OTUnest,
+    the old kaiju readers, describe, EDA and mp_methods, so a taxa id looked up for one sample is a cache hit for every later sample.
+"""
+from collections import OrderedDict
+import numpy as np
+
+class TaxonomyCache:
+    def __init__(self, ncbi=None, max_size=500000):
+        """
+        Creates TaxonomyCache object
+
+        Parameters
+        ------------
+        ncbi: NCBITaxa() or TaxonomyIndex(),
+            taxonomy backend answering the cache misses, if None an ete3 NCBITaxa() is created on the first miss
+
+        max_size: int,
+            maximum number of cached results (lineages, ranks, names and parents at rank all count), the least recently used are evicted first
+
+        Returns
+        ------------
+        N/A
+
+        """
+        self.backend = ncbi
+        self.owns_backend = ncbi is None
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_backend(self):
+        """
+        Returns the taxonomy backend, creating the ete3 NCBITaxa() only when it is first needed.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        ncbi: NCBITaxa() or TaxonomyIndex()
+        """
+        if self.backend is None:
+            from ete3 import NCBITaxa
+            self.backend = NCBITaxa()
+        return self.backend
+
+    def set_backend(self, ncbi):
+        """
+        Replaces the taxonomy backend, the cached results are invalidated.
+
+        Parameters
+        ------------
+        ncbi: NCBITaxa() or TaxonomyIndex(),
+            the new taxonomy backend, if None an ete3 NCBITaxa() is created on the next miss
+
+        Returns
+        ------------
+        N/A
+        """
+        self.invalidate()
+        self.backend = ncbi
+        self.owns_backend = ncbi is None
+
+    def invalidate(self):
+        """
+        Empties the cache and resets the hit/miss counters, to be called when the taxonomy database has been updated
+        (e.g. after NCBITaxa().update_taxonomy_database()). A NCBITaxa() created by the cache itself is reopened on the next miss.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        N/A
+        """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        if self.owns_backend:
+            self.backend = None
+
+    def cache_info(self):
+        """
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        info: dict,
+            hits, misses, current size and max_size of the cache
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'max_size': self.max_size}
+
+    def lookup(self, key):
+        """
+        Parameters
+        ------------
+        key: tuple,
+            (kind of result, query)
+
+        Returns
+        ------------
+        found: boolean,
+            if the key is cached, the counters are updated accordingly
+
+        value:
+            the cached result (None when not found or when the backend has no answer for the query)
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, self.entries[key]
+        self.misses += 1
+        return False, None
+
+    def store(self, key, value):
+        """
+        Parameters
+        ------------
+        key: tuple,
+            (kind of result, query)
+
+        value:
+            the result, None caches the fact that the backend has no answer
+
+        Returns
+        ------------
+        N/A
+        """
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get_lineage(self, taxid):
+        """
+        Same as ete3 NCBITaxa.get_lineage(), served from the cache.
+
+        Parameters
+        ------------
+        taxid: int,
+            NCBI Taxanomy ID
+
+        Returns
+        ------------
+        lineage: list,
+            a list of lineage taxa_id ordered from the root to the given taxa id
+        """
+        taxid = int(taxid)
+        found, lineage = self.lookup(('lineage', taxid))
+        if not found:
+            try:
+                lineage = tuple(self.get_backend().get_lineage(taxid))
+            except ValueError:
+                lineage = None
+            self.store(('lineage', taxid), lineage)
+
+        if lineage is None:
+            raise ValueError('%s taxid not found'%taxid)
+        return list(lineage)
+
+    def batch_lookup(self, kind, queries, backend_method):
+        """
+        Looks up many queries of one kind, the cache misses are sent to the backend in a single call.
+
+        Parameters
+        ------------
+        kind: str,
+            kind of result, e.g. 'rank'
+
+        queries: list,
+            taxa id or names
+
+        backend_method: function,
+            backend method taking a list of queries and returning a dict {query: result}
+
+        Returns
+        ------------
+        results: dict,
+            dictionary where key = query, value = result, queries without an answer are left out
+        """
+        results = {}
+        missing = []
+        for query in queries:
+            found, value = self.lookup((kind, query))
+            if not found:
+                missing.append(query)
+            elif value is not None:
+                results[query] = value
+
+        if missing:
+            fetched = backend_method(missing)
+            for query in missing:
+                value = fetched.get(query)
+                self.store((kind, query), value)
+                if value is not None:
+                    results[query] = value
+
+        return results
+
+    def get_rank(self, taxids):
+        """
+        Same as ete3 NCBITaxa.get_rank(), served from the cache.
+
+        Parameters
+        ------------
+        taxids: list [int],
+            NCBI Taxanomy IDs
+
+        Returns
+        ------------
+        ranks: dict,
+            dictionary where key = taxa id, value = rank name
+        """
+        return self.batch_lookup('rank', [int(taxid) for taxid in taxids], self.get_backend().get_rank)
+
+    def get_taxid_translator(self, taxids):
+        """
+        Same as ete3 NCBITaxa.get_taxid_translator(), served from the cache.
+
+        Parameters
+        ------------
+        taxids: list [int],
+            NCBI Taxanomy IDs
+
+        Returns
+        ------------
+        names: dict,
+            dictionary where key = taxa id, value = scientific name
+        """
+        return self.batch_lookup('name', [int(taxid) for taxid in taxids], self.get_backend().get_taxid_translator)
+
+    def get_name_translator(self, names):
+        """
+        Same as ete3 NCBITaxa.get_name_translator(), served from the cache.
+
+        Parameters
+        ------------
+        names: list [str],
+            taxa names
+
+        Returns
+        ------------
+        taxids: dict,
+            dictionary where key = name, value = list of taxa id with this name
+        """
+        return self.batch_lookup('taxid', list(names), self.get_backend().get_name_translator)
+
+    def get_parent_at_rank(self, taxid, rank):
+        """
+        Parameters
+        ------------
+        taxid: int,
+            NCBI Taxanomy ID
+
+        rank: str,
+            the rank of the ancestor, e.g. 'genus'
+
+        Returns
+        ------------
+        parent_taxid: int,
+            the taxa id of the ancestor at the given rank (the taxa id itself if it is at this rank), None if its lineage has no such rank
+        """
+        taxid = int(taxid)
+        found, parent_taxid = self.lookup(('parent', taxid, rank))
+        if not found:
+            parent_taxid = None
+            lineage = self.get_lineage(taxid)
+            lineage_ranks = self.get_rank(lineage)
+            for ancestor in lineage:
+                if lineage_ranks.get(ancestor) == rank:
+                    parent_taxid = ancestor
+            self.store(('parent', taxid, rank), parent_taxid)
+        return parent_taxid
+
+    def resolve_lineages(self, taxids, ranks):
+        """
+        Same as TaxonomyIndex.resolve_lineages(). A TaxonomyIndex backend resolves the array directly,
+        otherwise every lineage row is cached so repeated taxa id across samples are only resolved once.
+
+        Parameters
+        ------------
+        taxids: list/array [int],
+            NCBI Taxanomy IDs
+
+        ranks: list [str],
+            the ranks making up the columns of the matrix, ordered from highest to lowest
+
+        Returns
+        ------------
+        lineages: numpy array,
+            int32 matrix of shape (n taxa id, n ranks) holding the taxa id of the ancestor at each rank, 0 where the lineage has no such rank.
+        """
+        backend = self.get_backend()
+        if hasattr(backend, 'resolve_lineages'):
+            return backend.resolve_lineages(taxids, ranks)
+
+        from .TaxonomyIndex import lookup_lineages
+        ranks = tuple(ranks)
+        lineages = np.zeros((len(taxids), len(ranks)), dtype=np.int32)
+        missing_rows = []
+        for row, taxid in enumerate(taxids):
+            found, lineage_row = self.lookup(('lineage_row', int(taxid), ranks))
+            if found:
+                lineages[row] = lineage_row
+            else:
+                missing_rows.append(row)
+
+        if missing_rows:
+            missing_taxids = [int(taxids[row]) for row in missing_rows]
+            resolved = lookup_lineages(self, missing_taxids, list(ranks))
+            for row, taxid, lineage_row in zip(missing_rows, missing_taxids, resolved):
+                lineages[row] = lineage_row
+                self.store(('lineage_row', taxid, ranks), lineage_row)
+
+        return lineages
+
+    def assign_clades(self, taxids, clades):
+        """
+        Same as TaxonomyIndex.assign_clades(). A TaxonomyIndex backend answers with its interval labelling,
+        otherwise the cached lineages are searched for the clades.
+
+        Parameters
+        ------------
+        taxids: list/array [int],
+            NCBI Taxanomy IDs
+
+        clades: list [int],
+            taxa id of the clades, when a taxa id is under more than one of them the first one in the list is given
+
+        Returns
+        ------------
+        assigned: numpy array,
+            int64 array holding the clade taxa id of every taxa id, 0 when it is under none of the clades (or not found)
+        """
+        backend = self.get_backend()
+        if hasattr(backend, 'assign_clades'):
+            return backend.assign_clades(taxids, clades)
+
+        from .TaxonomyIndex import lookup_clades
+        return lookup_clades(self, taxids, clades)
+
+shared_cache = None
+
+def get_shared_cache():
+    """
+    Returns the TaxonomyCache shared by the whole process, created (without opening any database) on first call.
+    Use get_shared_cache().set_backend(TaxonomyIndex(...)) to serve every module from an index,
+    and get_shared_cache().invalidate() after updating the taxonomy database.
+
+    Parameters
+    ------------
+    N/A
+
+    Returns
+    ------------
+    cache: TaxonomyCache()
+    """
+    global shared_cache
+    if shared_cache is None:
+        shared_cache = TaxonomyCache()
+    return shared_cache
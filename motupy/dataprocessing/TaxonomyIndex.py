@@ -0,0 +1,779 @@
+"""
+    TaxonomyIndex object is a compact, in-memory copy of the NCBI taxonomy database used by ete3.
+    The tree is stored as flat numpy arrays indexed by taxa id, so that lineage and rank lookups are array reads instead of SQLite queries.
+    It offers the same lookup methods as ete3 NCBITaxa (get_lineage, get_rank, get_taxid_translator, get_name_translator) and can be given to OTUdata/OTUnest in its place.
+
+    The arrays can be exported once into a versioned binary snapshot file and opened again with numpy.memmap,
+    so that opening the taxonomy costs the same whatever its size and all processes reading the snapshot share the OS page cache.
+
+    The tree also carries an Euler tour (pre-order) interval labelling: every taxa id gets its pre-order number and the last pre-order
+    number of its subtree, so "is X under clade Y" is the two integer comparisons pre_order[Y] <= pre_order[X] <= post_order[Y].
+
+    Snapshot layout:
+        8 bytes  : magic b'MOTUTAXS'
+        8 bytes  : length of the json header (little endian uint64)
+        header   : json with the format version, the rank names and {array name: dtype, offset, shape}
+        arrays   : the raw little endian arrays, each starting at a 64 bytes aligned offset
+"""
+import sqlite3
+import json
+import zlib
+import numpy as np
+
+SNAPSHOT_MAGIC = b'MOTUTAXS'
+SNAPSHOT_VERSION = 3 ## version 2 added pre_order/post_order (rebuilt in memory for version 1), version 3 added synonym name records
+SNAPSHOT_ARRAYS = ['parent', 'rank', 'name_index', 'name_offsets', 'name_data', 'name_taxid', 'name_hash', 'merged_old', 'merged_new',
+                   'pre_order', 'post_order']
+
+BASIC_RANKS = ['superkingdom', 'phylum', 'class', 'order', 'family', 'genus', 'species']
+
+def resolve_lineages(ncbi, taxids, ranks=BASIC_RANKS):
+    """
+    Resolves the lineage of many taxa id at once into a lineage matrix, works with any taxonomy backend.
+    Backends with their own resolve_lineages() (TaxonomyIndex, TaxonomyCache) are used directly,
+    other backends (e.g. ete3 NCBITaxa) go through lookup_lineages().
+
+    Parameters
+    ------------
+    ncbi: NCBITaxa(), TaxonomyIndex() or TaxonomyCache(),
+        taxonomy backend
+
+    taxids: list/array [int],
+        NCBI Taxanomy IDs
+
+    ranks: list [str],
+        the ranks making up the columns of the matrix, ordered from highest to lowest
+
+    Returns
+    ------------
+    lineages: numpy array,
+        int32 matrix of shape (n taxa id, n ranks) holding the taxa id of the ancestor at each rank, 0 where the lineage has no such rank.
+        A taxa id at one of the ranks appears in its own row.
+    """
+    if hasattr(ncbi, 'resolve_lineages'):
+        return ncbi.resolve_lineages(taxids, ranks)
+
+    return lookup_lineages(ncbi, taxids, ranks)
+
+def lookup_lineages(ncbi, taxids, ranks=BASIC_RANKS):
+    """
+    Builds the lineage matrix of resolve_lineages() with one get_lineage() and one get_rank() call per taxa id.
+
+    Parameters
+    ------------
+    ncbi: NCBITaxa() or TaxonomyCache(),
+        taxonomy backend
+
+    taxids: list/array [int],
+        NCBI Taxanomy IDs
+
+    ranks: list [str],
+        the ranks making up the columns of the matrix, ordered from highest to lowest
+
+    Returns
+    ------------
+    lineages: numpy array,
+        int32 matrix of shape (n taxa id, n ranks), see resolve_lineages()
+    """
+    rank_column = {rank: column for column, rank in enumerate(ranks)}
+    lineages = np.zeros((len(taxids), len(ranks)), dtype=np.int32)
+    for row, taxid in enumerate(taxids):
+        try:
+            lineage = ncbi.get_lineage(int(taxid))
+        except ValueError:
+            continue
+        lineage_ranks = ncbi.get_rank(lineage)
+        for ancestor in lineage:
+            if lineage_ranks.get(ancestor) in rank_column:
+                lineages[row, rank_column[lineage_ranks[ancestor]]] = ancestor
+
+    return lineages
+
+def assign_clades(ncbi, taxids, clades):
+    """
+    Finds which of the given clades every taxa id belongs to, works with any taxonomy backend.
+    Backends with their own assign_clades() (TaxonomyIndex, TaxonomyCache) are used directly,
+    other backends (e.g. ete3 NCBITaxa) go through lookup_clades().
+
+    Parameters
+    ------------
+    ncbi: NCBITaxa(), TaxonomyIndex() or TaxonomyCache(),
+        taxonomy backend
+
+    taxids: list/array [int],
+        NCBI Taxanomy IDs
+
+    clades: list [int],
+        taxa id of the clades, when a taxa id is under more than one of them the first one in the list is given
+
+    Returns
+    ------------
+    assigned: numpy array,
+        int64 array holding the clade taxa id of every taxa id, 0 when it is under none of the clades (or not found)
+    """
+    if hasattr(ncbi, 'assign_clades'):
+        return ncbi.assign_clades(taxids, clades)
+
+    return lookup_clades(ncbi, taxids, clades)
+
+def lookup_clades(ncbi, taxids, clades):
+    """
+    Clade membership of assign_clades() with one get_lineage() call per taxa id.
+
+    Parameters
+    ------------
+    ncbi: NCBITaxa() or TaxonomyCache(),
+        taxonomy backend
+
+    taxids: list/array [int],
+        NCBI Taxanomy IDs
+
+    clades: list [int],
+        taxa id of the clades, when a taxa id is under more than one of them the first one in the list is given
+
+    Returns
+    ------------
+    assigned: numpy array,
+        int64 array holding the clade taxa id of every taxa id, see assign_clades()
+    """
+    assigned = np.zeros(len(taxids), dtype=np.int64)
+    for row, taxid in enumerate(taxids):
+        try:
+            lineage = ncbi.get_lineage(int(taxid))
+        except ValueError:
+            continue
+        for clade in clades:
+            if clade in lineage:
+                assigned[row] = clade
+                break
+
+    return assigned
+
+def resolve_named_lineages(ncbi, named_lineages, ranks=BASIC_RANKS):
+    """
+    Translates lineages given as names (e.g. kaiju2table -l or MetaPhlAn2 clade paths) into a lineage matrix, works with any taxonomy backend.
+    Every distinct name is translated in a single get_name_translator() call. A name of several taxa id (a homonym, e.g. 'Bacillus'
+    is the bacteria genus 1386 and the stick insect genus 55087) is told apart by the ancestor resolved just above it: only the
+    candidate whose own lineage (resolve_lineages()) holds that ancestor is kept. A name that stays ambiguous is left unresolved, never guessed.
+
+    Parameters
+    ------------
+    ncbi: NCBITaxa(), TaxonomyIndex() or TaxonomyCache(),
+        taxonomy backend
+
+    named_lineages: list [list [(int, str)]],
+        (column of ranks, name) pairs of every lineage, ordered from highest to lowest rank, a numeric name is taken as a taxa id
+
+    ranks: list [str],
+        the ranks making up the columns of the matrix, ordered from highest to lowest
+
+    Returns
+    ------------
+    lineages: numpy array,
+        int64 matrix of shape (n lineages, n ranks) holding the taxa id of every resolved name, 0 where the lineage has no name or it is not resolved
+
+    ambiguous: dict,
+        {row of the matrix: first name of the lineage left unresolved because it has several candidate taxa id}
+    """
+    names = {name for lineage in named_lineages for _, name in lineage if not name.isdigit()}
+    translated = ncbi.get_name_translator(list(names)) if names else {}
+    homonyms = sorted({int(taxid) for taxids in translated.values() if len(taxids) > 1 for taxid in taxids})
+    homonym_lineages = dict(zip(homonyms, resolve_lineages(ncbi, homonyms, ranks).tolist())) if homonyms else {}
+
+    lineages = np.zeros((len(named_lineages), len(ranks)), dtype=np.int64)
+    ambiguous = {}
+    for row, lineage in enumerate(named_lineages):
+        parent_column = -1 ## column of the lowest name resolved so far
+        for column, name in lineage:
+            candidates = [int(name)] if name.isdigit() else [int(taxid) for taxid in translated.get(name, [])]
+            if len(candidates) > 1 and parent_column >= 0:
+                parent = lineages[row, parent_column]
+                candidates = [taxid for taxid in candidates if homonym_lineages[taxid][parent_column] == parent]
+            if len(candidates) == 1:
+                lineages[row, column] = candidates[0]
+                parent_column = column
+            elif candidates and row not in ambiguous:
+                ambiguous[row] = name
+
+    return lineages, ambiguous
+
+class TaxonomyIndex:
+    def __init__(self, dbfile=None, verbose=0, snapshot=None):
+        """
+        Creates TaxonomyIndex object by reading the whole ete3 taxa.sqlite database once, or by memory-mapping a snapshot file.
+
+        Parameters
+        ------------
+        dbfile: str,
+            location of the ete3 taxa.sqlite database, if None the database used by ete3 NCBITaxa() is read.
+
+        verbose: int,
+            prints progress when >= 1
+
+        snapshot: str,
+            location of a snapshot file written by export_snapshot(), if given the database is not read at all.
+
+        Returns
+        ------------
+        N/A
+
+        """
+        self.verbose = verbose
+        self.snapshot = snapshot
+        self.name_hash = None
+        self.pre_order = None
+        self.post_order = None
+
+        if snapshot is not None:
+            self.load_snapshot(snapshot)
+            return
+
+        if dbfile is None:
+            from ete3 import NCBITaxa
+            dbfile = NCBITaxa().dbfile
+
+        self.dbfile = dbfile
+        self.build_from_db(dbfile)
+
+    def build_from_db(self, dbfile, batch_size=200000):
+        """
+        Reads the species and merged tables of the ete3 database into flat arrays:
+            parent : parent taxa id of every taxa id, -1 where the taxa id does not exist and 0 for the root.
+            rank : rank code of every taxa id (index into self.rank_names), -1 where the taxa id does not exist.
+            name_offsets, name_data : utf-8 names of the taxa stored back to back, one record per name (scientific names, then synonyms).
+            name_taxid : taxa id of every name record.
+            name_index : scientific name record of every taxa id, -1 where the taxa id does not exist.
+            merged_old, merged_new : sorted table of merged (old) taxa id and the taxa id they were merged into.
+
+        Parameters
+        ------------
+        dbfile: str,
+            location of the ete3 taxa.sqlite database
+
+        batch_size: int,
+            number of rows fetched from the database at a time
+
+        Returns
+        ------------
+        N/A
+        """
+        connection = sqlite3.connect(dbfile)
+
+        max_taxid = connection.execute('SELECT MAX(taxid) FROM species').fetchone()[0]
+        self.parent = np.full(max_taxid+1, -1, dtype=np.int32)
+        self.rank = np.full(max_taxid+1, -1, dtype=np.int8)
+        self.name_index = np.full(max_taxid+1, -1, dtype=np.int32)
+        self.rank_names = []
+        self.rank_codes = {}
+
+        names = []
+        name_taxid = []
+        cursor = connection.execute('SELECT taxid, parent, spname, rank FROM species')
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            for taxid, parent, spname, rank in rows:
+                if rank not in self.rank_codes:
+                    self.rank_codes[rank] = len(self.rank_names)
+                    self.rank_names.append(rank)
+
+                if parent in ('', None) or int(parent) == taxid: ## the root has no parent
+                    parent = 0
+
+                self.parent[taxid] = int(parent)
+                self.rank[taxid] = self.rank_codes[rank]
+                self.name_index[taxid] = len(names)
+                names.append(spname.encode('utf-8'))
+                name_taxid.append(taxid)
+            if self.verbose >= 1 : print('[TAXONOMY INDEX] %s taxa read'%len(names))
+            rows = cursor.fetchmany(batch_size)
+
+        cursor = connection.execute('SELECT taxid, spname FROM synonym')
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            for taxid, spname in rows:
+                names.append(spname.encode('utf-8'))
+                name_taxid.append(taxid)
+            rows = cursor.fetchmany(batch_size)
+
+        self.set_names(names, name_taxid)
+
+        merged = connection.execute('SELECT taxid_old, taxid_new FROM merged').fetchall()
+        connection.close()
+        merged = np.array(merged, dtype=np.int32).reshape(-1, 2)
+        order = np.argsort(merged[:,0])
+        self.merged_old = merged[order, 0]
+        self.merged_new = merged[order, 1]
+
+    def set_names(self, names, name_taxid):
+        """
+        Packs a list of encoded names into the name_data buffer with its name_offsets.
+
+        Parameters
+        ------------
+        names: list [bytes],
+            utf-8 encoded names, one per name record
+
+        name_taxid: list [int],
+            taxa id of every name record
+
+        Returns
+        ------------
+        N/A
+        """
+        lengths = np.fromiter((len(n) for n in names), dtype=np.int64, count=len(names))
+        self.name_offsets = np.zeros(len(names)+1, dtype=np.int64)
+        np.cumsum(lengths, out=self.name_offsets[1:])
+        self.name_data = np.frombuffer(b''.join(names), dtype=np.uint8)
+        self.name_taxid = np.array(name_taxid, dtype=np.int32)
+
+    def build_name_hash(self):
+        """
+        Builds the open addressing (linear probing) hash table used by get_name_translator().
+        Every slot holds a name record or -1 when empty, names are hashed case insensitively with crc32.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        N/A
+        """
+        n_records = len(self.name_taxid)
+        hashes = np.fromiter((zlib.crc32(self.get_record_name(record)) for record in range(n_records)), dtype=np.uint32, count=n_records)
+
+        size = 2
+        while size < 2*n_records:
+            size *= 2
+        mask = size-1
+        name_hash = np.full(size, -1, dtype=np.int32)
+
+        pending = np.arange(n_records, dtype=np.int32)
+        slots = hashes.astype(np.int64) & mask
+        while pending.size > 0:
+            free = np.flatnonzero(name_hash[slots] == -1)
+            free_slots, first = np.unique(slots[free], return_index=True) ## only one record can take a free slot in each round
+            name_hash[free_slots] = pending[free[first]]
+
+            placed = np.zeros(pending.size, dtype=bool)
+            placed[free[first]] = True
+            pending = pending[~placed]
+            slots = (slots[~placed]+1) & mask
+
+        self.name_hash = name_hash
+
+    def build_euler_labels(self):
+        """
+        Builds the pre-order interval labelling of the tree, one vectorised step per tree level:
+            pre_order : pre-order number of every taxa id (children visited in taxa id order), -1 where the taxa id does not exist.
+            post_order : last pre-order number inside the subtree of every taxa id, -2 where the taxa id does not exist.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        N/A
+        """
+        nodes = np.flatnonzero(self.parent >= 0)
+        node_parent = self.parent[nodes].astype(np.int64)
+
+        ## nodes grouped by tree level, the (virtual) parent of the root is taxa id 0
+        levels = []
+        level = nodes[node_parent == 0]
+        in_level = np.zeros(len(self.parent), dtype=bool)
+        while level.size > 0:
+            levels.append(level)
+            in_level[level] = True
+            next_level = nodes[in_level[node_parent]]
+            in_level[level] = False
+            level = next_level
+
+        ## subtree sizes, added up from the deepest level to the root
+        size = np.zeros(len(self.parent), dtype=np.int64)
+        size[nodes] = 1
+        for level in levels[::-1]:
+            size += np.bincount(self.parent[level], weights=size[level], minlength=len(size)).astype(np.int64)
+        size[0] = 0
+
+        ## position of every node among its siblings = total size of the siblings before it
+        order = np.lexsort((nodes, node_parent))
+        sorted_nodes = nodes[order]
+        sorted_parent = node_parent[order]
+        sizes_before = np.cumsum(size[sorted_nodes]) - size[sorted_nodes]
+        group_start = np.flatnonzero(np.r_[True, sorted_parent[1:] != sorted_parent[:-1]])
+        group_offset = np.repeat(sizes_before[group_start], np.diff(np.r_[group_start, len(sorted_nodes)]))
+        sibling_offset = np.zeros(len(self.parent), dtype=np.int64)
+        sibling_offset[sorted_nodes] = sizes_before - group_offset
+
+        pre_order = np.full(len(self.parent), -1, dtype=np.int64)
+        for level in levels:
+            pre_order[level] = pre_order[self.parent[level]] + 1 + sibling_offset[level] ## pre_order[0] = -1 numbers the roots from 0
+
+        post_order = np.where(pre_order >= 0, pre_order + size - 1, -2)
+        pre_order[0] = -1
+        post_order[0] = -2
+        self.pre_order = pre_order.astype(np.int32)
+        self.post_order = post_order.astype(np.int32)
+
+    def get_record_name(self, record):
+        """
+        Parameters
+        ------------
+        record: int,
+            name record number
+
+        Returns
+        ------------
+        name: bytes,
+            lower case utf-8 name of the record, as used for hashing
+        """
+        return self.name_data[self.name_offsets[record]:self.name_offsets[record+1]].tobytes().lower()
+
+    def export_snapshot(self, filename):
+        """
+        Writes the index into a snapshot file that can be opened with TaxonomyIndex(snapshot=filename).
+
+        Parameters
+        ------------
+        filename: str,
+            location of the snapshot file to be written
+
+        Returns
+        ------------
+        N/A
+        """
+        if self.name_hash is None:
+            self.build_name_hash()
+        if self.pre_order is None:
+            self.build_euler_labels()
+
+        arrays = {}
+        offset = 0
+        for name in SNAPSHOT_ARRAYS:
+            array = np.ascontiguousarray(getattr(self, name))
+            array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+            arrays[name] = array
+            offset += array.nbytes + (-array.nbytes % 64)
+
+        ## header is written twice, the second time with the array offsets which depend on the header length
+        header = {'version': SNAPSHOT_VERSION, 'rank_names': self.rank_names, 'arrays': {}}
+        for _ in range(2):
+            encoded = json.dumps(header).encode('utf-8')
+            offset = len(SNAPSHOT_MAGIC) + 8 + len(encoded)
+            offset += -offset % 64
+            for name in SNAPSHOT_ARRAYS:
+                header['arrays'][name] = {'dtype': arrays[name].dtype.str,
+                                          'offset': offset,
+                                          'shape': list(arrays[name].shape)}
+                offset += arrays[name].nbytes + (-arrays[name].nbytes % 64)
+        encoded = json.dumps(header).encode('utf-8')
+
+        with open(filename, 'wb') as snapshot_file:
+            snapshot_file.write(SNAPSHOT_MAGIC)
+            snapshot_file.write(np.uint64(len(encoded)).tobytes())
+            snapshot_file.write(encoded)
+            for name in SNAPSHOT_ARRAYS:
+                snapshot_file.seek(header['arrays'][name]['offset'])
+                snapshot_file.write(arrays[name].tobytes())
+
+    def load_snapshot(self, filename):
+        """
+        Opens a snapshot file written by export_snapshot(), the arrays are memory-mapped read only and nothing else is read from disk.
+
+        Parameters
+        ------------
+        filename: str,
+            location of the snapshot file
+
+        Returns
+        ------------
+        N/A
+        """
+        with open(filename, 'rb') as snapshot_file:
+            magic = snapshot_file.read(len(SNAPSHOT_MAGIC))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError('%s is not a motupy taxonomy snapshot'%filename)
+            header_length = int(np.frombuffer(snapshot_file.read(8), dtype='<u8')[0])
+            header = json.loads(snapshot_file.read(header_length).decode('utf-8'))
+
+        if header['version'] > SNAPSHOT_VERSION:
+            raise ValueError('%s is a version %s snapshot, only up to version %s is supported'%(filename, header['version'], SNAPSHOT_VERSION))
+
+        self.dbfile = None
+        self.rank_names = header['rank_names']
+        self.rank_codes = {rank: code for code, rank in enumerate(self.rank_names)}
+        self.pre_order = None
+        self.post_order = None
+        for name, layout in header['arrays'].items():
+            shape = tuple(layout['shape'])
+            if 0 in shape: ## numpy.memmap can not map empty arrays
+                array = np.empty(shape, dtype=layout['dtype'])
+            else:
+                array = np.memmap(filename, dtype=layout['dtype'], mode='r', offset=layout['offset'], shape=shape)
+            setattr(self, name, array)
+
+    def has_taxid(self, taxid):
+        """
+        Parameters
+        ------------
+        taxid: int,
+            NCBI Taxanomy ID
+
+        Returns
+        ------------
+        found: boolean,
+            True if the taxa id exists in the index
+        """
+        return 0 <= taxid < len(self.parent) and self.parent[taxid] >= 0
+
+    def translate_merged(self, taxid):
+        """
+        Returns the taxa id a merged (old) taxa id was merged into, other taxa id are returned unchanged.
+
+        Parameters
+        ------------
+        taxid: int,
+            NCBI Taxanomy ID
+
+        Returns
+        ------------
+        taxid: int,
+            up to date NCBI Taxanomy ID
+        """
+        position = np.searchsorted(self.merged_old, taxid)
+        if position < len(self.merged_old) and self.merged_old[position] == taxid:
+            return int(self.merged_new[position])
+        return taxid
+
+    def translate_merged_array(self, taxids):
+        """
+        Vectorised translate_merged() over an array of taxa id.
+
+        Parameters
+        ------------
+        taxids: numpy array [int],
+            NCBI Taxanomy IDs
+
+        Returns
+        ------------
+        taxids: numpy array [int],
+            up to date NCBI Taxanomy IDs
+        """
+        taxids = np.asarray(taxids, dtype=np.int64)
+        if len(self.merged_old) == 0:
+            return taxids
+        position = np.minimum(np.searchsorted(self.merged_old, taxids), len(self.merged_old)-1)
+        merged = self.merged_old[position] == taxids
+        return np.where(merged, self.merged_new[position], taxids)
+
+    def resolve_lineages(self, taxids, ranks=BASIC_RANKS):
+        """
+        Resolves the lineage of every taxa id of the array at once, walking all of them up the parent array together.
+        The cost is one vectorised step per level of the deepest lineage, not one lookup per taxa id.
+
+        Parameters
+        ------------
+        taxids: list/array [int],
+            NCBI Taxanomy IDs
+
+        ranks: list [str],
+            the ranks making up the columns of the matrix, ordered from highest to lowest
+
+        Returns
+        ------------
+        lineages: numpy array,
+            int32 matrix of shape (n taxa id, n ranks) holding the taxa id of the ancestor at each rank, 0 where the lineage has no such rank.
+            Rows of taxa id not found in the index are all 0.
+        """
+        current = self.translate_merged_array(taxids)
+        known = (current >= 0) & (current < len(self.parent))
+        current = np.where(known, current, 0)
+        current = np.where(self.parent[current] >= 0, current, 0)
+
+        rank_codes = [self.rank_codes.get(rank, -2) for rank in ranks] ## ranks absent from the taxonomy never match
+        lineages = np.zeros((len(current), len(ranks)), dtype=np.int32)
+        active = current > 0
+        while np.any(active):
+            current_rank = self.rank[current]
+            for column, code in enumerate(rank_codes):
+                found = active & (current_rank == code) & (lineages[:, column] == 0)
+                lineages[found, column] = current[found]
+            current = np.where(active, np.maximum(self.parent[current], 0), 0)
+            active = current > 0
+
+        return lineages
+
+    def assign_clades(self, taxids, clades):
+        """
+        Vectorised clade membership of an array of taxa id using the interval labelling, see assign_clades().
+
+        Parameters
+        ------------
+        taxids: list/array [int],
+            NCBI Taxanomy IDs
+
+        clades: list [int],
+            taxa id of the clades (any rank), when a taxa id is under more than one of them the first one in the list is given
+
+        Returns
+        ------------
+        assigned: numpy array,
+            int64 array holding the clade taxa id of every taxa id, 0 when it is under none of the clades (or not found)
+        """
+        if self.pre_order is None:
+            self.build_euler_labels()
+
+        taxids = self.translate_merged_array(taxids)
+        known = (taxids >= 0) & (taxids < len(self.parent))
+        position = self.pre_order[np.where(known, taxids, 0)]
+
+        assigned = np.zeros(len(taxids), dtype=np.int64)
+        for clade in clades:
+            clade = self.translate_merged(int(clade))
+            if not self.has_taxid(clade):
+                continue
+            inside = (position >= self.pre_order[clade]) & (position <= self.post_order[clade]) & (assigned == 0)
+            assigned[inside] = clade
+
+        return assigned
+
+    def is_descendant(self, taxids, clade):
+        """
+        Parameters
+        ------------
+        taxids: list/array [int],
+            NCBI Taxanomy IDs
+
+        clade: int,
+            taxa id of the clade
+
+        Returns
+        ------------
+        inside: numpy array,
+            boolean array, True where the taxa id is the clade or is under it
+        """
+        return self.assign_clades(taxids, [clade]) != 0
+
+    def get_name(self, taxid):
+        """
+        Parameters
+        ------------
+        taxid: int,
+            NCBI Taxanomy ID
+
+        Returns
+        ------------
+        name: str,
+            scientific name of the taxa id
+        """
+        record = self.name_index[taxid]
+        return self.name_data[self.name_offsets[record]:self.name_offsets[record+1]].tobytes().decode('utf-8')
+
+    def get_lineage(self, taxid):
+        """
+        Same as ete3 NCBITaxa.get_lineage(), walks up the parent array instead of querying the database.
+
+        Parameters
+        ------------
+        taxid: int,
+            NCBI Taxanomy ID
+
+        Returns
+        ------------
+        lineage: list,
+            a list of lineage taxa_id ordered from the root to the given taxa id
+        """
+        taxid = self.translate_merged(int(taxid))
+        if not self.has_taxid(taxid):
+            raise ValueError('%s taxid not found'%taxid)
+
+        lineage = []
+        while taxid > 0:
+            lineage.append(taxid)
+            taxid = int(self.parent[taxid])
+
+        return lineage[::-1]
+
+    def get_rank(self, taxids):
+        """
+        Same as ete3 NCBITaxa.get_rank(), taxa id not found in the index are left out.
+
+        Parameters
+        ------------
+        taxids: list [int],
+            NCBI Taxanomy IDs
+
+        Returns
+        ------------
+        ranks: dict,
+            dictionary where key = taxa id, value = rank name
+        """
+        ranks = {}
+        for taxid in taxids:
+            taxid = int(taxid)
+            if self.has_taxid(taxid):
+                ranks[taxid] = self.rank_names[self.rank[taxid]]
+        return ranks
+
+    def get_taxid_translator(self, taxids):
+        """
+        Same as ete3 NCBITaxa.get_taxid_translator(), taxa id not found in the index are left out.
+
+        Parameters
+        ------------
+        taxids: list [int],
+            NCBI Taxanomy IDs
+
+        Returns
+        ------------
+        names: dict,
+            dictionary where key = taxa id, value = scientific name
+        """
+        names = {}
+        for taxid in taxids:
+            taxid = int(taxid)
+            if self.has_taxid(taxid):
+                names[taxid] = self.get_name(taxid)
+        return names
+
+    def get_name_translator(self, names):
+        """
+        Same as ete3 NCBITaxa.get_name_translator(), names are matched case insensitively and names not found are left out.
+        As in ete3, synonyms are only used for names that are not the scientific name of any taxa.
+
+        Parameters
+        ------------
+        names: list [str],
+            taxa names
+
+        Returns
+        ------------
+        taxids: dict,
+            dictionary where key = name, value = list of taxa id with this name
+        """
+        if self.name_hash is None:
+            self.build_name_hash()
+
+        mask = len(self.name_hash)-1
+        translated = {}
+        for name in names:
+            key = name.encode('utf-8').lower()
+            scientific = []
+            synonyms = []
+            slot = zlib.crc32(key) & mask
+            record = self.name_hash[slot]
+            while record != -1:
+                if self.get_record_name(record) == key:
+                    taxid = int(self.name_taxid[record])
+                    if self.name_index[taxid] == record:
+                        scientific.append(taxid)
+                    else:
+                        synonyms.append(taxid)
+                slot = (slot+1) & mask
+                record = self.name_hash[slot]
+
+            if scientific or synonyms:
+                translated[name] = scientific if scientific else synonyms
+        return translated
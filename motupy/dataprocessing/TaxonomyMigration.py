@@ -0,0 +1,217 @@
+"""
+    TaxonomyMigration object is a taxa id migration table built from the NCBI taxonomy dump merged.dmp and delnodes.dmp lists.
+    The table is stored as two sorted arrays {old: merged/deleted taxa id, new: the taxa id it now belongs to, 0 if deleted}
+    and is applied as one vectorised remap over the taxa id of a sample, a whole OTUnest or an already built dataframe,
+    the read counts of taxa id that end up on the same taxa id are summed.
+"""
+import hashlib
+import tarfile
+import numpy as np
+from .replacement_taxa import get_dict
+
+class TaxonomyMigration:
+    def __init__(self, merged=None, delnodes=None, taxdump=None, ncbi=None, include_replacement_taxa=True, verbose=0):
+        """
+        Creates TaxonomyMigration object
+
+        Parameters
+        ------------
+        merged: str,
+            location of the merged.dmp file of the NCBI taxonomy dump
+
+        delnodes: str,
+            location of the delnodes.dmp file of the NCBI taxonomy dump
+
+        taxdump: str,
+            location of the taxdump.tar.gz archive, merged.dmp and delnodes.dmp are read from it (instead of the two arguments above)
+
+        ncbi: TaxonomyIndex(),
+            the merged table of a TaxonomyIndex can be used instead of a taxonomy dump (it has no deleted taxa id)
+
+        include_replacement_taxa: boolean,
+            also apply the hand made replacements of replacement_taxa.get_dict() for deleted taxa id, these win over the dump
+
+        verbose: int,
+            prints the number of migrated taxa id when >= 1
+
+        Returns
+        ------------
+        N/A
+
+        """
+        self.verbose = verbose
+        migration = {}
+
+        if ncbi is not None:
+            migration.update(zip(np.asarray(ncbi.merged_old).tolist(), np.asarray(ncbi.merged_new).tolist()))
+
+        if taxdump is not None:
+            with tarfile.open(taxdump, 'r:*') as archive:
+                migration.update(self.read_dmp(archive.extractfile('delnodes.dmp'), deleted=True))
+                migration.update(self.read_dmp(archive.extractfile('merged.dmp')))
+        else:
+            if delnodes is not None:
+                with open(delnodes, 'rb') as dmp_file:
+                    migration.update(self.read_dmp(dmp_file, deleted=True))
+            if merged is not None:
+                with open(merged, 'rb') as dmp_file:
+                    migration.update(self.read_dmp(dmp_file))
+
+        if include_replacement_taxa:
+            migration.update(get_dict())
+
+        self.old = np.array(sorted(migration), dtype=np.int64)
+        self.new = np.array([migration[taxid] for taxid in self.old.tolist()], dtype=np.int64)
+        self.resolve_chains()
+
+    def read_dmp(self, dmp_file, deleted=False):
+        """
+        Parameters
+        ------------
+        dmp_file: file object,
+            merged.dmp ('old taxid | new taxid |' lines) or delnodes.dmp ('taxid |' lines) opened in binary mode
+
+        deleted: boolean,
+            if the file is delnodes.dmp, deleted taxa id are migrated to 0
+
+        Returns
+        ------------
+        migration: dict,
+            dictionary where key = old taxa id, value = new taxa id
+        """
+        migration = {}
+        for line in dmp_file:
+            fields = line.split(b'|')
+            if deleted:
+                migration[int(fields[0])] = 0
+            elif len(fields) > 2:
+                migration[int(fields[0])] = int(fields[1])
+        return migration
+
+    def resolve_chains(self):
+        """
+        Follows chains of migrations (a taxa id merged into a taxa id that was itself merged or deleted later)
+        so that every old taxa id points straight to its final taxa id.
+
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        N/A
+        """
+        for _ in range(64):
+            chained = self.migrate_array(self.new)
+            if np.array_equal(chained, self.new):
+                break
+            self.new = chained
+
+    def fingerprint(self):
+        """
+        Parameters
+        ------------
+        N/A
+
+        Returns
+        ------------
+        fingerprint: str,
+            hex digest of the migration table, e.g. to key cached samples migrated with it
+        """
+        return hashlib.sha1(self.old.tobytes()+self.new.tobytes()).hexdigest()
+
+    def migrate_array(self, taxids):
+        """
+        Vectorised remap of an array of taxa id.
+
+        Parameters
+        ------------
+        taxids: list/array [int],
+            NCBI Taxanomy IDs
+
+        Returns
+        ------------
+        taxids: numpy array,
+            int64 array of the up to date taxa id, 0 for deleted taxa id
+        """
+        taxids = np.asarray(taxids, dtype=np.int64)
+        if len(self.old) == 0 or len(taxids) == 0:
+            return taxids.copy()
+        position = np.minimum(np.searchsorted(self.old, taxids), len(self.old)-1)
+        migrated = self.old[position] == taxids
+        return np.where(migrated, self.new[position], taxids)
+
+    def migrate_dict(self, reads_dictionary):
+        """
+        Remaps the taxa id (keys) of a reads dictionary, counts landing on the same taxa id are summed and deleted taxa id are dropped.
+
+        Parameters
+        ------------
+        reads_dictionary: dict,
+            reads dictionary file with key = taxa id, value = number of reads/relative abundance
+
+        Returns
+        ------------
+        reads_dictionary: dict,
+            the same dictionary if no taxa id needed migrating, otherwise a new migrated dictionary
+        """
+        taxids = np.fromiter(reads_dictionary.keys(), dtype=np.int64, count=len(reads_dictionary))
+        new_taxids = self.migrate_array(taxids)
+        if np.array_equal(new_taxids, taxids):
+            return reads_dictionary
+
+        values = np.array(list(reads_dictionary.values()))
+        keep = new_taxids > 0
+        if self.verbose >= 1 : print('[TAXA ID MIGRATION] %s taxa id migrated, %s deleted'%(int(((new_taxids != taxids) & keep).sum()), int((~keep).sum())))
+
+        unique_taxids, inverse = np.unique(new_taxids[keep], return_inverse=True)
+        summed = np.bincount(inverse, weights=values[keep], minlength=len(unique_taxids))
+        if np.issubdtype(values.dtype, np.integer):
+            summed = summed.astype(values.dtype)
+
+        return dict(zip(unique_taxids.tolist(), summed.tolist()))
+
+    def migrate_set(self, taxids):
+        """
+        Parameters
+        ------------
+        taxids: set [int],
+            NCBI Taxanomy IDs, e.g. OTUnest.ranks['species']
+
+        Returns
+        ------------
+        taxids: set [int],
+            the up to date taxa id, deleted taxa id are dropped
+        """
+        migrated = self.migrate_array(list(taxids))
+        return set(migrated[migrated > 0].tolist())
+
+    def migrate_dataframe(self, dataframe):
+        """
+        Remaps the taxa id columns of an already built dataframe (e.g. OTUnest.to_dataframe()) without re-parsing the raw files.
+        Columns landing on the same taxa id are summed (a cell stays NaN only if it is NaN in every summed column), deleted taxa id are dropped.
+
+        Parameters
+        ------------
+        dataframe: pandas dataframe object
+            where
+                rows = samples
+                columns = OTU (int or str taxa id)
+
+        Returns
+        ------------
+        dataframe: pandas dataframe object
+            the migrated dataframe, with columns of the same type as the input
+        """
+        taxids = np.array([int(taxid) for taxid in dataframe.columns], dtype=np.int64)
+        new_taxids = self.migrate_array(taxids)
+        if np.array_equal(new_taxids, taxids):
+            return dataframe.copy()
+
+        keep = new_taxids > 0
+        df = dataframe.loc[:, keep]
+        new_columns = new_taxids[keep]
+        if len(dataframe.columns) > 0 and isinstance(dataframe.columns[0], str):
+            new_columns = new_columns.astype(str)
+
+        return df.T.groupby(new_columns, sort=False).sum(min_count=1).T
@@ -2,8 +2,33 @@
 from motupy.dataprocessing.OTUdata import OTUdata
 from motupy.dataprocessing.OTUnest import OTUnest
 
+## detect_input_type, detects the taxa profiling tool (kaiju, kraken2, bracken, metaphlan) of an output file from its content
+from motupy.dataprocessing.input_detection import detect_input_type
+
+## CompactOTUdata, array based read only copy of an OTUdata for keeping large cohorts in memory
+from motupy.dataprocessing.CompactOTUdata import CompactOTUdata
+
+## TaxonomyIndex, array based copy of the ete3 NCBI taxonomy database, drop-in replacement for NCBITaxa() lookups
+from motupy.dataprocessing.TaxonomyIndex import TaxonomyIndex
+
+## TaxonomyCache, bounded LRU cache of taxonomy lookups, one instance is shared by the whole process
+from motupy.dataprocessing.TaxonomyCache import TaxonomyCache, get_shared_cache
+
+## TaxonomyMigration, merged/deleted taxa id remap table built from the NCBI taxonomy dump
+from motupy.dataprocessing.TaxonomyMigration import TaxonomyMigration
+
+## SampleCache, on-disk cache of parsed samples keyed by file path/size/modification time and parse parameters
+from motupy.dataprocessing.SampleCache import SampleCache
+
+## MatrixStore, out-of-core (samples x features) matrix written in CSR shards, for cohorts that do not fit in memory
+from motupy.dataprocessing.MatrixStore import MatrixStore
+
 ## GeneData, the class object for reading in and processing Gene data in microbiome currently only deal with humann2 data
 from motupy.dataprocessing.GeneData import GeneData
 from motupy.dataprocessing.GeneNest import GeneNest
 
-__all__ = ["OTUdata", "OTUnest", "GeneData", "GeneNest"]
\ No newline at end of file
+## StratifiedGeneTable, sparse (sample, gene, taxon, value) table of the stratified humann2 rows, genes and taxa interned by IdInterner
+from motupy.dataprocessing.StratifiedGeneTable import StratifiedGeneTable
+from motupy.dataprocessing.IdInterner import IdInterner
+
+__all__ = ["OTUdata", "OTUnest", "detect_input_type", "CompactOTUdata", "GeneData", "GeneNest", "StratifiedGeneTable", "IdInterner", "TaxonomyIndex", "TaxonomyCache", "get_shared_cache", "TaxonomyMigration", "SampleCache", "MatrixStore"]
\ No newline at end of file
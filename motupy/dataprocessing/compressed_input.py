@@ -0,0 +1,54 @@
+"""
+    Methods for reading compressed (gzip, bz2, xz) profiler output files as a stream, without decompressing them to disk first.
+    The compression is detected from the magic bytes at the start of the file, not from its extension.
+"""
+import bz2
+import gzip
+import lzma
+
+COMPRESSION_MAGIC = {b'\x1f\x8b': gzip.open,
+                    b'BZh': bz2.open,
+                    b'\xfd7zXZ\x00': lzma.open}
+
+COMPRESSION_EXTENSIONS = ['.gz', '.gzip', '.bz2', '.xz']
+
+def open_text(filename):
+    """
+    Opens a plain text or compressed file for reading line by line.
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the file
+
+    Returns
+    ------------
+    file object,
+        text mode file object, to be used in a with block
+    """
+    with open(filename, 'rb') as binaryFile:
+        head = binaryFile.read(6)
+
+    for magic, open_method in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return open_method(filename, 'rt')
+
+    return open(filename, 'r')
+
+def strip_compression_extension(file_name):
+    """
+    Parameters
+    ------------
+    file_name: str,
+        name of the file, e.g. 'sample1.out.gz'
+
+    Returns
+    ------------
+    file_name: str,
+        the name without its compression extension, e.g. 'sample1.out'
+    """
+    for extension in COMPRESSION_EXTENSIONS:
+        if file_name.endswith(extension):
+            return file_name[:-len(extension)]
+
+    return file_name
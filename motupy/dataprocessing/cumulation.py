@@ -0,0 +1,73 @@
+"""
+    Methods for cumulating read counts up the taxonomy in a single bottom-up pass.
+
+    The taxa id of a sample (and every ancestor at a basic rank, added when missing) are ordered from leaf to root once,
+    using the lineage table of resolve_lineages(): a node's parent at basic rank always sits in a column left of its own,
+    so going through the columns from the lowest rank to the highest is a topological (leaf to root) order.
+    Each node is then added into its basic rank parent once, which is O(n) for n nodes instead of one lineage lookup per taxa id and rank.
+"""
+import numpy as np
+
+def cumulate_reads(taxids, counts, lineages):
+    """
+    Cumulates the read counts of a sample into every basic rank taxa id of their lineages.
+    Gives the same totals as OTUdata.taxa_cumulation(): reads of taxa id below the lowest basic rank (e.g. strains) are moved onto their
+    lowest basic rank ancestor, then every basic rank taxa id receives the reads of all its descendants.
+
+    Parameters
+    ------------
+    taxids: list/array [int],
+        NCBI Taxanomy IDs of the sample
+
+    counts: list/array,
+        read counts (or any additive value) of every taxa id
+
+    lineages: numpy array,
+        lineage table of the taxa id from resolve_lineages(), columns are the basic ranks ordered from highest to lowest
+
+    Returns
+    ------------
+    nodes: numpy array,
+        the basic rank taxa id found in the lineages (sorted)
+
+    node_counts: numpy array,
+        the cumulated counts of every node, int64 for integer counts and float64 otherwise
+
+    node_ranks: numpy array,
+        column (basic rank index) of every node
+
+    node_rows: numpy array,
+        a row of the lineage table each node appears in, e.g. to read its superkingdom off the table
+
+    Taxa id without any basic rank in their lineage (all 0 row) are not part of the output.
+    """
+    counts = np.asarray(counts)
+    count_dtype = np.int64 if np.issubdtype(counts.dtype, np.integer) else np.float64
+
+    ## entries of the table in row major order, so the entries of one lineage are contiguous and go from highest to lowest rank
+    rows, columns = np.nonzero(lineages)
+    entry_taxids = lineages[rows, columns].astype(np.int64)
+    nodes, entry_nodes = np.unique(entry_taxids, return_inverse=True)
+
+    node_ranks = np.zeros(len(nodes), dtype=np.int64)
+    node_ranks[entry_nodes] = columns
+    node_rows = np.zeros(len(nodes), dtype=np.int64)
+    node_rows[entry_nodes] = rows
+
+    ## parent at basic rank = previous entry of the same lineage, -1 for the highest basic rank of a lineage
+    row_changes = rows[1:] != rows[:-1]
+    first_of_row = np.r_[True, row_changes][:len(rows)]
+    node_parents = np.full(len(nodes), -1, dtype=np.int64)
+    node_parents[entry_nodes[~first_of_row]] = entry_nodes[np.flatnonzero(~first_of_row)-1]
+
+    ## own reads of every taxa id go to the lowest basic rank of its lineage (the taxa id itself when it is at a basic rank)
+    last_of_row = np.r_[row_changes, True][:len(rows)]
+    node_counts = np.zeros(len(nodes), dtype=count_dtype)
+    np.add.at(node_counts, entry_nodes[last_of_row], counts[rows[last_of_row]].astype(count_dtype))
+
+    ## single bottom-up pass, the nodes of the lowest rank first, each node added once into its parent
+    for rank_index in range(lineages.shape[1]-1, 0, -1):
+        children = np.flatnonzero((node_ranks == rank_index) & (node_parents >= 0))
+        np.add.at(node_counts, node_parents[children], node_counts[children])
+
+    return nodes, node_counts, node_ranks, node_rows
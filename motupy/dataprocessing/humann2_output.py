@@ -1,16 +1,27 @@
 """
     Methods for importing humann2 merged gene families output files
 """
-def read_h2(filename):
+import re
+from .compressed_input import open_text
+
+def read_h2(filename, numeric=False, gene_ids=None, gene_pattern=None):
     """
     Takes humann2 output file and make them into python dictionary.
 
     Parameters
     ------------
     filename: str,
-        location/file name of the kaiju output file
-    
+        location/file name of the kaiju output file, plain text or gzip/bz2/xz compressed
     
+    numeric: boolean,
+        if True the values are parsed into float, otherwise they are kept as the strings of the file
+
+    gene_ids: set [str],
+        gene id to keep (e.g. a few hundred genes of interest), the rows of other genes are skipped before their value is parsed
+
+    gene_pattern: str,
+        regular expression (re.search) the gene id to keep have to match, e.g. '^UniRef90_P'
+
     Returns
     ------------
     readsDict: dict,
@@ -18,14 +29,74 @@ def read_h2(filename):
                 key : uniprotID
                 value : read counts?
     """ 
-    readFile = open(filename, 'r')
-    readsDict = {}
-    all_lines = readFile.readlines()
+    return dict(stream_h2(filename, numeric, gene_ids, gene_pattern))
+
+def stream_h2(filename, numeric=False, gene_ids=None, gene_pattern=None):
+    """
+    Reads humann2 output file line by line, memory use does not depend on the size of the file.
+    The header is recognised by its content (lines starting with '#') rather than by its position,
+    stratified rows ('gene|taxa') are skipped.
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the humann2 output file, plain text or gzip/bz2/xz compressed
+
+    numeric: boolean,
+        if True the values are parsed into float, otherwise they are kept as the strings of the file
+
+    gene_ids: set [str],
+        gene id to keep (e.g. a few hundred genes of interest), the rows of other genes are skipped before their value is parsed
+
+    gene_pattern: str,
+        regular expression (re.search) the gene id to keep have to match, e.g. '^UniRef90_P'
+
+    Returns
+    ------------
+    generator of (uniprotID, read counts) tuples, in file order
+    """ 
+    for gene, taxon, value in stream_h2_rows(filename, numeric, gene_ids, gene_pattern):
+        if taxon is None:
+            yield gene, value
+
+def stream_h2_rows(filename, numeric=False, gene_ids=None, gene_pattern=None):
+    """
+    Reads humann2 output file line by line, stratified rows ('gene|taxa', e.g. 'UniRef90_A|g__Escherichia.s__Escherichia_coli')
+    are split into their gene id and taxa.
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the humann2 output file, plain text or gzip/bz2/xz compressed
+
+    numeric: boolean,
+        if True the values are parsed into float, otherwise they are kept as the strings of the file
+
+    gene_ids: set [str],
+        gene id to keep (e.g. a few hundred genes of interest), the rows of other genes are skipped before their value is parsed
+
+    gene_pattern: str,
+        regular expression (re.search) the gene id to keep have to match, e.g. '^UniRef90_P'
+
+    Returns
+    ------------
+    generator of (uniprotID, taxa, read counts) tuples, in file order, taxa is None for the unstratified (community total) rows
+    """ 
+    if gene_pattern is not None:
+        gene_pattern = re.compile(gene_pattern)
 
-    for line in all_lines[1:]:
-        tokens = line.rstrip().split('\t')
+    with open_text(filename) as readFile: ## plain text or gzip/bz2/xz compressed
+        for line in readFile:
+            if line.startswith('#'):
+                continue
+            tokens = line.rstrip().split('\t')
 
-        if "|" not in tokens[0]:
-            readsDict[tokens[0]]=tokens[1]
+            if len(tokens) > 1:
+                gene, _, taxon = tokens[0].partition('|')
+                if gene_ids is not None and gene not in gene_ids:
+                    continue
+                if gene_pattern is not None and gene_pattern.search(gene) is None:
+                    continue
 
-    return readsDict
\ No newline at end of file
+                value = float(tokens[1]) if numeric else tokens[1]
+                yield gene, (taxon if "|" in tokens[0] else None), value
@@ -0,0 +1,43 @@
+"""
+    Methods for detecting the taxa profiling tool that generated an output file, by sniffing its first lines
+"""
+import re
+from .compressed_input import open_text
+from .kaiju_output import is_integer
+
+SNIFF_LINES = 50 ## lines read at most before giving up on the detection
+
+KRAKEN2_RANK_CODE = re.compile(r'^[URDKPCOFGS][0-9]*$')
+
+def detect_input_type(file_loc):
+    """
+    Detects the input_type of OTUdata() from the content of the file (plain text or compressed), not from its name.
+
+    Parameters
+    ------------
+    file_loc: str,
+        location/file name of the taxa profiling output file
+
+    Returns
+    ------------
+    input_type: str,
+        'kraken2', 'bracken', 'metaphlan', 'kaiju raw' or 'kaiju', None if the format is not recognised
+        (the old kaiju formats are not detected, they have to be given explicitly)
+    """
+    with open_text(file_loc) as readFile: ## plain text or gzip/bz2/xz compressed
+        for _, line in zip(range(SNIFF_LINES), readFile):
+            tokens = line.rstrip('\n').split('\t')
+
+            if line.startswith('#mpa') or (line.startswith('#') and 'clade_name' in line) or tokens[0].startswith('k__'):
+                return 'metaphlan'
+            if tokens[:3] == ['name', 'taxonomy_id', 'taxonomy_lvl']:
+                return 'bracken'
+            if len(tokens) in (6, 8) and is_integer(tokens[1]) and is_integer(tokens[2]) and KRAKEN2_RANK_CODE.match(tokens[-3].strip()):
+                return 'kraken2'
+            if len(tokens) >= 3 and tokens[0] in ('C', 'U'):
+                return 'kaiju raw'
+            if len(tokens) == 5 and is_integer(tokens[0]) and is_integer(tokens[3]):
+                return 'kaiju'
+
+    print('[ERROR] input type of %s could not be detected, give it explicitly'%file_loc)
+    return None
@@ -1,6 +1,13 @@
 """
     Methods for importing kaiju summary output files
 """
+from .TaxonomyCache import get_shared_cache
+from .compressed_input import open_text, strip_compression_extension
+import numpy as np
+
+STREAM_CHUNK_SIZE = 10000 ## rows of the old kaiju formats whose names are translated together
+RAW_CHUNK_SIZE = 1000000 ## lines of raw per-read kaiju output parsed and counted together
+
 def read_kj(filename, artifact_threshold=0):
     """
     Takes kaiju output file and make them into python dictionary.
@@ -8,7 +15,7 @@ def read_kj(filename, artifact_threshold=0):
     Parameters
     ------------
     filename: str,
-        location/file name of the kaiju output file
+        location/file name of the kaiju output file, plain text or gzip/bz2/xz compressed
     
     artifact_threshold: int,
         threshold for artifact range, if it is lower than threshold, the OTU is not added to the dictionary. 
@@ -20,33 +27,165 @@ def read_kj(filename, artifact_threshold=0):
                 key : NCBI taxanomy ID
                 value : number of reads
     """ 
-    readFile = open(filename, 'r')
-    readsDict = {}
-    all_lines = readFile.readlines()
+    return dict(stream_kj(filename, artifact_threshold))
+
+def stream_kj(filename, artifact_threshold=0):
+    """
+    Reads kaiju output file line by line, memory use does not depend on the size of the file.
+    Header, separator and footer lines (e.g. 'unclassified', taxon id 'NA') are recognised by their content, not by their position:
+    a row is read when it has 5 columns with an integer read count (1st) and an integer taxa id (4th).
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the kaiju output file, plain text or gzip/bz2/xz compressed
+    
+    artifact_threshold: int,
+        threshold for artifact range, if it is lower than threshold, the OTU is not yielded. 
+
+    Returns
+    ------------
+    generator of (taxa id, read counts) tuples, in file order
+    """ 
+    with open_text(filename) as readFile: ## plain text or gzip/bz2/xz compressed
+        for line in readFile:
+            tokens = line.rstrip().split('\t')
+
+            if len(tokens)==5 and is_integer(tokens[0]) and is_integer(tokens[3]):
+                count = int(tokens[0])
+                taxa_id = int(tokens[3])
+                if count > artifact_threshold:
+                    yield taxa_id, count
+
+def read_kj_raw(filename, artifact_threshold=0):
+    """
+    Takes raw per-read kaiju output file ('C/U<tab>read id<tab>taxa id...' lines) and counts the reads of every taxa id into python dictionary,
+    without going through kaiju2table first.
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the kaiju output file, plain text or gzip/bz2/xz compressed
+    
+    artifact_threshold: int,
+        threshold for artifact range, if the read count of a taxa id is lower than threshold, the OTU is not added to the dictionary. 
+
+    Returns
+    ------------
+    readsDict: dict,
+        dictionary file where:
+                key : NCBI taxanomy ID
+                value : number of reads
+    """ 
+    return dict(stream_kj_raw(filename, artifact_threshold))
+
+def stream_kj_raw(filename, artifact_threshold=0):
+    """
+    Reads raw per-read kaiju output file in chunks of RAW_CHUNK_SIZE lines, only the status (1st) and taxa id (3rd) columns
+    are parsed (pandas.read_csv with usecols, the read ids and the -v columns are never turned into python objects).
+    The classified ('C') reads of each chunk are counted with numpy.unique and the chunk counts are summed with numpy.bincount,
+    so memory depends on the chunk size and on the number of distinct taxa id, not on the number of reads. Unclassified ('U') reads are not counted.
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the kaiju output file, plain text or gzip/bz2/xz compressed
+    
+    artifact_threshold: int,
+        threshold for artifact range, applied to the final read counts, if it is lower than threshold, the OTU is not yielded. 
+
+    Returns
+    ------------
+    generator of (taxa id, read counts) tuples, ordered by taxa id, yielded once the whole file is counted
+    """ 
+    import csv
+    import pandas as pd ## pandas is only imported for raw files, the summary formats do not need it
+
+    chunk_taxids = [np.zeros(0, dtype=np.int64)]
+    chunk_counts = [np.zeros(0, dtype=np.int64)]
+    with open_text(filename) as readFile: ## plain text or gzip/bz2/xz compressed
+        try:
+            chunks = pd.read_csv(readFile, sep='\t', header=None, usecols=[0, 2], dtype={0: str}, quoting=csv.QUOTE_NONE, chunksize=RAW_CHUNK_SIZE)
+            for chunk in chunks:
+                classified = chunk[0].to_numpy() == 'C'
+                taxids, counts = np.unique(chunk[2].to_numpy()[classified].astype(np.int64), return_counts=True)
+                chunk_taxids.append(taxids)
+                chunk_counts.append(counts)
+        except pd.errors.EmptyDataError: ## no read at all
+            pass
+
+    taxids, inverse = np.unique(np.concatenate(chunk_taxids), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate(chunk_counts), minlength=len(taxids)).astype(np.int64)
+    kept = counts > artifact_threshold
+    yield from zip(taxids[kept].tolist(), counts[kept].tolist())
+
+def stream_kj_table(filename, artifact_threshold=0):
+    """
+    Reads a kaiju2table output file merging many samples ('file<tab>percent<tab>reads<tab>taxon_id<tab>taxon_name' rows) line by line.
+    When kaiju2table was run with -l, taxon_name holds the names at the listed ranks ('Bacteria;Proteobacteria;...;NA;'),
+    they are given back as the lineage of the row. Header and footer rows (taxon id 'NA') are skipped by their content.
 
-    for line in all_lines[2:-3]:
-        tokens = line.rstrip().split('\t')
-        
-        if len(tokens)==5:
-            count = int(tokens[0])
-            taxa_id = int(tokens[3])
-            if count > artifact_threshold:
-                readsDict[taxa_id]=int(count)
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the kaiju2table output file, plain text or gzip/bz2/xz compressed
+
+    artifact_threshold: int,
+        threshold for artifact range, if it is lower than threshold, the OTU is not yielded. 
+
+    Returns
+    ------------
+    generator of (file, taxa id, read counts, lineage) tuples, lineage being the tuple of names of the taxon_name column
+    """
+    with open_text(filename) as readFile: ## plain text or gzip/bz2/xz compressed
+        for line in readFile:
+            tokens = line.rstrip('\n').split('\t')
 
-    return readsDict
+            if len(tokens)==5 and is_integer(tokens[2]) and is_integer(tokens[3]):
+                count = int(tokens[2])
+                if count > artifact_threshold:
+                    lineage = [name.strip() for name in tokens[4].split(';')]
+                    if lineage[-1] == '':
+                        lineage = lineage[:-1]
+                    yield tokens[0], int(tokens[3]), count, tuple(lineage)
 
-def read_old_kj(filename, artifact_threshold=0):
+def get_file_id(file_loc, extension=None):
+    """
+    Same id as OTUdata.process_file_name()/process_file_name_with_known_extension(), for the file column of a kaiju2table output.
+
+    Parameters
+    ------------
+    file_loc: str,
+        the name/location of the file
+
+    extension: str,
+        the known/desired extension used to cut off the name for the id generation
+
+    Returns
+    ------------
+    id_name: str,
+        the sample id
+    """
+    file_name = file_loc.split('/')[-1]
+    if extension is None:
+        return file_name.split('.')[0]
+    return strip_compression_extension(file_name.replace(extension, ''))
+
+def read_old_kj(filename, artifact_threshold=0, ncbi=None):
     """
     Takes kaiju output file and make them into python dictionary.
 
     Parameters
     ------------
     filename: str,
-        location/file name of the kaiju output file
+        location/file name of the kaiju output file, plain text or gzip/bz2/xz compressed
 
     artifact_threshold: int,
         threshold for artifact range, if it is lower than threshold, the OTU is not added to the dictionary. 
 
+    ncbi: NCBITaxa() or TaxonomyIndex(),
+        taxonomy backend used to translate taxa names to taxa id, if None the process-wide TaxonomyCache (get_shared_cache()) is used
+
     Returns
     ------------
     readsDict: dict,
@@ -54,42 +193,53 @@ def read_old_kj(filename, artifact_threshold=0):
                 key : NCBI taxanomy ID
                 value : number of reads
     """ 
-    from ete3 import NCBITaxa
-    ncbi = NCBITaxa()
-
-    readFile = open(filename, 'r')
-    readsDict = {}
-    all_lines = readFile.readlines()
-
-    for line in all_lines:
-        tokens = line.rstrip().split('\t')
-        
-        if len(tokens)>2:
-            count = int(tokens[0])
-            final_id = -1 
-            otu_name = tokens[final_id]
-            while not bool(ncbi.get_name_translator([otu_name])):
-                final_id-=1
-                otu_name = tokens[final_id]
-            
-            taxa_id = ncbi.get_name_translator([otu_name])[otu_name]
-            if count > artifact_threshold:
-                readsDict[taxa_id[0]]=int(count)
-
-    return readsDict
-
-def read_old_kjV2(filename, artifact_threshold=0):
+    return dict(stream_old_kj(filename, artifact_threshold, ncbi))
+
+def stream_old_kj(filename, artifact_threshold=0, ncbi=None):
+    """
+    Reads old kaiju output file ('count<tab>name<tab>name...' rows) line by line, lines without an integer read count are skipped.
+    The rows are resolved STREAM_CHUNK_SIZE rows at a time (see resolve_rows()), so memory use stays flat.
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the kaiju output file, plain text or gzip/bz2/xz compressed
+
+    artifact_threshold: int,
+        threshold for artifact range, if it is lower than threshold, the OTU is not yielded. 
+
+    ncbi: NCBITaxa() or TaxonomyIndex(),
+        taxonomy backend used to translate taxa names to taxa id, if None the process-wide TaxonomyCache (get_shared_cache()) is used
+
+    Returns
+    ------------
+    generator of (taxa id, read counts) tuples, in file order
+    """ 
+    def rows(readFile):
+        for line in readFile:
+            tokens = line.rstrip().split('\t')
+
+            if len(tokens)>2 and is_integer(tokens[0]):
+                yield tuple(tokens[1:]), int(tokens[0])
+
+    with open_text(filename) as readFile: ## plain text or gzip/bz2/xz compressed
+        yield from resolve_rows(rows(readFile), artifact_threshold, ncbi)
+
+def read_old_kjV2(filename, artifact_threshold=0, ncbi=None):
     """
     Takes kaiju output file and make them into python dictionary.
 
     Parameters
     ------------
     filename: str,
-        location/file name of the kaiju output file
+        location/file name of the kaiju output file, plain text or gzip/bz2/xz compressed
 
     artifact_threshold: int,
         threshold for artifact range, if it is lower than threshold, the OTU is not added to the dictionary. 
 
+    ncbi: NCBITaxa() or TaxonomyIndex(),
+        taxonomy backend used to translate taxa names to taxa id, if None the process-wide TaxonomyCache (get_shared_cache()) is used
+
     Returns
     ------------
     readsDict: dict,
@@ -97,32 +247,163 @@ def read_old_kjV2(filename, artifact_threshold=0):
                 key : NCBI taxanomy ID
                 value : number of reads
     """ 
-    from ete3 import NCBITaxa
-    ncbi = NCBITaxa()
-
-    readFile = open(filename, 'r')
-    readsDict = {}
-    all_lines = readFile.readlines()
-
-    for line in all_lines[1:-3]:
-        tokens = line.rstrip().split('\t')
-        
-        if len(tokens)==5:
-            count = int(tokens[2])
-            final_id = -1 
-
-            taxa = tokens[4]
-            taxa = taxa[:-1]
-            taxa = taxa.split(';')
-            taxa = [t.strip() for t in taxa]
-
-            otu_name = taxa[final_id]
-            while not bool(ncbi.get_name_translator([otu_name])):
-                final_id-=1
-                otu_name = taxa[final_id]
-            
-            taxa_id = ncbi.get_name_translator([otu_name])[otu_name]
-            if count > artifact_threshold:
-                readsDict[taxa_id[0]]=int(count)
-
-    return readsDict
\ No newline at end of file
+    return dict(stream_old_kjV2(filename, artifact_threshold, ncbi))
+
+def stream_old_kjV2(filename, artifact_threshold=0, ncbi=None):
+    """
+    Reads old kaiju (v2) output file line by line, a row is read when it has 5 columns with an integer read count (3rd),
+    so the header is skipped by its content. Footer rows (e.g. 'unclassified') have no name found in the taxonomy and are skipped when resolved.
+    The lineage names (5th column) are resolved STREAM_CHUNK_SIZE rows at a time (see resolve_rows()).
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the kaiju output file, plain text or gzip/bz2/xz compressed
+
+    artifact_threshold: int,
+        threshold for artifact range, if it is lower than threshold, the OTU is not yielded. 
+
+    ncbi: NCBITaxa() or TaxonomyIndex(),
+        taxonomy backend used to translate taxa names to taxa id, if None the process-wide TaxonomyCache (get_shared_cache()) is used
+
+    Returns
+    ------------
+    generator of (taxa id, read counts) tuples, in file order
+    """ 
+    def rows(readFile):
+        for line in readFile:
+            tokens = line.rstrip().split('\t')
+
+            if len(tokens)==5 and is_integer(tokens[2]):
+                count = int(tokens[2])
+
+                taxa = tokens[4]
+                taxa = taxa[:-1]
+                taxa = taxa.split(';')
+                taxa = [t.strip() for t in taxa]
+                yield tuple(taxa), count
+
+    with open_text(filename) as readFile: ## plain text or gzip/bz2/xz compressed
+        yield from resolve_rows(rows(readFile), artifact_threshold, ncbi)
+
+def resolve_rows(rows, artifact_threshold=0, ncbi=None):
+    """
+    Translates a stream of (lineage names, read counts) rows into (taxa id, read counts), STREAM_CHUNK_SIZE rows at a time.
+    The translated names are kept across the chunks, so every distinct name of the file is sent to the taxonomy backend once.
+    Rows whose lineage is not found in the taxonomy are skipped.
+
+    Parameters
+    ------------
+    rows: iterable of (tuple [str], int),
+        lineage names ordered from highest to lowest rank and read counts
+
+    artifact_threshold: int,
+        threshold for artifact range, if it is lower than threshold, the OTU is not yielded. 
+
+    ncbi: NCBITaxa() or TaxonomyIndex(),
+        taxonomy backend used to translate taxa names to taxa id, if None the process-wide TaxonomyCache (get_shared_cache()) is used
+
+    Returns
+    ------------
+    generator of (taxa id, read counts) tuples
+    """
+    if ncbi is None:
+        ncbi = get_shared_cache()
+
+    translated = {} ## name -> taxa id (None if not found) of every name of the file translated so far
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield from resolve_chunk(chunk, artifact_threshold, ncbi, translated)
+            chunk = []
+    yield from resolve_chunk(chunk, artifact_threshold, ncbi, translated)
+
+def resolve_chunk(chunk, artifact_threshold, ncbi, translated=None):
+    """
+    Parameters
+    ------------
+    chunk: list [(tuple [str], int)],
+        rows of resolve_rows()
+
+    artifact_threshold: int,
+        threshold for artifact range
+
+    ncbi: NCBITaxa() or TaxonomyIndex(),
+        taxonomy backend used to translate taxa names to taxa id
+
+    translated: dict,
+        names already translated for the file, see resolve_lineage_names()
+
+    Returns
+    ------------
+    generator of (taxa id, read counts) tuples
+    """
+    if not chunk:
+        return
+    taxa_ids = resolve_lineage_names([lineage for lineage, _ in chunk], ncbi, translated)
+    for (lineage, count), taxa_id in zip(chunk, taxa_ids):
+        if taxa_id is not None and count > artifact_threshold:
+            yield taxa_id, count
+
+def is_integer(token):
+    """
+    Parameters
+    ------------
+    token: str,
+        a column of an output file
+
+    Returns
+    ------------
+    boolean, if the column is an integer (e.g. a read count or a taxa id, not a header name, 'NA' or a separator)
+    """
+    token = token.strip()
+    return token.lstrip('-').isdigit()
+
+def resolve_lineage_names(lineages, ncbi, translated=None):
+    """
+    Translates the lineage name strings of the old kaiju formats into taxa id.
+    The distinct names that are not in translated yet are translated in a single get_name_translator() call and added to it,
+    so passing the same dict for every chunk of a file (see resolve_rows()) translates each name once per file.
+    Each lineage is then walked backwards from its last name until a name is found. The walk is memoised so repeated lineages are only walked once.
+
+    Parameters
+    ------------
+    lineages: list [tuple],
+        one tuple of names per row, ordered from highest to lowest rank
+
+    ncbi: NCBITaxa() or TaxonomyIndex(),
+        taxonomy backend used to translate taxa names to taxa id
+
+    translated: dict,
+        name -> taxa id (None when the name is not found) of the names already translated, updated in place, a new one if None
+
+    Returns
+    ------------
+    taxa_ids: list [int],
+        taxa id of the lowest name of every lineage found in the taxonomy, None when none of its names is found
+    """
+    if translated is None:
+        translated = {}
+
+    names = set()
+    for lineage in lineages:
+        names.update(lineage)
+    names.difference_update(translated)
+    if names:
+        found = ncbi.get_name_translator(list(names))
+        for name in names:
+            translated[name] = found[name][0] if name in found else None
+
+    resolved = {}
+    taxa_ids = []
+    for lineage in lineages:
+        if lineage not in resolved:
+            resolved[lineage] = None
+            for otu_name in reversed(lineage):
+                if translated[otu_name] is not None:
+                    resolved[lineage] = translated[otu_name]
+                    break
+        taxa_ids.append(resolved[lineage])
+
+    return taxa_ids
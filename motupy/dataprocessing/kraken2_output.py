@@ -0,0 +1,136 @@
+"""
+    Methods for importing kraken2 report and bracken output files
+"""
+from .compressed_input import open_text
+from .kaiju_output import is_integer
+from .TaxonomyIndex import BASIC_RANKS
+
+KRAKEN2_RANK_CODES = {'D': 'superkingdom',
+                    'P': 'phylum',
+                    'C': 'class',
+                    'O': 'order',
+                    'F': 'family',
+                    'G': 'genus',
+                    'S': 'species'} ## 'U', 'R', 'K' and the numbered codes (e.g. 'S1', 'G2') are not basic ranks
+
+def read_kraken2(filename, artifact_threshold=0):
+    """
+    Takes kraken2 report file (kraken2 --report, or the .kreport of bracken) and make them into python dictionaries.
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the kraken2 report, plain text or gzip/bz2/xz compressed
+
+    artifact_threshold: int,
+        threshold for artifact range, if the reads assigned directly to a taxa id are lower than threshold, the OTU is not added to the dictionary.
+
+    Returns
+    ------------
+    readsDict: dict,
+        dictionary file where:
+                key : NCBI taxanomy ID
+                value : number of reads assigned directly to the taxa id (not cumulated)
+
+    lineages: dict,
+        dictionary file where:
+                key : NCBI taxanomy ID, every taxa id of the report
+                value : tuple of the taxa id at each of the 7 basic ranks of its lineage (0 where the lineage has no such rank)
+    """
+    readsDict = {}
+    lineages = {}
+    for taxa_id, count, lineage in stream_kraken2(filename):
+        lineages[taxa_id] = lineage
+        if count > artifact_threshold:
+            readsDict[taxa_id] = count
+
+    return readsDict, lineages
+
+def stream_kraken2(filename):
+    """
+    Reads kraken2 report file line by line, a row is read when it has 6 columns ('percent<tab>clade reads<tab>direct reads<tab>rank code<tab>taxa id<tab>name')
+    or 8 columns (--report-minimizer-data, two minimizer columns before the rank code) with integer read counts and taxa id.
+    The lineage of every row is built from the indentation of the names (2 spaces per level) and the rank codes of its ancestors,
+    so no taxonomy database is needed. The unclassified row (taxa id 0) is skipped.
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the kraken2 report, plain text or gzip/bz2/xz compressed
+
+    Returns
+    ------------
+    generator of (taxa id, direct reads, lineage) tuples, in file order, lineage as in read_kraken2()
+    """
+    parents = [] ## (depth, lineage) of the ancestors of the current row
+    with open_text(filename) as readFile: ## plain text or gzip/bz2/xz compressed
+        for line in readFile:
+            tokens = line.rstrip('\n').split('\t')
+            if len(tokens) == 8:
+                tokens = tokens[:3] + tokens[5:]
+
+            if len(tokens)==6 and is_integer(tokens[2]) and is_integer(tokens[4]):
+                taxa_id = int(tokens[4])
+                if taxa_id == 0:
+                    continue
+                depth = (len(tokens[5]) - len(tokens[5].lstrip(' ')))//2
+
+                while parents and parents[-1][0] >= depth:
+                    parents.pop()
+                lineage = list(parents[-1][1]) if parents else [0]*len(BASIC_RANKS)
+                rank = KRAKEN2_RANK_CODES.get(tokens[3].strip())
+                if rank is not None:
+                    lineage[BASIC_RANKS.index(rank)] = taxa_id
+                lineage = tuple(lineage)
+                parents.append((depth, lineage))
+
+                yield taxa_id, int(tokens[2]), lineage
+
+def read_bracken(filename, artifact_threshold=0):
+    """
+    Takes bracken output file ('name<tab>taxonomy_id<tab>taxonomy_lvl<tab>kraken_assigned_reads<tab>added_reads<tab>new_est_reads<tab>fraction_total_reads')
+    and make them into python dictionary of the re-estimated reads (new_est_reads).
+    The file only holds the taxa id of one rank, their lineage is looked up as for kaiju files,
+    use the bracken report (.kreport, read_kraken2()) to get the lineage from the file itself.
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the bracken output file, plain text or gzip/bz2/xz compressed
+
+    artifact_threshold: int,
+        threshold for artifact range, if it is lower than threshold, the OTU is not added to the dictionary.
+
+    Returns
+    ------------
+    readsDict: dict,
+        dictionary file where:
+                key : NCBI taxanomy ID
+                value : number of reads
+    """
+    return dict(stream_bracken(filename, artifact_threshold))
+
+def stream_bracken(filename, artifact_threshold=0):
+    """
+    Reads bracken output file line by line, the header row is skipped as its taxonomy_id and new_est_reads columns are not integers.
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the bracken output file, plain text or gzip/bz2/xz compressed
+
+    artifact_threshold: int,
+        threshold for artifact range, if it is lower than threshold, the OTU is not yielded.
+
+    Returns
+    ------------
+    generator of (taxa id, read counts) tuples, in file order
+    """
+    with open_text(filename) as readFile: ## plain text or gzip/bz2/xz compressed
+        for line in readFile:
+            tokens = line.rstrip('\n').split('\t')
+
+            if len(tokens)==7 and is_integer(tokens[1]) and is_integer(tokens[5]):
+                count = int(tokens[5])
+                if count > artifact_threshold:
+                    yield int(tokens[1]), count
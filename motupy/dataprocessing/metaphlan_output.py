@@ -0,0 +1,145 @@
+"""
+    Methods for importing MetaPhlAn profile files
+"""
+from .TaxonomyCache import get_shared_cache
+from .compressed_input import open_text
+from .kaiju_output import is_integer
+from .TaxonomyIndex import BASIC_RANKS, resolve_named_lineages
+
+METAPHLAN_RANK_PREFIXES = {'k': 'superkingdom',
+                        'p': 'phylum',
+                        'c': 'class',
+                        'o': 'order',
+                        'f': 'family',
+                        'g': 'genus',
+                        's': 'species'} ## 't__' (strain/SGB) clades are not basic ranks and are skipped
+
+def read_metaphlan(filename, artifact_threshold=0, ncbi=None):
+    """
+    Takes MetaPhlAn profile file and make them into python dictionaries.
+    Every clade of the profile already holds the relative abundance of all its members (the values are cumulated),
+    the clades at a basic rank are kept with the lineage given by their clade path.
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the MetaPhlAn profile, plain text or gzip/bz2/xz compressed
+
+    artifact_threshold: float,
+        threshold for artifact range, if the relative abundance is lower than threshold, the OTU is not added to the dictionary.
+
+    ncbi: NCBITaxa() or TaxonomyIndex(),
+        taxonomy backend used to translate the clade names of MetaPhlAn2 profiles (no taxa id column) to taxa id,
+        if None the process-wide TaxonomyCache (get_shared_cache()) is used. Not used for MetaPhlAn3/4 profiles.
+
+    Returns
+    ------------
+    abundanceDict: dict,
+        dictionary file where:
+                key : NCBI taxanomy ID
+                value : relative abundance (%) of the clade
+
+    lineages: dict,
+        dictionary file where:
+                key : NCBI taxanomy ID
+                value : tuple of the taxa id at each of the 7 basic ranks of its lineage (0 where the lineage has no such rank)
+    """
+    abundanceDict = {}
+    lineages = {}
+    for taxa_id, abundance, lineage in stream_metaphlan(filename, artifact_threshold, ncbi):
+        abundanceDict[taxa_id] = abundance
+        lineages[taxa_id] = lineage
+
+    return abundanceDict, lineages
+
+def stream_metaphlan(filename, artifact_threshold=0, ncbi=None):
+    """
+    Reads MetaPhlAn profile file line by line, '#' header lines are skipped.
+    MetaPhlAn3/4 rows ('clade_name<tab>clade_taxid<tab>relative_abundance...') carry the taxa id of every level of the clade path
+    ('k__Bacteria|p__Firmicutes' with '2|1239'), so no taxonomy database is needed.
+    MetaPhlAn2 rows ('clade_name<tab>relative_abundance') only have names, the distinct names of the file are translated
+    in a single get_name_translator() call once the file is read.
+
+    Parameters
+    ------------
+    filename: str,
+        location/file name of the MetaPhlAn profile, plain text or gzip/bz2/xz compressed
+
+    artifact_threshold: float,
+        threshold for artifact range, if it is lower than threshold, the OTU is not yielded.
+
+    ncbi: NCBITaxa() or TaxonomyIndex(),
+        see read_metaphlan()
+
+    Returns
+    ------------
+    generator of (taxa id, relative abundance, lineage) tuples, in file order, lineage as in read_metaphlan()
+    """
+    named_rows = [] ## MetaPhlAn2 rows, translated once the file is read
+    with open_text(filename) as readFile: ## plain text or gzip/bz2/xz compressed
+        for line in readFile:
+            if line.startswith('#'):
+                continue
+            tokens = line.rstrip('\n').split('\t')
+            if len(tokens) < 2:
+                continue
+
+            levels = [level.split('__', 1) for level in tokens[0].split('|')]
+            if len(levels[-1]) != 2 or levels[-1][0] not in METAPHLAN_RANK_PREFIXES:
+                continue ## 'UNKNOWN'/'UNCLASSIFIED' row or a clade below the basic ranks
+
+            if len(tokens) >= 3 and (is_integer(tokens[1]) or '|' in tokens[1]): ## MetaPhlAn3/4 taxa id path
+                abundance = float(tokens[2])
+                level_ids = tokens[1].split('|')
+                if len(level_ids) != len(levels) or not is_integer(level_ids[-1]) or abundance <= artifact_threshold:
+                    continue
+                lineage = [0]*len(BASIC_RANKS)
+                for level, level_id in zip(levels, level_ids):
+                    if len(level) == 2 and level[0] in METAPHLAN_RANK_PREFIXES and is_integer(level_id):
+                        lineage[BASIC_RANKS.index(METAPHLAN_RANK_PREFIXES[level[0]])] = int(level_id)
+                yield int(level_ids[-1]), abundance, tuple(lineage)
+
+            else:
+                abundance = float(tokens[1])
+                if abundance > artifact_threshold:
+                    named_rows.append((levels, abundance))
+
+    if named_rows:
+        yield from resolve_named_rows(named_rows, ncbi)
+
+def resolve_named_rows(named_rows, ncbi=None):
+    """
+    Translates the clade paths of MetaPhlAn2 rows into taxa id lineages, every distinct name in a single get_name_translator() call
+    (see TaxonomyIndex.resolve_named_lineages()). A name of several taxa id (e.g. 'g__Bacillus') is told apart by the level above it,
+    the k__ level being always unique. Rows with a name that stays ambiguous are dropped (and printed), rows whose own clade name
+    is not found in the taxonomy are skipped.
+
+    Parameters
+    ------------
+    named_rows: list [(list [[prefix, name]], float)],
+        split clade path and relative abundance of every row
+
+    ncbi: NCBITaxa() or TaxonomyIndex(),
+        taxonomy backend, if None the process-wide TaxonomyCache (get_shared_cache()) is used
+
+    Returns
+    ------------
+    generator of (taxa id, relative abundance, lineage) tuples
+    """
+    if ncbi is None:
+        ncbi = get_shared_cache()
+
+    def clade_name(level):
+        return level[1].replace('_', ' ') ## 's__Escherichia_coli' is 'Escherichia coli'
+
+    named_lineages = [[(BASIC_RANKS.index(METAPHLAN_RANK_PREFIXES[level[0]]), clade_name(level)) for level in levels
+                       if len(level) == 2 and level[0] in METAPHLAN_RANK_PREFIXES] for levels, _ in named_rows]
+    lineages, ambiguous = resolve_named_lineages(ncbi, named_lineages, BASIC_RANKS)
+
+    for row, (levels, abundance) in enumerate(named_rows):
+        if row in ambiguous:
+            print('[AMBIGUOUS NAME] %s of %s has several taxa id, row dropped'%(ambiguous[row], '|'.join('__'.join(level) for level in levels)))
+            continue
+        taxa_id = lineages[row, BASIC_RANKS.index(METAPHLAN_RANK_PREFIXES[levels[-1][0]])]
+        if taxa_id != 0:
+            yield int(taxa_id), abundance, tuple(lineages[row].tolist())
@@ -0,0 +1,54 @@
+"""
+    Methods for turning a nest ({sample id: {feature: value}}) into a scipy sparse (samples x features) matrix,
+    built row by row from the per sample arrays instead of going through a dense dataframe and its transpose.
+"""
+import numpy as np
+
+def nest_to_csr(nest, dtype=None):
+    """
+    Parameters
+    ------------
+    nest: dict,
+        e.g. OTUnest.nest, {sample id: {taxa id or gene id: read counts/abundance}} (GeneNest builds its matrix from gene id codes, see GeneNest.to_scipy_sparse())
+
+    dtype: numpy dtype,
+        dtype of the matrix, if None int64 when every value is an integer (read counts) and float64 otherwise
+        (string values are parsed into float)
+
+    Returns
+    ------------
+    matrix: scipy sparse csr matrix,
+        shape (n samples, n features), features missing from a sample are not stored (read as 0)
+
+    sample_ids: numpy array,
+        sample id of every row, in nest order
+
+    features: numpy array,
+        sorted taxa id / gene id of every column
+    """
+    from scipy import sparse ## scipy is only imported when needed, parsing does not need it
+
+    sample_ids = np.array(list(nest.keys()))
+    keys = [np.array(list(sample.keys())) for sample in nest.values()]
+    values = [np.array(list(sample.values())) for sample in nest.values()]
+
+    filled = [row_keys for row_keys in keys if len(row_keys) > 0]
+    features = np.unique(np.concatenate(filled)) if filled else np.zeros(0, dtype=np.int64)
+
+    if dtype is None:
+        kinds = {row_values.dtype.kind for row_values in values if len(row_values) > 0}
+        dtype = np.int64 if kinds <= {'i', 'u', 'b'} else np.float64
+
+    indptr = np.zeros(len(keys)+1, dtype=np.int64)
+    indices = [np.zeros(0, dtype=np.int64)]
+    data = [np.zeros(0, dtype=dtype)]
+    for row, (row_keys, row_values) in enumerate(zip(keys, values)):
+        columns = np.searchsorted(features, row_keys)
+        order = np.argsort(columns, kind='stable')
+        indices.append(columns[order])
+        data.append(row_values[order].astype(dtype))
+        indptr[row+1] = indptr[row] + len(row_keys)
+
+    matrix = sparse.csr_matrix((np.concatenate(data), np.concatenate(indices), indptr), shape=(len(keys), len(features)))
+
+    return matrix, sample_ids, features
@@ -1,3 +1,22 @@
-from .timedecay import timedecay
+"""
+    timedecay (and statsmodels, matplotlib, seaborn, scikit-bio) is only imported the first time it is used.
+"""
+import importlib as _importlib
+import sys as _sys
+from motupy._lazy import LazyModule as _LazyModule
 
-__all__ = ["timedecay"]
\ No newline at end of file
+_lazy_names = {"timedecay": ".timedecay"}
+
+__all__ = ["timedecay"]
+
+def __getattr__(name):
+    if name in _lazy_names:
+        value = getattr(_importlib.import_module(_lazy_names[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names))
+
+_sys.modules[__name__].__class__ = _LazyModule ## importing a submodule does not hide the class of the same name
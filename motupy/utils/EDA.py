@@ -7,7 +7,9 @@
 import numpy as np
 import pandas as pd
 
-from ete3 import NCBITaxa; ncbi = NCBITaxa()
+from motupy.dataprocessing.TaxonomyCache import get_shared_cache; ncbi = get_shared_cache()
+from motupy.dataprocessing.TaxonomyIndex import assign_clades
+from motupy.dataprocessing.MatrixStore import MatrixStore
 
 from scipy.spatial import distance
 from skbio.stats import composition, ordination
@@ -49,23 +51,32 @@ class EDA():
         return stats_df
 
 
-    def filter_otu_coverage(self, dataframe, otu_coverage=0.0025):
+    def filter_otu_coverage(self, dataframe, otu_coverage=0.0025, output_dir=None):
         """
         Selects OTU that are found in given fraction of samples. 
         
         Parameters
         ------------
-        dataframe : pandas DataFrame,
+        dataframe : pandas DataFrame or MatrixStore,
                         rows = sample,
                         columns = OTU
+                        a MatrixStore is filtered one shard at a time into a new store, see MatrixStore.filter_otu_coverage()
 
         otu_coverage : float,
                         the fraction of samples covered by the the OTU
 
+        output_dir : str,
+                        folder of the filtered store when dataframe is a MatrixStore, if None '<store folder>_filtered'
+
         Returns
         ------------
-        dataframe : pandas DataFrame that has been filtered
+        dataframe : pandas DataFrame (or MatrixStore) that has been filtered
         """
+        if isinstance(dataframe, MatrixStore):
+            if output_dir is None:
+                output_dir = dataframe.store_dir.rstrip('/')+'_filtered'
+            return dataframe.filter_otu_coverage(output_dir, otu_coverage)
+
         df = dataframe.copy()
         df.replace(0, np.nan, inplace=True)
         if isinstance(otu_coverage, float):
@@ -76,6 +87,62 @@ class EDA():
 
         return df
 
+    def relative_abundance(self, dataframe, output_dir=None):
+        """
+        Turns the read counts of every sample into relative abundance (divided by the sample total).
+
+        Parameters
+        ------------
+        dataframe : pandas DataFrame or MatrixStore,
+                        rows = sample,
+                        columns = OTU
+                        a MatrixStore is converted one shard at a time into a new store, see MatrixStore.relative_abundance()
+
+        output_dir : str,
+                        folder of the new store when dataframe is a MatrixStore, if None '<store folder>_relative'
+
+        Returns
+        ------------
+        dataframe : pandas DataFrame (or MatrixStore) of relative abundance
+        """
+        if isinstance(dataframe, MatrixStore):
+            if output_dir is None:
+                output_dir = dataframe.store_dir.rstrip('/')+'_relative'
+            return dataframe.relative_abundance(output_dir)
+
+        df = dataframe.fillna(0)
+        return df.div(df.sum(axis=1), axis=0).fillna(0)
+
+    def clr(self, dataframe, output_file=None, pseudocount=0.55):
+        """
+        Centred log-ratio transformation, zeroes are replaced with pseudocount first (as in aitchison_distance_matrix()).
+
+        Parameters
+        ------------
+        dataframe : pandas DataFrame or MatrixStore,
+                        rows = sample,
+                        columns = OTU
+                        a MatrixStore is transformed one shard at a time into a memory-mapped .npy file, see MatrixStore.clr()
+
+        output_file : str,
+                        location of the .npy file when dataframe is a MatrixStore, if None '<store folder>/clr.npy'
+
+        pseudocount : float,
+                        value replacing the zeroes
+
+        Returns
+        ------------
+        dataframe : pandas DataFrame of clr values (numpy memmap for a MatrixStore, rows/columns follow its samples/features)
+        """
+        if isinstance(dataframe, MatrixStore):
+            if output_file is None:
+                output_file = dataframe.store_dir.rstrip('/')+'/clr.npy'
+            return dataframe.clr(output_file, pseudocount)
+
+        copied = dataframe.fillna(0)
+        X_imputed = copied.replace(0, pseudocount)
+        return pd.DataFrame(composition.clr(X_imputed), columns=copied.columns, index=copied.index)
+
     def clean_artifact(self, dataframe, artifact_threshold=5):
         """
         Replaces count values less than artifact_threshold values with zeroes.
@@ -274,16 +341,10 @@ class EDA():
                 'eukaryote': set(),
                 'archaea': set()
                 }
-        for taxid in df.columns:
-            taxid = int(taxid)
-            if 2 in ncbi.get_lineage(taxid):
-                kingdomsets['bacteria'].add(taxid)
-            elif 10239 in ncbi.get_lineage(taxid):
-                kingdomsets['virus'].add(taxid)
-            elif 2759 in ncbi.get_lineage(taxid):
-                kingdomsets['eukaryote'].add(taxid)
-            else:
-                kingdomsets['archaea'].add(taxid)
+        kingdom_names = {2: 'bacteria', 10239: 'virus', 2759: 'eukaryote', 0: 'archaea'} ## anything outside the first three goes to archaea
+        taxids = [int(taxid) for taxid in df.columns]
+        for taxid, kingdom in zip(taxids, assign_clades(ncbi, taxids, [2, 10239, 2759])):
+            kingdomsets[kingdom_names[int(kingdom)]].add(taxid)
             
         return kingdomsets
 
@@ -1,6 +1,26 @@
-from .describe import describe
-from .mp_methods import utils
-from .EDA import EDA
-from .visualisation import visualise
+"""
+    The analysis tools are loaded lazily: the submodule (and its heavy dependencies such as scikit-bio, scipy,
+    matplotlib and seaborn) is only imported the first time one of the names below is used.
+"""
+import importlib as _importlib
+import sys as _sys
+from motupy._lazy import LazyModule as _LazyModule
 
-__all__ = ["describe", "utils", "EDA", "visualise"]
\ No newline at end of file
+_lazy_names = {"describe": ".describe",
+               "utils": ".mp_methods",
+               "EDA": ".EDA",
+               "visualise": ".visualisation"}
+
+__all__ = ["describe", "utils", "EDA", "visualise"]
+
+def __getattr__(name):
+    if name in _lazy_names:
+        value = getattr(_importlib.import_module(_lazy_names[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names))
+
+_sys.modules[__name__].__class__ = _LazyModule ## importing a submodule does not hide the class of the same name
@@ -1,5 +1,38 @@
+from motupy.dataprocessing.TaxonomyCache import get_shared_cache
+from motupy.dataprocessing.TaxonomyIndex import assign_clades
+
 class describe():
-    def bacteria_counter(self, reads_dictionary, ncbi):
+    def clade_counter(self, reads_dictionary, clade, ncbi=None):
+        """
+        counts the number of reads under a clade in the reads dictionary file, all taxa id are tested in one vectorised call
+
+        Parameters
+        ------------
+        reads_dictionary: dict,
+            reads dictionary file with key = taxa id, value = number of reads
+
+        clade: int,
+            taxa id of the clade, e.g. 2 for bacteria
+
+        ncbi: NCBITaxa(),
+            ncbi taxa tool from ete3 (or TaxonomyIndex/TaxonomyCache), if None the process-wide TaxonomyCache is used
+
+        Returns
+        ------------
+        clade_count: int,
+            the number of reads that contributes to the clade
+        """
+        if ncbi is None:
+            ncbi = get_shared_cache()
+        keys = list(reads_dictionary.keys())
+        inside = assign_clades(ncbi, keys, [clade]) == clade
+        clade_count = 0
+        for key, key_inside in zip(keys, inside):
+            if key_inside:
+                clade_count += reads_dictionary[key]
+        return clade_count
+
+    def bacteria_counter(self, reads_dictionary, ncbi=None):
         """
         counts the number of bacteria in the reads dictionary file
 
@@ -9,20 +42,19 @@ class describe():
             reads dictionary file with key = taxa id, value = number of reads
 
         ncbi: NCBITaxa(),
-            ncbi taxa tool from ete3
+            ncbi taxa tool from ete3 (or TaxonomyIndex/TaxonomyCache), if None the process-wide TaxonomyCache is used
 
         Returns
         ------------
         bact_count: int,
             the number of reads that contributes to bacteria kingdom
         """
-        bact_count = 0
-        for key in reads_dictionary.keys():
-            if 2 in ncbi.get_lineage(key):
-                bact_count += reads_dictionary[key]
+        if ncbi is None:
+            ncbi = get_shared_cache()
+        bact_count = self.clade_counter(reads_dictionary, 2, ncbi)
         return bact_count
 
-    def virus_counter(self,  reads_dictionary, ncbi):
+    def virus_counter(self,  reads_dictionary, ncbi=None):
         """
         counts the number of viruses in the reads dictionary file
 
@@ -32,20 +64,19 @@ class describe():
             reads dictionary file with key = taxa id, value = number of reads
 
         ncbi: NCBITaxa(),
-            ncbi taxa tool from ete3
+            ncbi taxa tool from ete3 (or TaxonomyIndex/TaxonomyCache), if None the process-wide TaxonomyCache is used
 
         Returns
         ------------
         virus_count: int,
             the number of reads that contributes to virus kingdom
         """
-        virus_count = 0
-        for key in reads_dictionary.keys():
-            if 10239 in ncbi.get_lineage(key):
-                virus_count += reads_dictionary[key]
+        if ncbi is None:
+            ncbi = get_shared_cache()
+        virus_count = self.clade_counter(reads_dictionary, 10239, ncbi)
         return virus_count
 
-    def eukaryota_counter(self, reads_dictionary, ncbi):
+    def eukaryota_counter(self, reads_dictionary, ncbi=None):
         """
         counts the number of eukaryotes in the reads dictionary file
 
@@ -55,20 +86,19 @@ class describe():
             reads dictionary file with key = taxa id, value = number of reads
 
         ncbi: NCBITaxa(),
-            ncbi taxa tool from ete3
+            ncbi taxa tool from ete3 (or TaxonomyIndex/TaxonomyCache), if None the process-wide TaxonomyCache is used
 
         Returns
         ------------
         eukaryote_count: int,
             the number of reads that contributes to eukaryote kingdom
         """
-        eukaryote_count = 0
-        for key in reads_dictionary.keys():
-            if 2759 in ncbi.get_lineage(key):
-                eukaryote_count += reads_dictionary[key]
+        if ncbi is None:
+            ncbi = get_shared_cache()
+        eukaryote_count = self.clade_counter(reads_dictionary, 2759, ncbi)
         return eukaryote_count
 
-    def archaea_counter(self, reads_dictionary, ncbi):
+    def archaea_counter(self, reads_dictionary, ncbi=None):
         """
         counts the number of archaea in the reads dictionary file
 
@@ -78,20 +108,19 @@ class describe():
             reads dictionary file with key = taxa id, value = number of reads
 
         ncbi: NCBITaxa(),
-            ncbi taxa tool from ete3
+            ncbi taxa tool from ete3 (or TaxonomyIndex/TaxonomyCache), if None the process-wide TaxonomyCache is used
 
         Returns
         ------------
         archaea_count: int,
             the number of reads that contributes to archaea kingdom
         """
-        archaea_count = 0
-        for key in reads_dictionary.keys():
-            if 2157 in ncbi.get_lineage(key):
-                archaea_count += reads_dictionary[key]
+        if ncbi is None:
+            ncbi = get_shared_cache()
+        archaea_count = self.clade_counter(reads_dictionary, 2157, ncbi)
         return archaea_count
 
-    def otu_counts(self, reads_dictionary, ncbi):
+    def otu_counts(self, reads_dictionary, ncbi=None):
         """
         counts the number of OTUs that makes up the 4 main kingdoms. 
 
@@ -101,30 +130,24 @@ class describe():
             reads dictionary file with key = taxa id, value = number of reads
 
         ncbi: NCBITaxa(),
-            ncbi taxa tool from ete3
+            ncbi taxa tool from ete3 (or TaxonomyIndex/TaxonomyCache), if None the process-wide TaxonomyCache is used
 
         Returns
         ------------
         vir_otu, bact_otu, euk_otu, archa_otu: int,
             the number of OTUs for the corresponding kingdoms
         """
-        vir_otu = 0
-        bact_otu = 0
-        euk_otu = 0
-        archa_otu = 0
-        for key in reads_dictionary.keys():
-            if 2 in ncbi.get_lineage(key):
-                bact_otu+=1
-            elif 10239 in ncbi.get_lineage(key):
-                vir_otu+=1
-            elif 2759 in ncbi.get_lineage(key):
-                euk_otu+=1
-            else:
-                archa_otu+=1
+        if ncbi is None:
+            ncbi = get_shared_cache()
+        kingdoms = assign_clades(ncbi, list(reads_dictionary.keys()), [2, 10239, 2759])
+        bact_otu = int((kingdoms == 2).sum())
+        vir_otu = int((kingdoms == 10239).sum())
+        euk_otu = int((kingdoms == 2759).sum())
+        archa_otu = int((kingdoms == 0).sum())
         
         return vir_otu, bact_otu, euk_otu, archa_otu
         
-    def describe(self, reads_dictionary, cumulated, ncbi):
+    def describe(self, reads_dictionary, cumulated, ncbi=None):
         """
         prints out the number of reads/OTUs and percentage of reads in total for the 4 superkingdoms:
         Viruses, Bacteria, Eukaryota, and Archaea
@@ -138,12 +161,14 @@ class describe():
             if the reads_dictionary have been taxa_cumulated
 
         ncbi: NCBITaxa(),
-            ncbi taxa tool from ete3
+            ncbi taxa tool from ete3 (or TaxonomyIndex/TaxonomyCache), if None the process-wide TaxonomyCache is used
 
         Returns
         ------------
         N/A
         """
+        if ncbi is None:
+            ncbi = get_shared_cache()
         if cumulated:
             try:
                 virus_count = reads_dictionary[10239]
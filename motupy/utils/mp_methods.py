@@ -1,11 +1,13 @@
 """
     This module contains methods for processing single sample read dictionary files.
 """
-from ete3 import NCBITaxa
 import pandas as pd
 import numpy as np
+from motupy.dataprocessing.TaxonomyIndex import resolve_lineages as lineage_matrix
+from motupy.dataprocessing.TaxonomyCache import get_shared_cache
+from motupy.dataprocessing.cumulation import cumulate_reads
 
-ncbi = NCBITaxa
+ncbi = get_shared_cache()
 class utils():
     def taxa_cumulation(self, reads_dictionary, basic_ranks=['superkingdom',
                             'phylum',
@@ -16,9 +18,8 @@ class utils():
                             'species']):
         """
         Goes through all the taxa_id (keys) in the dict.
-        For each of the taxa_id, it iteratively goes through their lineage using ete3 NCBITaxa.get_lineage().
-        As it goes through lineage of taxa_id, it finds if there is a key in the dict corresponding to the taxa_id.
-        If the key for the taxa_id is not found, it will be created and read counts from lower rank will be added to it.
+        The lineage of every taxa_id at the given basic_ranks is resolved in one call, ancestors not in the dict are created
+        and the read counts are added up from lower to higher rank in a single bottom-up pass, see cumulation.cumulate_reads().
 
         Parameters
         ------------
@@ -36,26 +37,41 @@ class utils():
         """
 
         taxid_key_list = list(reads_dictionary.keys())
-        for taxid_key in taxid_key_list:
-            ordered_lineage = self.transform_lineage(taxid_key, basic_ranks)
+        lineages = self.resolve_lineages(taxid_key_list, basic_ranks)
+        nodes, node_counts, _, _ = cumulate_reads(taxid_key_list, [reads_dictionary[taxid] for taxid in taxid_key_list], lineages)
 
-            if taxid_key != ordered_lineage[0]: ## if the current taxid(taxid_key) is not the lowest rank (not strain/subsps i.e. anything beyond species level)
-                reads_dictionary = self.update_dictfile(ordered_lineage[0], taxid_key, reads_dictionary, basic_ranks)
+        ## taxa id without any basic rank in their lineage have nothing to cumulate into and are kept as they are
+        kept = {taxid: reads_dictionary[taxid] for taxid, missing in zip(taxid_key_list, (~lineages.any(axis=1)).tolist()) if missing}
+        reads_dictionary.clear() ## updated in place, as before
+        reads_dictionary.update(kept)
+        reads_dictionary.update(zip(nodes.tolist(), node_counts.tolist()))
 
-            for taxid in ordered_lineage[1:]:
-                if taxid not in reads_dictionary:
-                    reads_dictionary[taxid] = 0
+        return reads_dictionary
 
-        flipped_ranks = basic_ranks[::-1]
-        ranks = self.update_ranks(reads_dictionary)
+    def resolve_lineages(self, taxids, basic_ranks=['superkingdom',
+                            'phylum',
+                            'class',
+                            'order',
+                            'family',
+                            'genus',
+                            'species']):
+        """
+        Resolves the lineage of every taxa id of a sample (or of a whole cohort) in one call.
 
-        for i, r in enumerate(flipped_ranks[:-1]): ## this reverses it to start from sps rank, so sps read count will be added to genus and genus to family and so on. 
-            parent_rank = flipped_ranks[i+1]
-            for taxid in ranks[r]:
-                parent_taxid = self.find_parent_taxid(taxid, parent_rank, flipped_ranks)
-                reads_dictionary[parent_taxid] += reads_dictionary[taxid]
+        Parameters
+        ------------
+        taxids: list/array [int],
+            NCBI Taxanomy IDs, e.g. list(reads_dictionary.keys())
 
-        return reads_dictionary
+        basic_ranks: list [str],
+            the desired ranks to be seen in lineage, ordered from highest to lowest
+
+        Returns
+        ------------
+        lineages: numpy array,
+            int32 matrix of shape (n taxa id, n ranks) holding the taxa id of the ancestor at each rank, 0 where the lineage has no such rank.
+        """
+        return lineage_matrix(ncbi, taxids, basic_ranks)
 
     def transform_lineage(self, taxanomy_id, basic_ranks):
         """
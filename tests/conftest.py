@@ -0,0 +1,85 @@
+import sqlite3
+import pytest
+
+from motupy.dataprocessing.TaxonomyIndex import TaxonomyIndex
+
+## (taxid, parent, name, rank) of a small taxonomy in the ete3 sqlite layout,
+## 'Bacillus' is both a bacteria genus (1386) and a stick insect genus (55087)
+TAXONOMY_ROWS = [(1, 1, 'root', 'no rank'), (131567, 1, 'cellular organisms', 'no rank'),
+                 (2, 131567, 'Bacteria', 'superkingdom'), (1224, 2, 'Proteobacteria', 'phylum'),
+                 (1236, 1224, 'Gammaproteobacteria', 'class'), (91347, 1236, 'Enterobacterales', 'order'),
+                 (543, 91347, 'Enterobacteriaceae', 'family'), (561, 543, 'Escherichia', 'genus'),
+                 (562, 561, 'Escherichia coli', 'species'), (83333, 562, 'Escherichia coli K-12', 'strain'),
+                 (620, 543, 'Shigella', 'genus'), (622, 620, 'Shigella dysenteriae', 'species'),
+                 (1239, 2, 'Firmicutes', 'phylum'), (1000, 1239, 'Firmicutes sp. noorder', 'species'), (91061, 1239, 'Bacilli', 'class'),
+                 (1385, 91061, 'Bacillales', 'order'), (186817, 1385, 'Bacillaceae', 'family'),
+                 (1386, 186817, 'Bacillus', 'genus'), (1423, 1386, 'Bacillus subtilis', 'species'),
+                 (2759, 131567, 'Eukaryota', 'superkingdom'), (33208, 2759, 'Metazoa', 'kingdom'),
+                 (6656, 33208, 'Arthropoda', 'phylum'), (50557, 6656, 'Insecta', 'class'),
+                 (7022, 50557, 'Phasmida', 'order'), (55090, 7022, 'Bacillidae', 'family'),
+                 (55087, 55090, 'Bacillus', 'genus'), (13132, 55087, 'Bacillus rossius', 'species'),
+                 (4751, 2759, 'Fungi', 'kingdom'), (4890, 4751, 'Ascomycota', 'phylum'),
+                 (10239, 1, 'Viruses', 'superkingdom'), (2157, 131567, 'Archaea', 'superkingdom'),
+                 (28890, 2157, 'Euryarchaeota', 'phylum')]
+
+def write_taxonomy_db(path):
+    connection = sqlite3.connect(str(path))
+    connection.execute("CREATE TABLE species (taxid INT PRIMARY KEY, parent INT, spname VARCHAR(50) COLLATE NOCASE, common VARCHAR(50) COLLATE NOCASE, rank VARCHAR(50), track TEXT)")
+    connection.execute("CREATE TABLE synonym (taxid INT, spname VARCHAR(50) COLLATE NOCASE, PRIMARY KEY (spname, taxid))")
+    connection.execute("CREATE TABLE merged (taxid_old INT, taxid_new INT)")
+    connection.executemany("INSERT INTO species VALUES (?, ?, ?, '', ?, '')", TAXONOMY_ROWS)
+    connection.execute("INSERT INTO synonym VALUES (562, 'Bacterium coli')")
+    connection.execute("INSERT INTO merged VALUES (999, 562)")
+    connection.commit()
+    connection.close()
+    return str(path)
+
+@pytest.fixture(scope='session')
+def taxonomy_db(tmp_path_factory):
+    return write_taxonomy_db(tmp_path_factory.mktemp('taxonomy') / 'taxa.sqlite')
+
+@pytest.fixture(scope='session')
+def ncbi(taxonomy_db):
+    return TaxonomyIndex(taxonomy_db)
+
+class CountingTaxonomy:
+    """ wraps a taxonomy backend and records the names sent to get_name_translator() and the taxa id sent to resolve_lineages() """
+    def __init__(self, ncbi):
+        self.ncbi = ncbi
+        self.translated_names = []
+        self.lineage_taxids = []
+
+    def __getattr__(self, name):
+        return getattr(self.ncbi, name)
+
+    def get_name_translator(self, names):
+        self.translated_names.extend(names)
+        return self.ncbi.get_name_translator(names)
+
+    def resolve_lineages(self, taxids, ranks):
+        self.lineage_taxids.extend(int(taxid) for taxid in taxids)
+        return self.ncbi.resolve_lineages(taxids, ranks)
+
+@pytest.fixture
+def counting_ncbi(ncbi):
+    return CountingTaxonomy(ncbi)
+
+## read counts of the kaiju samples of kaiju_folder, by taxa id
+KAIJU_SAMPLES = {'sample0': {562: 100, 83333: 20, 622: 7, 1000: 3, 4890: 9, 28890: 4, 10239: 2, 620: 1, 1423: 12, 13132: 5},
+                 'sample1': {562: 40, 622: 30, 1386: 8, 4890: 1, 28890: 6}}
+
+def write_kaiju_sample(path, counts):
+    lines = ['file\tpercent\treads\ttaxon_id\ttaxon_name', '-'*40]
+    total = sum(counts.values())
+    lines += ['%d\t%.6f\t%s\t%d\tname %d'%(count, 100*count/total, path.name, taxid, taxid) for taxid, count in counts.items()]
+    lines += ['-'*40, '%d\t0.0\t%s\tNA\tunclassified'%(3, path.name)]
+    path.write_text('\n'.join(lines)+'\n')
+    return str(path)
+
+@pytest.fixture
+def kaiju_folder(tmp_path):
+    folder = tmp_path / 'kaiju'
+    folder.mkdir()
+    for sample_id, counts in KAIJU_SAMPLES.items():
+        write_kaiju_sample(folder / (sample_id+'.out'), counts)
+    return str(folder)
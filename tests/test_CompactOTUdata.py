@@ -0,0 +1,30 @@
+import pytest
+from motupy.dataprocessing.OTUdata import OTUdata
+from motupy.dataprocessing.CompactOTUdata import CompactOTUdata
+from conftest import KAIJU_SAMPLES, write_kaiju_sample
+
+@pytest.fixture
+def sample(tmp_path, ncbi):
+    sample = OTUdata(write_kaiju_sample(tmp_path / 'sample0.out', KAIJU_SAMPLES['sample0']), 'kaiju', ncbi=ncbi)
+    sample.taxa_cumulation()
+    return sample
+
+def test_same_content(sample):
+    compact = CompactOTUdata(sample)
+    assert compact.file_id == sample.file_id and compact.cumulated
+    assert compact.otufile == sample.otufile
+    assert compact.ranks == sample.ranks
+    ## OTUdata keeps taxa id moved onto their species (strain 83333) in its superkingdom sets, the copy only holds the taxa id of otufile
+    assert compact.superkingdom == {kingdom: taxids & sample.otufile.keys() for kingdom, taxids in sample.superkingdom.items()}
+    assert compact.get_clade_read_counts() == sample.get_clade_read_counts()
+    assert compact.select_rank(['genus', 'Species']) == sample.select_rank(['genus', 'Species'])
+    with pytest.raises(AttributeError): ## __slots__, no per instance dictionary
+        compact.ncbi = None
+
+def test_clade_relative(sample):
+    compact = CompactOTUdata(sample)
+    compact.turn_reads_to_clade_relative_abundance()
+    sample.turn_reads_to_clade_relative_abundance()
+    assert compact.otufile.keys() == sample.otufile.keys()
+    for taxid, value in sample.otufile.items():
+        assert compact.otufile[taxid] == pytest.approx(value, rel=1e-6)
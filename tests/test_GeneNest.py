@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+from motupy.dataprocessing.GeneNest import GeneNest
+from motupy.dataprocessing.GeneData import GeneData
+from motupy.dataprocessing.SampleCache import SampleCache
+
+## unstratified rows of the humann2 samples, the genes are not in sorted order in the files
+HUMANN2_SAMPLES = {'s0': [('UniRef90_Z', '6.5'), ('UniRef90_B', '2'), ('UniRef90_A', '5.5')],
+                   's1': [('UniRef90_C', '1.25'), ('UniRef90_A', '3'), ('UniRef90_10', '0.5')]}
+
+def write_humann2_sample(path, sample_id, rows):
+    lines = ['# Gene Family\t%s_Abundance-RPKs'%sample_id, 'UNMAPPED\t10.0']
+    for gene, value in rows:
+        lines += ['%s\t%s'%(gene, value), '%s|g__Escherichia.s__Escherichia_coli\t%s'%(gene, value)]
+    path.write_text('\n'.join(lines)+'\n')
+
+@pytest.fixture
+def humann2_folder(tmp_path):
+    folder = tmp_path / 'humann2'
+    folder.mkdir()
+    for sample_id, rows in HUMANN2_SAMPLES.items():
+        write_humann2_sample(folder / (sample_id+'_genefamilies.tsv'), sample_id, rows)
+    return str(folder)
+
+def build(folder, **kwargs):
+    nest = GeneNest()
+    return nest, nest.build_from_folder(folder, 'humann2', extension='_genefamilies.tsv', **kwargs)
+
+@pytest.mark.parametrize('numeric', [False, True])
+def test_column_order(humann2_folder, numeric):
+    nest, data = build(humann2_folder, numeric=numeric)
+    genes = sorted({gene for rows in HUMANN2_SAMPLES.values() for gene, _ in rows} | {'UNMAPPED'})
+    assert list(data.columns) == genes
+
+    matrix, sample_ids, sparse_genes = nest.to_scipy_sparse()
+    assert list(sparse_genes) == genes and list(sample_ids) == list(data.index)
+    assert np.allclose(matrix.toarray(), data.astype(float).fillna(0).to_numpy())
+    assert list(nest.to_dataframe(sparse=True).columns) == genes
+
+def test_to_dict(humann2_folder):
+    nest, data = build(humann2_folder)
+    expected = {sample_id: dict(rows, UNMAPPED='10.0') for sample_id, rows in HUMANN2_SAMPLES.items()}
+    assert nest.to_dict() == expected
+    assert nest.get_genefile('s1') == GeneData(humann2_folder+'/s1_genefamilies.tsv', 'humann2', extension='_genefamilies.tsv').genefile
+    ## the former dataframe, built from the dictionary layout, holds the same table
+    assert pd.DataFrame(nest.to_dict()).transpose()[data.columns].equals(data)
+
+@pytest.mark.parametrize('numeric', [False, True])
+def test_jobs_and_cache(humann2_folder, tmp_path, numeric):
+    _, expected = build(humann2_folder, numeric=numeric)
+    expected = expected.sort_index()
+    assert build(humann2_folder, numeric=numeric, n_jobs=2)[1].sort_index().equals(expected)
+    cache = SampleCache(str(tmp_path / 'cache'))
+    for _ in range(2): ## cold then warm
+        assert build(humann2_folder, numeric=numeric, cache=cache)[1].sort_index().equals(expected)
+
+def test_numeric(humann2_folder):
+    nest, data = build(humann2_folder, numeric=True)
+    assert (data.dtypes == np.float32).all()
+    for sample_id, rows in HUMANN2_SAMPLES.items():
+        values = dict(rows, UNMAPPED='10.0')
+        for gene in data.columns: ## NaN where the sample lacks the gene
+            if gene in values:
+                assert data.loc[sample_id, gene] == np.float32(values[gene])
+            else:
+                assert np.isnan(data.loc[sample_id, gene])
+    assert nest.to_scipy_sparse()[0].dtype == np.float32
+
+@pytest.fixture
+def many_samples_folder(tmp_path):
+    ## the samples list their genes in different orders, so every worker interns them with its own codes
+    folder = tmp_path / 'many'
+    folder.mkdir()
+    for sample in range(9):
+        rows = [('UniRef90_%d'%gene, '%d.5'%(sample+gene)) for gene in range(sample % 4, 12, 1 + sample % 3)]
+        write_humann2_sample(folder / ('m%d_genefamilies.tsv'%sample), 'm%d'%sample, rows[::(-1)**sample])
+    return str(folder)
+
+def stratified_rows(nest):
+    sample_codes, gene_codes, taxon_codes, values = nest.stratified.to_coo()
+    return list(zip(np.array(nest.stratified.samples)[sample_codes].tolist(), nest.genes.lookup(gene_codes).tolist(), nest.stratified.taxa.lookup(taxon_codes).tolist(), values.tolist()))
+
+@pytest.mark.parametrize('kwargs', [dict(), dict(numeric=True), dict(stratified=True)])
+def test_jobs(many_samples_folder, kwargs):
+    serial_nest, expected = build(many_samples_folder, **kwargs)
+    for n_jobs in [2, 3]:
+        parallel_nest, data = build(many_samples_folder, n_jobs=n_jobs, **kwargs)
+        assert list(data.index) == list(expected.index) ## same sample order
+        assert list(data.columns) == list(expected.columns)
+        assert data.equals(expected)
+        assert parallel_nest.to_dict() == serial_nest.to_dict()
+        if kwargs.get('stratified'):
+            assert stratified_rows(parallel_nest) == stratified_rows(serial_nest)
@@ -0,0 +1,30 @@
+import numpy as np
+from motupy.dataprocessing.IdInterner import IdInterner
+
+def test_intern():
+    interner = IdInterner(['UniRef90_B', 'UniRef90_A'])
+    assert interner.intern('UniRef90_A') == 1 and interner.intern('UniRef90_C') == 2 and len(interner) == 3
+
+    codes = interner.intern_many(['UniRef90_C', 'UniRef90_D', 'UniRef90_B', 'UniRef90_D'])
+    assert codes.dtype == np.int32 and codes.tolist() == [2, 3, 0, 3]
+    assert interner.names == ['UniRef90_B', 'UniRef90_A', 'UniRef90_C', 'UniRef90_D']
+    assert interner.intern_many([]).tolist() == []
+
+    assert interner.lookup(codes).tolist() == ['UniRef90_C', 'UniRef90_D', 'UniRef90_B', 'UniRef90_D']
+    assert interner.lookup(np.array([], dtype=np.int32)).tolist() == []
+
+def test_strings_held_once():
+    interner = IdInterner()
+    genes = ['UniRef90_%d'%(gene % 3) for gene in range(9)] ## new string objects of the same 3 gene id
+    interner.intern_many(genes)
+    assert len(interner) == 3
+    assert all(interner.lookup([code])[0] is interner.names[code] for code in interner.intern_many(genes))
+
+def test_remap():
+    ## e.g. the interner of a sample read in a worker, onto the interner of the nest
+    nest, sample = IdInterner(['UniRef90_A', 'UniRef90_B']), IdInterner(['UniRef90_C', 'UniRef90_A'])
+    sample_codes = sample.intern_many(['UniRef90_A', 'UniRef90_C', 'UniRef90_A'])
+    mapping = nest.remap(sample)
+    assert mapping.tolist() == [2, 0] and nest.names == ['UniRef90_A', 'UniRef90_B', 'UniRef90_C']
+    assert nest.lookup(mapping[sample_codes]).tolist() == sample.lookup(sample_codes).tolist()
+    assert nest.remap(IdInterner()).tolist() == []
@@ -0,0 +1,78 @@
+import os
+import numpy as np
+import pytest
+from motupy.dataprocessing.MatrixStore import MatrixStore
+from motupy.dataprocessing.OTUnest import OTUnest
+
+SAMPLES = [('s0', [562, 622], [10, 5]), ('s1', [622, 1386], [1, 0]), ('s2', [4890], [4]),
+           ('s3', [562, 4890, 10239], [2, 2, 6]), ('s4', [10239, 562], [3, 1])]
+
+def dense_samples():
+    features = []
+    for _, taxids, _ in SAMPLES:
+        features.extend(taxid for taxid in taxids if taxid not in features)
+    dense = np.zeros((len(SAMPLES), len(features)), dtype=np.int64)
+    for row, (_, taxids, counts) in enumerate(SAMPLES):
+        for taxid, count in zip(taxids, counts):
+            dense[row, features.index(taxid)] = count
+    return dense, features
+
+def fill(store):
+    for sample_id, taxids, counts in SAMPLES:
+        store.add_sample(sample_id, taxids, counts)
+    store.flush()
+    return store
+
+def read_store(store):
+    chunks = list(store.iter_chunks())
+    return [sample_id for sample_ids, _ in chunks for sample_id in sample_ids], np.vstack([matrix.toarray() for _, matrix in chunks])
+
+def test_round_trip(tmp_path):
+    store = fill(MatrixStore(str(tmp_path / 'store'), shard_size=2))
+    assert len(store.shards) == 3
+    dense, features = dense_samples()
+
+    reopened = MatrixStore(str(tmp_path / 'store'))
+    assert reopened.features == features
+    samples, matrix = read_store(reopened)
+    assert samples == [sample_id for sample_id, _, _ in SAMPLES]
+    assert np.array_equal(matrix, dense)
+    assert not [f for f in os.listdir(str(tmp_path / 'store')) if f.endswith('.tmp')]
+
+def test_indexes_written_once(tmp_path, monkeypatch):
+    writes = []
+    original = MatrixStore.write_indexes
+    monkeypatch.setattr(MatrixStore, 'write_indexes', lambda self: writes.append(len(self.shards)) or original(self))
+    store = MatrixStore(str(tmp_path / 'store'), shard_size=1)
+    for sample_id, taxids, counts in SAMPLES:
+        store.add_sample(sample_id, taxids, counts)
+    assert writes == []
+    assert not os.path.exists(str(tmp_path / 'store' / 'store.json'))
+    store.flush()
+    assert writes == [len(SAMPLES)]
+
+def test_transformations(tmp_path):
+    store = fill(MatrixStore(str(tmp_path / 'store'), shard_size=2))
+    dense, features = dense_samples()
+
+    filtered = store.filter_otu_coverage(str(tmp_path / 'filtered'), otu_coverage=2)
+    kept = (dense != 0).sum(axis=0) >= 2
+    assert filtered.features == [feature for feature, keep in zip(features, kept) if keep]
+    assert np.array_equal(read_store(MatrixStore(str(tmp_path / 'filtered')))[1], dense[:, kept])
+    assert store.filter_otu_coverage(str(tmp_path / 'filtered')) is None ## an existing store is not overwritten
+
+    relative = read_store(store.relative_abundance(str(tmp_path / 'relative')))[1]
+    assert np.allclose(relative, dense/dense.sum(axis=1, keepdims=True))
+
+    clr = store.clr(str(tmp_path / 'clr.npy'))
+    log_dense = np.log(np.where(dense == 0, 0.55, dense))
+    assert np.allclose(clr, log_dense - log_dense.mean(axis=1, keepdims=True), atol=1e-6)
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_nest_store(kaiju_folder, ncbi, tmp_path, n_jobs):
+    expected = OTUnest(ncbi=ncbi).build_from_folder(kaiju_folder, 'kaiju', extension='.out', make_clade_relative=False)
+    store = OTUnest(ncbi=ncbi).build_from_folder(kaiju_folder, 'kaiju', extension='.out', make_clade_relative=False, n_jobs=n_jobs,
+                                                 store=MatrixStore(str(tmp_path / 'store'), shard_size=1))
+    samples, matrix = read_store(MatrixStore(store.store_dir))
+    table = expected.loc[samples, store.features].fillna(0).to_numpy()
+    assert np.array_equal(matrix, table)
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from motupy.dataprocessing.OTUnest import OTUnest
+from motupy.dataprocessing.TaxonomyIndex import resolve_named_lineages, BASIC_RANKS
+
+BACILLUS_BACTERIA = 'Bacteria;Firmicutes;Bacilli;Bacillales;Bacillaceae;Bacillus;%s;'
+BACILLUS_INSECT = 'Eukaryota;NA;Insecta;Phasmida;Bacillidae;Bacillus;%s;'
+
+def write_kaiju_table(path, rows):
+    lines = ['file\tpercent\treads\ttaxon_id\ttaxon_name']
+    lines += ['%s\t1.0\t%d\t%s\t%s'%row for row in rows]
+    lines += ['sample0.out\t1.0\t5\tNA\tunclassified']
+    path.write_text('\n'.join(lines)+'\n')
+    return str(path)
+
+def test_homonym_names(ncbi):
+    lineages, ambiguous = resolve_named_lineages(ncbi, [[(0, 'Bacteria'), (4, 'Bacillaceae'), (5, 'Bacillus')],
+                                                        [(0, 'Eukaryota'), (3, 'Phasmida'), (5, 'Bacillus')],
+                                                        [(5, 'Bacillus'), (6, 'Bacillus subtilis')],
+                                                        [(0, 'Bacteria'), (5, '561')]], BASIC_RANKS)
+    assert lineages[:, 5].tolist() == [1386, 55087, 0, 561]
+    assert lineages[2, 6] == 1423
+    assert ambiguous == {2: 'Bacillus'}
+
+def test_kaiju_table_homonym(tmp_path, ncbi):
+    ## 9000001/9000002 are not in the taxonomy, their lineage comes from the names
+    table = write_kaiju_table(tmp_path / 'table.tsv', [('sample0.out', 10, 1423, BACILLUS_BACTERIA%'Bacillus subtilis'),
+                                                       ('sample0.out', 4, 9000001, BACILLUS_BACTERIA%'Bacillus novus'),
+                                                       ('sample1.out', 6, 13132, BACILLUS_INSECT%'Bacillus rossius'),
+                                                       ('sample1.out', 2, 9000002, BACILLUS_INSECT%'Bacillus atavus')])
+    nest = OTUnest(ncbi=ncbi)
+    data = nest.build_from_kaiju_table(table, extension='.out', make_clade_relative=False, cumulate=True)
+
+    assert data.loc['sample0', 1386] == 14 and data.loc['sample0', 1239] == 14
+    assert data.loc['sample1', 55087] == 8 and data.loc['sample1', 7022] == 8
+    assert np.isnan(data.loc['sample0', 55087]) and np.isnan(data.loc['sample1', 1386])
+    assert {1386, 55087} <= nest.ranks['genus']
+    assert {1423, 9000001, 13132, 9000002} <= nest.ranks['species']
+    assert 9000001 in nest.superkingdom['bacteria'] and 9000002 in nest.superkingdom['eukaryote']
+
+def test_kaiju_table_matches_folder(tmp_path, kaiju_folder, ncbi):
+    from conftest import KAIJU_SAMPLES
+    rows = [(sample_id+'.out', count, taxid, 'whatever') for sample_id, counts in KAIJU_SAMPLES.items() for taxid, count in counts.items()]
+    table = write_kaiju_table(tmp_path / 'table.tsv', rows)
+    for kwargs in [dict(), dict(make_clade_relative=False, cumulate=True), dict(make_clade_relative=False)]:
+        folder_nest, table_nest = OTUnest(ncbi=ncbi), OTUnest(ncbi=ncbi)
+        expected = folder_nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', **kwargs).sort_index().sort_index(axis=1)
+        data = table_nest.build_from_kaiju_table(table, extension='.out', **kwargs).sort_index().sort_index(axis=1)
+        assert list(data.columns) == list(expected.columns)
+        assert np.allclose(data.fillna(0).to_numpy(dtype=float), expected.fillna(0).to_numpy(dtype=float))
+        assert table_nest.ranks == folder_nest.ranks and table_nest.superkingdom == folder_nest.superkingdom
+
+def named_rows(ncbi, counts, file_column):
+    """ kaiju2table -l rows of the read counts, the names of the basic ranks taken from the taxonomy """
+    lineages = ncbi.resolve_lineages(list(counts), BASIC_RANKS)
+    names = ncbi.get_taxid_translator([taxid for taxid in lineages.ravel().tolist() if taxid])
+    return [(file_column, count, taxid, ';'.join(names.get(ancestor, 'NA') for ancestor in lineage.tolist())+';') for (taxid, count), lineage in zip(counts.items(), lineages)]
+
+def test_kaiju_table_names_skip_lookups(tmp_path, kaiju_folder, counting_ncbi):
+    from conftest import KAIJU_SAMPLES
+    rows = [row for sample_id, counts in KAIJU_SAMPLES.items() for row in named_rows(counting_ncbi.ncbi, counts, sample_id+'.out')]
+    table = write_kaiju_table(tmp_path / 'table.tsv', rows)
+    for kwargs in [dict(), dict(make_clade_relative=False, cumulate=True)]:
+        counting_ncbi.lineage_taxids.clear()
+        table_nest, folder_nest = OTUnest(ncbi=counting_ncbi), OTUnest(ncbi=counting_ncbi.ncbi)
+        data = table_nest.build_from_kaiju_table(table, extension='.out', **kwargs)
+        ## only the strain (not a basic rank, its lowest name is its species) and the two 'Bacillus' genera told apart are looked up
+        assert sorted(set(counting_ncbi.lineage_taxids)) == [1386, 55087, 83333]
+        expected = folder_nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', **kwargs)
+        assert_same_nest(table_nest, data, folder_nest, expected)
+
+def assert_same_nest(nest, data, expected_nest, expected):
+    data, expected = data.sort_index().sort_index(axis=1), expected.sort_index().sort_index(axis=1)
+    assert list(data.index) == list(expected.index) and list(data.columns) == list(expected.columns)
+    assert np.allclose(data.fillna(-1).to_numpy(dtype=float), expected.fillna(-1).to_numpy(dtype=float))
+    assert nest.ranks == expected_nest.ranks and nest.superkingdom == expected_nest.superkingdom
+
+@pytest.mark.parametrize('kwargs', [dict(), dict(make_clade_relative=False, cumulate=True), dict(ranks=['genus', 'species'])])
+def test_cohort_cumulation(kaiju_folder, ncbi, kwargs):
+    sample_nest, cohort_nest = OTUnest(ncbi=ncbi), OTUnest(ncbi=ncbi)
+    expected = sample_nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', **kwargs)
+    data = cohort_nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', cohort_cumulation=True, **kwargs)
+    assert_same_nest(cohort_nest, data, sample_nest, expected)
+
+@pytest.mark.parametrize('kwargs', [dict(), dict(make_clade_relative=False), dict(cohort_cumulation=True), dict(kingdoms=['bacteria'])])
+def test_jobs(kaiju_folder, ncbi, kwargs):
+    serial_nest, parallel_nest = OTUnest(ncbi=ncbi), OTUnest(ncbi=ncbi)
+    expected = serial_nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', **kwargs)
+    data = parallel_nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', n_jobs=2, **kwargs)
+    assert list(data.index) == list(expected.index) ## same sample order
+    assert_same_nest(parallel_nest, data, serial_nest, expected)
+
+def test_jobs_snapshot(kaiju_folder, ncbi, tmp_path):
+    from motupy.dataprocessing.TaxonomyIndex import TaxonomyIndex
+    snapshot = str(tmp_path / 'taxa.snapshot')
+    ncbi.export_snapshot(snapshot)
+    serial_nest, parallel_nest = OTUnest(ncbi=ncbi), OTUnest(ncbi=TaxonomyIndex(snapshot=snapshot))
+    expected = serial_nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out')
+    data = parallel_nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', n_jobs=2)
+    assert_same_nest(parallel_nest, data, serial_nest, expected)
@@ -0,0 +1,100 @@
+import copy
+import os
+import subprocess
+import sys
+from motupy.dataprocessing.OTUnest import OTUnest, taxonomy_fingerprint
+from motupy.dataprocessing.SampleCache import SampleCache
+from motupy.dataprocessing.TaxonomyIndex import TaxonomyIndex
+from motupy.dataprocessing.TaxonomyMigration import TaxonomyMigration
+from conftest import write_taxonomy_db
+
+def build(folder, ncbi, cache=None, migration=None, **kwargs):
+    nest = OTUnest(ncbi=ncbi, migration=migration)
+    return nest, nest.build_from_folder(folder, 'kaiju', extension='.out', cache=cache, **kwargs)
+
+def test_cold_and_warm_cache(kaiju_folder, ncbi, tmp_path):
+    cache = SampleCache(str(tmp_path / 'cache'))
+    for kwargs in [dict(), dict(make_clade_relative=False, cumulate=True), dict(make_clade_relative=False)]:
+        reference, expected = build(kaiju_folder, ncbi, **kwargs)
+        for _ in range(2): ## cold then warm
+            nest, table = build(kaiju_folder, ncbi, cache, **kwargs)
+            assert table.equals(expected)
+            assert nest.ranks == reference.ranks and nest.superkingdom == reference.superkingdom
+    assert len(os.listdir(str(tmp_path / 'cache'))) == 3*2
+
+def test_key_follows_taxonomy(kaiju_folder, tmp_path):
+    db = write_taxonomy_db(tmp_path / 'taxa.sqlite')
+    cache = SampleCache(str(tmp_path / 'cache'))
+    build(kaiju_folder, TaxonomyIndex(db), cache)
+    fingerprint = taxonomy_fingerprint(TaxonomyIndex(db))
+    assert fingerprint[0] == os.path.abspath(db)
+
+    status = os.stat(db)
+    os.utime(db, ns=(status.st_atime_ns, status.st_mtime_ns+10**9)) ## an updated database
+    assert taxonomy_fingerprint(TaxonomyIndex(db)) != fingerprint
+    build(kaiju_folder, TaxonomyIndex(db), cache)
+    assert len(os.listdir(str(tmp_path / 'cache'))) == 2*2
+
+    other = write_taxonomy_db(tmp_path / 'other.sqlite')
+    build(kaiju_folder, TaxonomyIndex(other), cache)
+    assert len(os.listdir(str(tmp_path / 'cache'))) == 3*2
+
+def test_key_follows_migration(kaiju_folder, ncbi, tmp_path):
+    cache = SampleCache(str(tmp_path / 'cache'))
+    _, plain = build(kaiju_folder, ncbi, cache)
+    merged = tmp_path / 'merged.dmp'
+    merged.write_text('622\t|\t620\t|\n')
+    _, migrated = build(kaiju_folder, ncbi, cache, migration=TaxonomyMigration(merged=str(merged), include_replacement_taxa=False))
+    assert len(os.listdir(str(tmp_path / 'cache'))) == 2*2
+    assert not migrated.equals(plain)
+
+## stands in for ete3 in a fresh process: NCBITaxa() opens the default ~/.etetoolkit/taxa.sqlite, with ete3's methods only
+FAKE_ETE3 = '''
+import os
+from motupy.dataprocessing.TaxonomyIndex import TaxonomyIndex
+
+class NCBITaxa:
+    def __init__(self, dbfile=None):
+        self.dbfile = dbfile or os.path.join(os.environ['HOME'], '.etetoolkit', 'taxa.sqlite')
+        self.index = TaxonomyIndex(self.dbfile)
+
+    def __getattr__(self, name):
+        if name in ('get_lineage', 'get_rank', 'get_taxid_translator', 'get_name_translator'):
+            return getattr(self.index, name)
+        raise AttributeError(name)
+'''
+
+RUN = '''
+import sys
+from motupy.dataprocessing.OTUnest import OTUnest
+from motupy.dataprocessing.SampleCache import SampleCache
+hits = []
+class CountingCache(SampleCache):
+    def load(self, file_loc, params):
+        arrays = SampleCache.load(self, file_loc, params)
+        hits.append(arrays is not None)
+        return arrays
+OTUnest().build_from_folder(sys.argv[1], 'kaiju', extension='.out', cache=CountingCache(sys.argv[2]))
+print(sum(hits), len(hits))
+'''
+
+def test_shared_backend_key_is_stable(kaiju_folder, tmp_path):
+    ## the shared cache opens its ete3 backend on the first parsed file, the key must not change then
+    home = tmp_path / 'home'
+    (home / '.etetoolkit').mkdir(parents=True)
+    write_taxonomy_db(home / '.etetoolkit' / 'taxa.sqlite')
+    (tmp_path / 'ete3').mkdir()
+    (tmp_path / 'ete3' / '__init__.py').write_text(FAKE_ETE3)
+    env = dict(os.environ, HOME=str(home), PYTHONPATH=os.pathsep.join([str(tmp_path), os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]))
+
+    runs = [subprocess.run([sys.executable, '-c', RUN, kaiju_folder, str(tmp_path / 'cache')], env=env, capture_output=True, text=True, check=True).stdout.split() for _ in range(3)]
+    assert runs == [['0', '2'], ['2', '2'], ['2', '2']]
+
+def test_no_cache_without_database(kaiju_folder, ncbi, tmp_path):
+    in_memory = copy.copy(ncbi)
+    in_memory.dbfile = None
+    assert taxonomy_fingerprint(in_memory) is None
+    cache = SampleCache(str(tmp_path / 'cache'))
+    _, expected = build(kaiju_folder, ncbi)
+    assert build(kaiju_folder, in_memory, cache)[1].equals(expected)
+    assert not os.path.exists(str(tmp_path / 'cache')) or os.listdir(str(tmp_path / 'cache')) == []
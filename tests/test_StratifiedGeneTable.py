@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from motupy.dataprocessing.GeneNest import GeneNest
+from motupy.dataprocessing.IdInterner import IdInterner
+from motupy.dataprocessing.SampleCache import SampleCache
+from motupy.dataprocessing.StratifiedGeneTable import StratifiedGeneTable
+
+## stratified rows (gene, taxon, value) of the humann2 samples
+STRATIFIED_SAMPLES = {'s0': [('UniRef90_A', 'g__Escherichia.s__Escherichia_coli', 2.0), ('UniRef90_A', 'unclassified', 1.5),
+                             ('UniRef90_B', 'g__Bacillus.s__Bacillus_subtilis', 4.0)],
+                      's1': [('UniRef90_B', 'unclassified', 0.5), ('UniRef90_C', 'g__Escherichia.s__Escherichia_coli', 3.0),
+                             ('UniRef90_B', 'g__Escherichia.s__Escherichia_coli', 1.0)]}
+
+def dense_sums(samples, column):
+    """ {(sample id, gene or taxon): summed value} of the stratified rows """
+    sums = {}
+    for sample_id, rows in samples.items():
+        for row in rows:
+            sums[sample_id, row[column]] = sums.get((sample_id, row[column]), 0) + row[2]
+    return sums
+
+def sparse_sums(matrix, sample_ids, features):
+    rows, columns = matrix.nonzero()
+    return {(sample_ids[row], features[column]): matrix[row, column] for row, column in zip(rows, columns)}
+
+def table_of(samples, genes=None, taxa=None):
+    table = StratifiedGeneTable(genes, taxa)
+    for sample_id, rows in samples.items():
+        table.add_sample(sample_id, *zip(*rows))
+    return table
+
+def test_marginalise():
+    table = table_of(STRATIFIED_SAMPLES)
+    assert len(table) == 6 and table.samples == ['s0', 's1']
+    assert sparse_sums(*table.marginalise('taxon')) == pytest.approx(dense_sums(STRATIFIED_SAMPLES, 0))
+    assert sparse_sums(*table.marginalise('gene')) == pytest.approx(dense_sums(STRATIFIED_SAMPLES, 1))
+    assert table.marginalise('sample') is None
+
+    matrix, sample_ids, taxa = table.get_gene('UniRef90_B')
+    assert sparse_sums(matrix, sample_ids, taxa) == {('s0', 'g__Bacillus.s__Bacillus_subtilis'): 4.0,
+                                                     ('s1', 'unclassified'): 0.5, ('s1', 'g__Escherichia.s__Escherichia_coli'): 1.0}
+    assert table.get_gene('UniRef90_Z')[0].nnz == 0
+
+def test_coo():
+    table = table_of(STRATIFIED_SAMPLES)
+    sample_codes, gene_codes, taxon_codes, values = table.to_coo()
+    assert [array.dtype for array in (sample_codes, gene_codes, taxon_codes, values)] == [np.int32]*3 + [np.float32]
+    assert list(zip(np.array(table.samples)[sample_codes], table.genes.lookup(gene_codes), table.taxa.lookup(taxon_codes), values)) == \
+           [(sample_id,)+row for sample_id, rows in STRATIFIED_SAMPLES.items() for row in rows]
+
+    empty = StratifiedGeneTable()
+    assert len(empty) == 0 and [len(array) for array in empty.to_coo()] == [0]*4
+    assert empty.marginalise('taxon')[0].shape == (0, 0)
+
+def test_merge():
+    ## the tables of the samples have their own code tables, merging remaps them
+    merged = StratifiedGeneTable(genes=IdInterner(['UniRef90_C']))
+    for sample_id, rows in STRATIFIED_SAMPLES.items():
+        merged.merge(table_of({sample_id: rows}))
+    expected = table_of(STRATIFIED_SAMPLES)
+    assert merged.samples == expected.samples and merged.genes.names[0] == 'UniRef90_C'
+    assert sparse_sums(*merged.marginalise('taxon')) == sparse_sums(*expected.marginalise('taxon'))
+    assert sparse_sums(*merged.marginalise('gene')) == sparse_sums(*expected.marginalise('gene'))
+
+    ## shared code tables are not remapped
+    genes, taxa = IdInterner(), IdInterner()
+    shared = StratifiedGeneTable(genes, taxa)
+    shared.merge(table_of(STRATIFIED_SAMPLES, genes, taxa))
+    assert len(genes) == 3 and len(taxa) == 3
+    assert sparse_sums(*shared.marginalise('gene')) == sparse_sums(*expected.marginalise('gene'))
+
+@pytest.fixture
+def stratified_folder(tmp_path):
+    folder = tmp_path / 'humann2'
+    folder.mkdir()
+    for sample_id, rows in STRATIFIED_SAMPLES.items():
+        lines = ['# Gene Family\t%s_Abundance-RPKs'%sample_id, 'UNMAPPED\t10.0']
+        for gene in sorted({row[0] for row in rows}):
+            lines.append('%s\t%s'%(gene, sum(row[2] for row in rows if row[0] == gene)))
+            lines += ['%s|%s\t%s'%row for row in rows if row[0] == gene]
+        (folder / (sample_id+'_genefamilies.tsv')).write_text('\n'.join(lines)+'\n')
+    return str(folder)
+
+@pytest.mark.parametrize('kwargs', [dict(), dict(numeric=True), dict(n_jobs=2)])
+def test_gene_nest(stratified_folder, tmp_path, kwargs):
+    expected = dense_sums(STRATIFIED_SAMPLES, 1)
+    cache = SampleCache(str(tmp_path / 'cache'))
+    for extra in [dict(), dict(cache=cache), dict(cache=cache)]: ## no cache, cold then warm cache
+        nest = GeneNest()
+        data = nest.build_from_folder(stratified_folder, 'humann2', extension='_genefamilies.tsv', stratified=True, **kwargs, **extra)
+        assert nest.stratified.genes is nest.genes
+        assert sparse_sums(*nest.stratified.marginalise('gene')) == pytest.approx(expected)
+        ## the gene sums of the stratified rows are the unstratified rows
+        matrix, sample_ids, genes = nest.stratified.marginalise('taxon')
+        for (sample_id, gene), value in sparse_sums(matrix, sample_ids, genes).items():
+            assert float(data.loc[sample_id, gene]) == pytest.approx(value)
+
+    nest = GeneNest()
+    nest.build_from_folder(stratified_folder, 'humann2', extension='_genefamilies.tsv', **kwargs)
+    assert nest.stratified is None
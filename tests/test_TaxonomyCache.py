@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from motupy.dataprocessing.TaxonomyCache import TaxonomyCache
+from motupy.dataprocessing.TaxonomyIndex import resolve_lineages, assign_clades
+
+class PlainBackend:
+    """ only the ete3 NCBITaxa lookups of a TaxonomyIndex, counting the taxa id/names sent to it """
+    def __init__(self, ncbi):
+        self.ncbi = ncbi
+        self.queries = 0
+
+    def get_lineage(self, taxid):
+        self.queries += 1
+        return self.ncbi.get_lineage(taxid)
+
+    def get_rank(self, taxids):
+        self.queries += len(taxids)
+        return self.ncbi.get_rank(taxids)
+
+    def get_taxid_translator(self, taxids):
+        self.queries += len(taxids)
+        return self.ncbi.get_taxid_translator(taxids)
+
+    def get_name_translator(self, names):
+        self.queries += len(names)
+        return self.ncbi.get_name_translator(names)
+
+def test_same_answers(ncbi):
+    cache = TaxonomyCache(PlainBackend(ncbi))
+    taxids = [562, 83333, 1000, 13132, 10239, 999]
+    for _ in range(2):
+        assert [cache.get_lineage(taxid) for taxid in taxids] == [ncbi.get_lineage(taxid) for taxid in taxids]
+        assert cache.get_rank(taxids+[123456]) == ncbi.get_rank(taxids+[123456])
+        assert cache.get_taxid_translator(taxids) == ncbi.get_taxid_translator(taxids)
+        assert cache.get_name_translator(['Bacillus', 'Escherichia coli', 'no such taxon']) == ncbi.get_name_translator(['Bacillus', 'Escherichia coli'])
+        assert np.array_equal(cache.resolve_lineages(taxids, ['phylum', 'genus', 'species']), resolve_lineages(ncbi, taxids, ['phylum', 'genus', 'species']))
+        assert np.array_equal(cache.assign_clades(taxids, [10239, 2, 2759]), assign_clades(ncbi, taxids, [10239, 2, 2759]))
+        assert cache.get_parent_at_rank(83333, 'genus') == 561 and cache.get_parent_at_rank(1000, 'genus') is None
+    with pytest.raises(ValueError):
+        cache.get_lineage(123456)
+
+def test_hits_and_eviction(ncbi):
+    backend = PlainBackend(ncbi)
+    cache = TaxonomyCache(backend, max_size=4)
+    cache.get_rank([562, 622, 1000])
+    cache.get_rank([562, 622, 1000])
+    assert backend.queries == 3
+    assert cache.cache_info() == {'hits': 3, 'misses': 3, 'size': 3, 'max_size': 4}
+
+    cache.get_rank([13132, 10239]) ## 562 is the least recently used, it is evicted
+    assert cache.cache_info()['size'] == 4
+    cache.get_rank([622])
+    assert backend.queries == 5
+    cache.get_rank([562])
+    assert backend.queries == 6
+
+    cache.invalidate()
+    assert cache.cache_info()['size'] == 0
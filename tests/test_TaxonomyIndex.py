@@ -0,0 +1,84 @@
+import sqlite3
+import numpy as np
+import pytest
+from motupy.dataprocessing.TaxonomyIndex import TaxonomyIndex, resolve_lineages, lookup_lineages, lookup_clades, BASIC_RANKS
+from conftest import TAXONOMY_ROWS
+
+TAXIDS = [taxid for taxid, _, _, _ in TAXONOMY_ROWS]
+
+class SqliteTaxonomy:
+    """ the lookups of ete3 NCBITaxa, straight from the taxa.sqlite tables, as reference """
+    def __init__(self, dbfile):
+        self.db = sqlite3.connect(dbfile)
+
+    def get_lineage(self, taxid):
+        merged = self.db.execute('SELECT taxid_new FROM merged WHERE taxid_old = ?', (taxid,)).fetchone()
+        taxid = merged[0] if merged else taxid
+        lineage = [taxid]
+        while taxid != 1:
+            taxid = self.db.execute('SELECT parent FROM species WHERE taxid = ?', (taxid,)).fetchone()[0]
+            lineage.append(taxid)
+        return lineage[::-1]
+
+    def get_rank(self, taxids):
+        return {taxid: self.db.execute('SELECT rank FROM species WHERE taxid = ?', (taxid,)).fetchone()[0] for taxid in taxids}
+
+    def get_taxid_translator(self, taxids):
+        return {taxid: self.db.execute('SELECT spname FROM species WHERE taxid = ?', (taxid,)).fetchone()[0] for taxid in taxids}
+
+@pytest.fixture(scope='module')
+def reference(taxonomy_db):
+    return SqliteTaxonomy(taxonomy_db)
+
+def test_lookups_match_database(ncbi, reference):
+    for taxid in TAXIDS:
+        assert ncbi.get_lineage(taxid) == reference.get_lineage(taxid)
+    assert ncbi.get_rank(TAXIDS) == reference.get_rank(TAXIDS)
+    assert ncbi.get_taxid_translator(TAXIDS) == reference.get_taxid_translator(TAXIDS)
+    assert ncbi.get_lineage(999) == reference.get_lineage(999) ## merged into 562
+    with pytest.raises(ValueError):
+        ncbi.get_lineage(123456)
+    assert ncbi.get_rank([123456]) == {}
+
+def test_name_translator(ncbi):
+    assert ncbi.get_name_translator(['Escherichia coli', 'escherichia COLI', 'Bacterium coli', 'Bacillus', 'no such taxon']) == {
+        'Escherichia coli': [562], 'escherichia COLI': [562], 'Bacterium coli': [562], 'Bacillus': [1386, 55087]}
+
+def test_snapshot_round_trip(ncbi, tmp_path):
+    snapshot = str(tmp_path / 'taxa.snapshot')
+    ncbi.export_snapshot(snapshot)
+    mapped = TaxonomyIndex(snapshot=snapshot)
+
+    assert isinstance(mapped.parent, np.memmap)
+    for taxid in TAXIDS+[999]:
+        assert mapped.get_lineage(taxid) == ncbi.get_lineage(taxid)
+    assert mapped.get_rank(TAXIDS) == ncbi.get_rank(TAXIDS)
+    assert mapped.get_taxid_translator(TAXIDS) == ncbi.get_taxid_translator(TAXIDS)
+    names = [name for _, _, name, _ in TAXONOMY_ROWS]+['Bacterium coli']
+    assert mapped.get_name_translator(names) == ncbi.get_name_translator(names)
+
+def test_snapshot_rejects_other_files(tmp_path):
+    other = tmp_path / 'not.snapshot'
+    other.write_bytes(b'SQLite format 3\x00'+bytes(64))
+    with pytest.raises(ValueError):
+        TaxonomyIndex(snapshot=str(other))
+
+def test_resolve_lineages(ncbi, reference):
+    lineages = resolve_lineages(ncbi, TAXIDS+[999])
+    assert np.array_equal(lineages, lookup_lineages(reference, TAXIDS+[999]))
+    assert lineages[TAXIDS.index(83333)].tolist() == [2, 1224, 1236, 91347, 543, 561, 562]
+    assert resolve_lineages(ncbi, [123456]).tolist() == [[0]*len(BASIC_RANKS)]
+    assert resolve_lineages(ncbi, [562, 1000], ['phylum', 'species']).tolist() == [[1224, 562], [1239, 1000]]
+
+def test_clade_membership(ncbi, reference, tmp_path):
+    snapshot = str(tmp_path / 'taxa.snapshot')
+    ncbi.export_snapshot(snapshot)
+    for index in [ncbi, TaxonomyIndex(snapshot=snapshot)]:
+        for clade in TAXIDS:
+            inside = index.is_descendant(TAXIDS+[999, 123456], clade)
+            assert inside.tolist() == [clade in reference.get_lineage(taxid) for taxid in TAXIDS+[999]]+[False]
+
+    ## a taxa id under several clades gets the first one of the list
+    clades = [561, 2, 131567, 10239]
+    assert np.array_equal(ncbi.assign_clades(TAXIDS+[999], clades), lookup_clades(reference, TAXIDS+[999], clades))
+    assert ncbi.assign_clades([83333, 1000, 13132, 10239, 1, 123456], clades).tolist() == [561, 2, 131567, 10239, 0, 0]
@@ -0,0 +1,48 @@
+import io
+import tarfile
+import numpy as np
+import pandas as pd
+from motupy.dataprocessing.TaxonomyMigration import TaxonomyMigration
+
+MERGED = '999\t|\t562\t|\n998\t|\t999\t|\n1001\t|\t1000\t|\n'
+DELNODES = '4000\t|\n'
+
+def write_dumps(tmp_path):
+    (tmp_path / 'merged.dmp').write_text(MERGED)
+    (tmp_path / 'delnodes.dmp').write_text(DELNODES)
+    return str(tmp_path / 'merged.dmp'), str(tmp_path / 'delnodes.dmp')
+
+def test_dump_files(tmp_path):
+    merged, delnodes = write_dumps(tmp_path)
+    migration = TaxonomyMigration(merged=merged, delnodes=delnodes, include_replacement_taxa=False)
+    ## 998 was merged into 999, itself merged into 562 later
+    assert migration.migrate_array([562, 999, 998, 1001, 4000, 1000]).tolist() == [562, 562, 562, 1000, 0, 1000]
+    assert migration.migrate_dict({562: 3, 998: 2, 4000: 7, 1001: 1}) == {562: 5, 1000: 1}
+    unchanged = {562: 3}
+    assert migration.migrate_dict(unchanged) is unchanged
+    assert migration.migrate_set({998, 4000, 622}) == {562, 622}
+
+    archive_path = str(tmp_path / 'taxdump.tar.gz')
+    with tarfile.open(archive_path, 'w:gz') as archive:
+        for name, content in [('merged.dmp', MERGED), ('delnodes.dmp', DELNODES)]:
+            data = content.encode('utf-8')
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    from_archive = TaxonomyMigration(taxdump=archive_path, include_replacement_taxa=False)
+    assert from_archive.fingerprint() == migration.fingerprint()
+    assert TaxonomyMigration(merged=merged, include_replacement_taxa=False).fingerprint() != migration.fingerprint()
+
+def test_index_merged_table(ncbi):
+    migration = TaxonomyMigration(ncbi=ncbi, include_replacement_taxa=False)
+    assert migration.migrate_array([999, 562]).tolist() == [562, 562]
+
+def test_migrate_dataframe(tmp_path):
+    merged, delnodes = write_dumps(tmp_path)
+    migration = TaxonomyMigration(merged=merged, delnodes=delnodes, include_replacement_taxa=False)
+    dataframe = pd.DataFrame({562: [1.0, np.nan], 999: [2.0, np.nan], 4000: [5.0, 5.0], 622: [np.nan, 1.0]}, index=['s0', 's1'])
+    migrated = migration.migrate_dataframe(dataframe)
+    assert sorted(migrated.columns) == [562, 622]
+    assert migrated.loc['s0', 562] == 3.0 and np.isnan(migrated.loc['s1', 562])
+    as_str = migration.migrate_dataframe(dataframe.rename(columns=str))
+    assert sorted(as_str.columns) == ['562', '622']
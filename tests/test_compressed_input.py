@@ -0,0 +1,39 @@
+import bz2
+import gzip
+import lzma
+import shutil
+import pytest
+from motupy.dataprocessing.compressed_input import open_text, strip_compression_extension
+from motupy.dataprocessing.OTUnest import OTUnest
+from conftest import KAIJU_SAMPLES, write_kaiju_sample
+
+COMPRESSIONS = [('.gz', gzip.open), ('.bz2', bz2.open), ('.xz', lzma.open)]
+
+@pytest.mark.parametrize('extension, open_method', COMPRESSIONS)
+def test_open_text(tmp_path, extension, open_method):
+    text = 'line one\nline\ttwo\n'
+    with open_method(str(tmp_path / ('file'+extension)), 'wt') as compressed:
+        compressed.write(text)
+    ## the compression is found from the content, not from the name
+    shutil.copy(str(tmp_path / ('file'+extension)), str(tmp_path / 'renamed.txt'))
+    for name in ['file'+extension, 'renamed.txt']:
+        with open_text(str(tmp_path / name)) as read_file:
+            assert read_file.read() == text
+
+def test_strip_compression_extension():
+    assert strip_compression_extension('sample1.out.gz') == 'sample1.out'
+    assert strip_compression_extension('sample1.out.xz') == 'sample1.out'
+    assert strip_compression_extension('sample1.out') == 'sample1.out'
+
+@pytest.mark.parametrize('extension', ['.out', '.out.gz'])
+def test_compressed_folder(tmp_path, kaiju_folder, ncbi, extension):
+    compressed_folder = tmp_path / 'compressed'
+    compressed_folder.mkdir()
+    for sample_id, counts in KAIJU_SAMPLES.items():
+        with open(write_kaiju_sample(tmp_path / (sample_id+'.out'), counts), 'rb') as plain, gzip.open(str(compressed_folder / (sample_id+'.out.gz')), 'wb') as compressed:
+            compressed.write(plain.read())
+
+    expected = OTUnest(ncbi=ncbi).build_from_folder(kaiju_folder, 'kaiju', extension='.out').sort_index().sort_index(axis=1)
+    data = OTUnest(ncbi=ncbi).build_from_folder(str(compressed_folder), 'kaiju', extension=extension).sort_index().sort_index(axis=1)
+    assert list(data.index) == sorted(KAIJU_SAMPLES)
+    assert data.equals(expected)
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from motupy.dataprocessing.OTUdata import OTUdata
+from motupy.dataprocessing.cumulation import cumulate_reads
+from motupy.dataprocessing.TaxonomyIndex import BASIC_RANKS, resolve_lineages
+from conftest import KAIJU_SAMPLES, write_kaiju_sample
+
+def legacy_taxa_cumulation(ncbi, reads):
+    """ the per taxa id walk of the first OTUdata.taxa_cumulation(), as reference """
+    otufile = dict(reads)
+    ranks = {rank: set() for rank in BASIC_RANKS}
+    for root in [-1, 1, 131567]:
+        otufile.pop(root, None)
+
+    def rank_of(taxid):
+        return ncbi.get_rank([taxid])[taxid]
+
+    def basic_lineage(taxid): ## lowest rank first
+        return [ancestor for ancestor in ncbi.get_lineage(taxid) if rank_of(ancestor) in BASIC_RANKS][::-1]
+
+    for taxid in list(otufile):
+        lineage = basic_lineage(taxid)
+        if taxid != lineage[0]:
+            otufile[lineage[0]] = otufile.get(lineage[0], 0) + otufile[taxid]
+            if rank_of(taxid) not in BASIC_RANKS:
+                del otufile[taxid]
+        for ancestor in lineage:
+            otufile.setdefault(ancestor, 0)
+            ranks[rank_of(ancestor)].add(ancestor)
+
+    flipped_ranks = BASIC_RANKS[::-1]
+    for rank in flipped_ranks[:-1]:
+        for taxid in ranks[rank]:
+            parents = basic_lineage(taxid)[1:]
+            if parents:
+                otufile[parents[0]] += otufile[taxid]
+    return otufile, ranks
+
+def test_cumulate_reads():
+    lineages = np.array([[2, 1224, 1236, 91347, 543, 561, 562],
+                         [2, 1224, 1236, 91347, 543, 620, 622],
+                         [2, 1239, 0, 0, 0, 0, 1000],
+                         [2, 1224, 1236, 91347, 543, 561, 562],  ## a strain of 562
+                         [0, 0, 0, 0, 0, 0, 0]])
+    nodes, node_counts, node_ranks, node_rows = cumulate_reads([562, 622, 1000, 83333, 131567], [10, 5, 2, 1, 7], lineages)
+    cumulated = dict(zip(nodes.tolist(), node_counts.tolist()))
+    assert cumulated == {2: 18, 1224: 16, 1236: 16, 91347: 16, 543: 16, 561: 11, 562: 11, 620: 5, 622: 5, 1239: 2, 1000: 2}
+    assert dict(zip(nodes.tolist(), node_ranks.tolist()))[1239] == BASIC_RANKS.index('phylum')
+    assert np.all(lineages[node_rows, node_ranks] == nodes)
+    assert node_counts.dtype == np.int64
+    assert cumulate_reads([562], [0.5], lineages[:1])[1].dtype == np.float64
+
+@pytest.mark.parametrize('sample_id', sorted(KAIJU_SAMPLES))
+def test_matches_legacy_cumulation(tmp_path, ncbi, sample_id):
+    path = write_kaiju_sample(tmp_path / (sample_id+'.out'), KAIJU_SAMPLES[sample_id])
+    expected, expected_ranks = legacy_taxa_cumulation(ncbi, KAIJU_SAMPLES[sample_id])
+
+    sample = OTUdata(path, 'kaiju', ncbi=ncbi)
+    sample.taxa_cumulation()
+    assert sample.otufile == expected
+    assert sample.ranks == expected_ranks
+
+    relative = OTUdata(path, 'kaiju', ncbi=ncbi)
+    relative.turn_reads_to_clade_relative_abundance()
+    for rank, taxids in expected_ranks.items():
+        total = sum(expected[taxid] for taxid in taxids)
+        for taxid in taxids:
+            assert relative.otufile[taxid] == pytest.approx(expected[taxid]/total)
+
+def test_lineage_table(ncbi):
+    lineages = resolve_lineages(ncbi, [83333, 1000, 13132, 131567])
+    assert lineages.tolist() == [[2, 1224, 1236, 91347, 543, 561, 562],
+                                 [2, 1239, 0, 0, 0, 0, 1000],
+                                 [2759, 6656, 50557, 7022, 55090, 55087, 13132],
+                                 [0, 0, 0, 0, 0, 0, 0]]
+
+@pytest.mark.parametrize('cumulate_first', [False, True])
+def test_add_reads(tmp_path, ncbi, cumulate_first):
+    first, second = KAIJU_SAMPLES['sample0'], KAIJU_SAMPLES['sample1']
+    both = {taxid: first.get(taxid, 0)+second.get(taxid, 0) for taxid in set(first) | set(second)}
+    expected = OTUdata(write_kaiju_sample(tmp_path / 'both.out', both), 'kaiju', ncbi=ncbi)
+    expected.taxa_cumulation()
+
+    sample = OTUdata(write_kaiju_sample(tmp_path / 'first.out', first), 'kaiju', ncbi=ncbi)
+    if cumulate_first:
+        sample.taxa_cumulation()
+    sample.add_reads(second)
+    sample.taxa_cumulation()
+    assert sample.otufile == expected.otufile
+    assert sample.ranks == expected.ranks and sample.superkingdom == expected.superkingdom
+
+def test_merge(tmp_path, ncbi):
+    first, second = KAIJU_SAMPLES['sample0'], KAIJU_SAMPLES['sample1']
+    both = {taxid: first.get(taxid, 0)+second.get(taxid, 0) for taxid in set(first) | set(second)}
+    expected = OTUdata(write_kaiju_sample(tmp_path / 'both.out', both), 'kaiju', ncbi=ncbi)
+    expected.taxa_cumulation()
+
+    sample = OTUdata(write_kaiju_sample(tmp_path / 'first.out', first), 'kaiju', ncbi=ncbi)
+    other = OTUdata(write_kaiju_sample(tmp_path / 'second.out', second), 'kaiju', ncbi=ncbi)
+    other.taxa_cumulation()
+    sample.merge(other)
+    assert sample.otufile == expected.otufile
+    assert sample.ranks == expected.ranks and sample.superkingdom == expected.superkingdom
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from motupy.dataprocessing.GeneNest import GeneNest
+from motupy.dataprocessing.OTUnest import OTUnest
+from motupy.dataprocessing.SampleCache import SampleCache
+from conftest import KAIJU_SAMPLES, write_kaiju_sample
+from test_GeneNest import humann2_folder
+from test_OTUnest import assert_same_nest, write_kaiju_table
+from test_StratifiedGeneTable import stratified_folder, sparse_sums
+
+def bacteria_folder(tmp_path, ncbi):
+    """ the kaiju samples without the reads of the other superkingdoms """
+    folder = tmp_path / 'bacteria'
+    folder.mkdir()
+    for sample_id, counts in KAIJU_SAMPLES.items():
+        superkingdoms = ncbi.resolve_lineages(list(counts), ['superkingdom'])[:, 0]
+        write_kaiju_sample(folder / (sample_id+'.out'), {taxid: counts[taxid] for taxid, superkingdom in zip(counts, superkingdoms) if superkingdom == 2})
+    return str(folder)
+
+@pytest.mark.parametrize('kwargs', [dict(), dict(make_clade_relative=False, cumulate=True), dict(cohort_cumulation=True), dict(n_jobs=2)])
+def test_kingdoms(kaiju_folder, tmp_path, ncbi, kwargs):
+    ## the reads of other kingdoms are dropped before cumulation, as if they were not in the files
+    expected_nest, nest = OTUnest(ncbi=ncbi), OTUnest(ncbi=ncbi)
+    expected = expected_nest.build_from_folder(bacteria_folder(tmp_path, ncbi), 'kaiju', extension='.out', **kwargs)
+    data = nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', kingdoms=['bacteria'], **kwargs)
+    assert_same_nest(nest, data, expected_nest, expected)
+
+    ## the read counts of the kept kingdom are those of the unfiltered nest
+    full_nest = OTUnest(ncbi=ncbi)
+    full = full_nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', make_clade_relative=False, cumulate=True)
+    data = OTUnest(ncbi=ncbi).build_from_folder(kaiju_folder, 'kaiju', extension='.out', make_clade_relative=False, cumulate=True, kingdoms=['bacteria'])
+    assert set(data.columns) == full_nest.superkingdom['bacteria'] & set(full.columns)
+    assert np.array_equal(data.fillna(0).to_numpy(), full[data.columns].fillna(0).to_numpy())
+
+@pytest.mark.parametrize('kwargs', [dict(), dict(make_clade_relative=False, cumulate=True), dict(cohort_cumulation=True), dict(n_jobs=2)])
+def test_ranks(kaiju_folder, ncbi, kwargs):
+    ## keeping some ranks is the same as selecting their columns afterwards
+    full_nest, nest = OTUnest(ncbi=ncbi), OTUnest(ncbi=ncbi)
+    full = full_nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', **kwargs)
+    data = nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', ranks=['genus', 'species'], **kwargs)
+    assert set(data.columns) == (full_nest.ranks['genus'] | full_nest.ranks['species']) & set(full.columns)
+    assert np.allclose(data.fillna(0).to_numpy(dtype=float), full.loc[data.index, data.columns].fillna(0).to_numpy(dtype=float))
+
+def test_kaiju_table(kaiju_folder, tmp_path, ncbi):
+    rows = [(sample_id+'.out', count, taxid, 'whatever') for sample_id, counts in KAIJU_SAMPLES.items() for taxid, count in counts.items()]
+    table = write_kaiju_table(tmp_path / 'table.tsv', rows)
+    for kwargs in [dict(kingdoms=['bacteria', 'archaea']), dict(ranks=['phylum']), dict(kingdoms=['eukaryote'], ranks=['species'])]:
+        folder_nest, table_nest = OTUnest(ncbi=ncbi), OTUnest(ncbi=ncbi)
+        expected = folder_nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', **kwargs)
+        data = table_nest.build_from_kaiju_table(table, extension='.out', **kwargs)
+        assert_same_nest(table_nest, data, folder_nest, expected)
+
+def test_otu_cache(kaiju_folder, tmp_path, ncbi):
+    ## the filters are part of the cached sample parameters
+    cache = SampleCache(str(tmp_path / 'cache'))
+    for kwargs in [dict(), dict(kingdoms=['bacteria']), dict(ranks=['genus']), dict()]:
+        expected = OTUnest(ncbi=ncbi).build_from_folder(kaiju_folder, 'kaiju', extension='.out', **kwargs)
+        assert OTUnest(ncbi=ncbi).build_from_folder(kaiju_folder, 'kaiju', extension='.out', cache=cache, **kwargs).equals(expected)
+
+GENE_FILTERS = [(dict(gene_ids=['UniRef90_A', 'UniRef90_C', 'UniRef90_missing']), lambda gene: gene in ('UniRef90_A', 'UniRef90_C')),
+                (dict(gene_pattern='_[AB]$'), lambda gene: gene in ('UniRef90_A', 'UniRef90_B')),
+                (dict(gene_ids=['UniRef90_A', 'UniRef90_Z'], gene_pattern='Z'), lambda gene: gene == 'UniRef90_Z')]
+
+@pytest.mark.parametrize('kwargs, kept', GENE_FILTERS)
+@pytest.mark.parametrize('numeric', [False, True])
+def test_genes(humann2_folder, tmp_path, kwargs, kept, numeric):
+    cache = SampleCache(str(tmp_path / 'cache'))
+    full = GeneNest().build_from_folder(humann2_folder, 'humann2', extension='_genefamilies.tsv', numeric=numeric, cache=cache)
+    for extra in [dict(), dict(n_jobs=2), dict(cache=cache)]:
+        nest = GeneNest()
+        data = nest.build_from_folder(humann2_folder, 'humann2', extension='_genefamilies.tsv', numeric=numeric, **kwargs, **extra)
+        assert list(data.columns) == [gene for gene in full.columns if kept(gene)]
+        assert data.equals(full[data.columns]) ## a sample without kept genes is an empty row
+        assert all(kept(gene) for gene in nest.genes.names) ## the other genes are never interned
+
+def test_stratified_genes(stratified_folder):
+    nest = GeneNest()
+    nest.build_from_folder(stratified_folder, 'humann2', extension='_genefamilies.tsv', stratified=True, gene_ids=['UniRef90_B'])
+    full = GeneNest()
+    full.build_from_folder(stratified_folder, 'humann2', extension='_genefamilies.tsv', stratified=True)
+    assert nest.genes.names == ['UniRef90_B']
+    assert sparse_sums(*nest.stratified.marginalise('gene')) == sparse_sums(*full.stratified.get_gene('UniRef90_B'))
@@ -0,0 +1,38 @@
+import bz2
+import gzip
+import pytest
+from motupy.dataprocessing.OTUnest import OTUnest
+from motupy.dataprocessing.input_detection import detect_input_type
+from conftest import KAIJU_SAMPLES, write_kaiju_sample
+from test_kraken2_output import write_kraken2_report
+
+SAMPLES = {'metaphlan3': ('#mpa_v30_CHOCOPhlAn_201901\n#clade_name\tNCBI_tax_id\trelative_abundance\tadditional_species\n'
+                          'k__Bacteria\t2\t100.0\t\n', 'metaphlan'),
+           'metaphlan2': ('#SampleID\tMetaphlan2_Analysis\nk__Bacteria\t100.0\n', 'metaphlan'),
+           'bracken': ('name\ttaxonomy_id\ttaxonomy_lvl\tkraken_assigned_reads\tadded_reads\tnew_est_reads\tfraction_total_reads\n'
+                       'Escherichia coli\t562\tS\t100\t20\t120\t1.0\n', 'bracken'),
+           'kaiju raw': ('C\tread_1\t562\nU\tread_2\t0\n', 'kaiju raw'),
+           'kaiju raw -v': ('U\tread_2\t0\nC\tread_1\t562\t12.5\t562,\tMKV\n', 'kaiju raw'),
+           'unknown': ('some\nother\nfile\n', None)}
+
+@pytest.mark.parametrize('sample', sorted(SAMPLES))
+def test_detect_input_type(tmp_path, sample):
+    content, input_type = SAMPLES[sample]
+    (tmp_path / 'sample.txt').write_text(content)
+    assert detect_input_type(str(tmp_path / 'sample.txt')) == input_type
+
+@pytest.mark.parametrize('opener', [open, gzip.open, bz2.open])
+def test_detect_reports(tmp_path, opener):
+    ## the file content is sniffed, through the compression and whatever the file name
+    counts = KAIJU_SAMPLES['sample0']
+    assert detect_input_type(write_kraken2_report(tmp_path / 'sample.txt', counts, opener=opener)) == 'kraken2'
+    assert detect_input_type(write_kraken2_report(tmp_path / 'sample.txt', counts, minimizer=True, opener=opener)) == 'kraken2'
+    with opener(str(tmp_path / 'sample.txt'), 'wt') as sample:
+        sample.write(open(write_kaiju_sample(tmp_path / 'sample.out', counts)).read())
+    assert detect_input_type(str(tmp_path / 'sample.txt')) == 'kaiju'
+
+def test_auto_folder(tmp_path, kaiju_folder, ncbi):
+    ## a folder mixing kaiju and kraken2 samples
+    write_kraken2_report(tmp_path / 'kaiju' / 'sample2.out', KAIJU_SAMPLES['sample1'])
+    data = OTUnest(ncbi=ncbi).build_from_folder(kaiju_folder, 'auto', extension='.out')
+    assert data.loc['sample2'].equals(data.loc['sample1'].rename('sample2'))
@@ -0,0 +1,82 @@
+import gzip
+from motupy.dataprocessing import kaiju_output
+from motupy.dataprocessing.kaiju_output import read_kj, read_kj_raw, read_old_kj, read_old_kjV2, resolve_lineage_names
+from conftest import KAIJU_SAMPLES, write_kaiju_sample
+
+ECOLI = 'Bacteria\tProteobacteria\tGammaproteobacteria\tEnterobacterales\tEnterobacteriaceae\tEscherichia\tEscherichia coli'
+SHIGELLA = 'Bacteria\tProteobacteria\tGammaproteobacteria\tEnterobacterales\tEnterobacteriaceae\tShigella\tShigella dysenteriae'
+
+def test_old_kaiju(tmp_path, ncbi):
+    path = tmp_path / 'sample.out'
+    path.write_text('kaiju summary\n'
+                    '100\t%s\n'%ECOLI +
+                    '20\t%s\n'%SHIGELLA +
+                    '7\tBacteria\tProteobacteria\tNot a genus\n'
+                    '3\tno such\ttaxon\n'
+                    '-------\n')
+    assert read_old_kj(str(path), ncbi=ncbi) == {562: 100, 622: 20, 1224: 7}
+    assert read_old_kj(str(path), artifact_threshold=10, ncbi=ncbi) == {562: 100, 622: 20}
+
+def test_old_kaiju_v2(tmp_path, ncbi):
+    path = tmp_path / 'sample.out'
+    path.write_text('file\tpercent\treads\ttaxon_id\ttaxon_name\n'
+                    '-------------------------------------------\n'
+                    'sample.out\t80.0\t100\t562\t%s;\n'%ECOLI.replace('\t', ';') +
+                    'sample.out\t15.0\t20\tNA\t%s;\n'%SHIGELLA.replace('\t', ';') +
+                    'sample.out\t5.0\t6\tNA\tunclassified\n')
+    ## the taxon id column is not needed, the lineage names are resolved
+    assert read_old_kjV2(str(path), ncbi=ncbi) == {562: 100, 622: 20}
+
+def test_names_translated_once_per_file(tmp_path, counting_ncbi, monkeypatch):
+    monkeypatch.setattr(kaiju_output, 'STREAM_CHUNK_SIZE', 2)
+    path = tmp_path / 'sample.out'
+    path.write_text(''.join('%d\t%s\n'%(count, lineage) for count, lineage in [(1, ECOLI), (2, SHIGELLA), (3, ECOLI), (4, SHIGELLA), (5, 'no such\ttaxon'), (6, 'no such\ttaxon')]))
+
+    assert list(kaiju_output.stream_old_kj(str(path), ncbi=counting_ncbi)) == [(562, 1), (622, 2), (562, 3), (622, 4)]
+    names = counting_ncbi.translated_names
+    assert len(names) == len(set(names))
+    assert set(names) == set(ECOLI.split('\t')) | set(SHIGELLA.split('\t')) | {'no such', 'taxon'}
+
+def legacy_lineage_taxid(lineage, ncbi):
+    """ the former per row walk, one get_name_translator() call per name until one is found """
+    for name in reversed(lineage):
+        taxids = ncbi.get_name_translator([name])
+        if taxids:
+            return taxids[name][0]
+    return None
+
+def test_resolve_lineage_names(ncbi, counting_ncbi):
+    lineages = [tuple(ECOLI.split('\t')), tuple(SHIGELLA.split('\t')), tuple(ECOLI.split('\t')),
+                ('Bacteria', 'Proteobacteria', 'Not a genus'), ('Bacteria', 'bacterium COLI'), ('ESCHERICHIA coli',),
+                ('Eukaryota', 'Phasmida', 'Bacillus rossius', 'Bacillus rossius redtenbacheri'), ('no such', 'taxon')]
+    translated = {}
+    assert resolve_lineage_names(lineages, counting_ncbi, translated) == [legacy_lineage_taxid(lineage, ncbi) for lineage in lineages]
+    assert resolve_lineage_names(lineages, counting_ncbi, translated)[-3:] == [562, 13132, None]
+
+    names = counting_ncbi.translated_names ## the second call found every name in translated
+    assert sorted(names) == sorted({name for lineage in lineages for name in lineage})
+    assert translated['Not a genus'] is None and translated['bacterium COLI'] == 562
+
+def write_raw_sample(path, counts, opener=open):
+    with opener(str(path), 'wt') as raw_file:
+        for taxid, count in counts.items():
+            for read in range(count): ## -v output has the score, the matching taxa id and sequences after the taxa id
+                raw_file.write('C\tread_%d_%d\t%d\t%s\n'%(taxid, read, taxid, '' if read % 2 else '\t12.5\t%d,%d\tMKV"Q' % (taxid, taxid)))
+            raw_file.write('U\tunclassified_%d\t0\n'%taxid)
+    return str(path)
+
+def test_raw_matches_summary(tmp_path, monkeypatch):
+    monkeypatch.setattr(kaiju_output, 'RAW_CHUNK_SIZE', 7) ## counts summed across chunks
+    counts = KAIJU_SAMPLES['sample0']
+    summary = read_kj(write_kaiju_sample(tmp_path / 'sample.out', counts))
+    assert summary == counts
+    assert read_kj_raw(write_raw_sample(tmp_path / 'sample.kaiju', counts)) == summary
+    assert read_kj_raw(write_raw_sample(tmp_path / 'sample.kaiju.gz', counts, gzip.open)) == summary
+    assert read_kj_raw(str(tmp_path / 'sample.kaiju'), artifact_threshold=10) == {taxid: count for taxid, count in counts.items() if count > 10}
+    assert list(kaiju_output.stream_kj_raw(str(tmp_path / 'sample.kaiju'))) == sorted(counts.items())
+
+def test_raw_empty(tmp_path):
+    (tmp_path / 'empty.kaiju').write_text('')
+    (tmp_path / 'unclassified.kaiju').write_text('U\tread_1\t0\n')
+    assert read_kj_raw(str(tmp_path / 'empty.kaiju')) == {}
+    assert read_kj_raw(str(tmp_path / 'unclassified.kaiju')) == {}
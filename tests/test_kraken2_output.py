@@ -0,0 +1,73 @@
+import gzip
+import numpy as np
+from motupy.dataprocessing.OTUnest import OTUnest
+from motupy.dataprocessing.kraken2_output import read_kraken2, read_bracken
+from motupy.dataprocessing.TaxonomyIndex import BASIC_RANKS
+from conftest import TAXONOMY_ROWS, KAIJU_SAMPLES, write_kaiju_sample
+
+RANK_CODES = {'superkingdom': 'D', 'kingdom': 'K', 'phylum': 'P', 'class': 'C', 'order': 'O',
+              'family': 'F', 'genus': 'G', 'species': 'S', 'strain': 'S1'}
+
+def write_kraken2_report(path, counts, minimizer=False, opener=open):
+    """ kraken2 --report of the read counts, the clades are laid out depth first from the conftest taxonomy """
+    children = {}
+    for taxid, parent, name, rank in TAXONOMY_ROWS:
+        if taxid != parent:
+            children.setdefault(parent, []).append(taxid)
+    rows = {taxid: (name, rank) for taxid, _, name, rank in TAXONOMY_ROWS}
+    clade = {}
+    def clade_reads(taxid):
+        clade[taxid] = counts.get(taxid, 0) + sum(clade_reads(child) for child in children.get(taxid, []))
+        return clade[taxid]
+    total = clade_reads(1) + 5
+
+    lines = ['%.2f\t5\t5\t%sU\t0\tunclassified'%(500/total, '0\t0\t' if minimizer else '')]
+    def write_rows(taxid, depth, code):
+        if clade[taxid] == 0:
+            return
+        name, rank = rows[taxid]
+        ## no rank clades get the numbered code of their parent rank, e.g. 'R1' for cellular organisms
+        code = 'R' if taxid == 1 else RANK_CODES.get(rank, code[0]+str(int(code[1:] or 0)+1))
+        lines.append('%.2f\t%d\t%d\t%s%s\t%d\t%s%s'%(100*clade[taxid]/total, clade[taxid], counts.get(taxid, 0), '0\t0\t' if minimizer else '', code, taxid, '  '*depth, name))
+        for child in children.get(taxid, []):
+            write_rows(child, depth+1, code)
+    write_rows(1, 0, None)
+    with opener(str(path), 'wt') as report:
+        report.write('\n'.join(lines)+'\n')
+    return str(path)
+
+def test_kraken2_report(tmp_path, ncbi):
+    counts = KAIJU_SAMPLES['sample0']
+    for minimizer in [False, True]:
+        reads, lineages = read_kraken2(write_kraken2_report(tmp_path / 'sample.kreport', counts, minimizer))
+        assert reads == counts
+        for taxid in counts:
+            ## the lineages built from the indentation are the taxonomy lineages
+            assert lineages[taxid] == tuple(ncbi.resolve_lineages([taxid], BASIC_RANKS)[0])
+        assert 0 not in lineages and lineages[1] == (0,)*len(BASIC_RANKS)
+
+    reads, _ = read_kraken2(write_kraken2_report(tmp_path / 'sample.kreport.gz', counts, opener=gzip.open), artifact_threshold=10)
+    assert reads == {taxid: count for taxid, count in counts.items() if count > 10}
+
+def test_kraken2_matches_kaiju(tmp_path, ncbi):
+    for folder, writer in [('kaiju', write_kaiju_sample), ('kraken2', write_kraken2_report)]:
+        (tmp_path / folder).mkdir()
+        for sample_id, counts in KAIJU_SAMPLES.items():
+            writer(tmp_path / folder / (sample_id+'.out'), counts)
+
+    for kwargs in [dict(), dict(make_clade_relative=False, cumulate=True)]:
+        ## the report lineages, not the taxonomy, cumulate the kraken2 samples
+        expected = OTUnest(ncbi=ncbi).build_from_folder(str(tmp_path / 'kaiju'), 'kaiju', extension='.out', **kwargs)
+        data = OTUnest(ncbi=ncbi).build_from_folder(str(tmp_path / 'kraken2'), 'kraken2', extension='.out', **kwargs)
+        data, expected = data.sort_index().sort_index(axis=1), expected.sort_index().sort_index(axis=1)
+        assert list(data.index) == list(expected.index) and list(data.columns) == list(expected.columns)
+        assert np.allclose(data.fillna(0).to_numpy(dtype=float), expected.fillna(0).to_numpy(dtype=float))
+
+def test_bracken(tmp_path):
+    path = tmp_path / 'sample.bracken'
+    path.write_text('name\ttaxonomy_id\ttaxonomy_lvl\tkraken_assigned_reads\tadded_reads\tnew_est_reads\tfraction_total_reads\n'
+                    'Escherichia coli\t562\tS\t100\t20\t120\t0.6\n'
+                    'Shigella dysenteriae\t622\tS\t7\t3\t10\t0.05\n'
+                    'Bacillus subtilis\t1423\tS\t60\t10\t70\t0.35\n')
+    assert read_bracken(str(path)) == {562: 120, 622: 10, 1423: 70}
+    assert read_bracken(str(path), artifact_threshold=10) == {562: 120, 1423: 70}
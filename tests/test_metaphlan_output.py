@@ -0,0 +1,52 @@
+import gzip
+from motupy.dataprocessing.metaphlan_output import read_metaphlan
+
+ECOLI_PATH = 'k__Bacteria|p__Proteobacteria|c__Gammaproteobacteria|o__Enterobacterales|f__Enterobacteriaceae|g__Escherichia|s__Escherichia_coli'
+ECOLI_TAXIDS = '2|1224|1236|91347|543|561|562'
+BACILLUS_BACTERIA = 'k__Bacteria|p__Firmicutes|c__Bacilli|o__Bacillales|f__Bacillaceae|g__Bacillus'
+BACILLUS_INSECT = 'k__Eukaryota|p__Arthropoda|c__Insecta|o__Phasmida|f__Bacillidae|g__Bacillus'
+
+def test_metaphlan3(tmp_path):
+    path = tmp_path / 'sample.mpa.gz'
+    with gzip.open(str(path), 'wt') as profile:
+        profile.write('#mpa_v30_CHOCOPhlAn_201901\n#clade_name\tNCBI_tax_id\trelative_abundance\tadditional_species\n'
+                      'UNKNOWN\t-1\t10.0\t\n'
+                      'k__Bacteria\t2\t90.0\t\n')
+        levels, taxids = ECOLI_PATH.split('|'), ECOLI_TAXIDS.split('|')
+        for depth in range(2, len(levels)+1):
+            profile.write('%s\t%s\t%s\t\n'%('|'.join(levels[:depth]), '|'.join(taxids[:depth]), 60.0 if depth > 5 else 90.0))
+        profile.write('%s|t__SGB1\t%s|\t60.0\t\n'%(ECOLI_PATH, ECOLI_TAXIDS))
+
+    abundance, lineages = read_metaphlan(str(path))
+    assert abundance == {2: 90.0, 1224: 90.0, 1236: 90.0, 91347: 90.0, 543: 90.0, 561: 60.0, 562: 60.0}
+    assert lineages[562] == (2, 1224, 1236, 91347, 543, 561, 562)
+    assert lineages[1236] == (2, 1224, 1236, 0, 0, 0, 0)
+    assert read_metaphlan(str(path), artifact_threshold=70)[0] == {2: 90.0, 1224: 90.0, 1236: 90.0, 91347: 90.0, 543: 90.0}
+
+def test_metaphlan2_names(tmp_path, ncbi):
+    path = tmp_path / 'sample.mpa2'
+    path.write_text('#SampleID\tMetaphlan2_Analysis\n'
+                    'k__Bacteria\t80.0\n'
+                    '%s\t50.0\n'%ECOLI_PATH +
+                    '%s\t30.0\n'%BACILLUS_BACTERIA +
+                    '%s|s__Bacillus_subtilis\t30.0\n'%BACILLUS_BACTERIA +
+                    'k__Eukaryota\t20.0\n'
+                    '%s\t20.0\n'%BACILLUS_INSECT +
+                    'k__Bacteria|g__Unknown_genus\t1.0\n')
+
+    abundance, lineages = read_metaphlan(str(path), ncbi=ncbi)
+    assert abundance == {2: 80.0, 562: 50.0, 1386: 30.0, 1423: 30.0, 2759: 20.0, 55087: 20.0}
+    assert lineages[562] == (2, 1224, 1236, 91347, 543, 561, 562)
+    assert lineages[1386] == (2, 1239, 91061, 1385, 186817, 1386, 0)
+    assert lineages[55087] == (2759, 6656, 50557, 7022, 55090, 55087, 0)
+
+def test_metaphlan2_ambiguous_dropped(tmp_path, ncbi, capsys):
+    path = tmp_path / 'sample.mpa2'
+    path.write_text('k__Bacteria\t80.0\n'
+                    'k__Bacteria|g__Bacillus\t30.0\n'
+                    'k__Unknown|g__Bacillus\t5.0\n' ## no level above tells the two genera apart
+                    'k__Unknown|g__Bacillus|s__Bacillus_subtilis\t5.0\n')
+
+    abundance, _ = read_metaphlan(str(path), ncbi=ncbi)
+    assert abundance == {2: 80.0, 1386: 30.0}
+    assert capsys.readouterr().out.count('[AMBIGUOUS NAME] Bacillus') == 2
@@ -0,0 +1,37 @@
+import importlib
+import subprocess
+import sys
+
+import motupy
+
+
+def test_all_lists_dataprocessing_and_lazy_names():
+    for name in ['OTUdata', 'OTUnest', 'GeneNest', 'TaxonomyIndex', 'timedecay', 'describe', 'utils', 'EDA', 'visualise']:
+        assert name in motupy.__all__
+
+
+def test_helpers_are_private():
+    assert 'importlib' not in motupy.__all__
+    assert 'lazy_names' not in motupy.__all__
+    assert not hasattr(motupy, 'lazy_names')
+    assert not hasattr(motupy, 'importlib')
+    for package in [importlib.import_module('motupy.utils'), importlib.import_module('motupy.timeseries')]:
+        assert not hasattr(package, 'lazy_names') and not hasattr(package, 'importlib')
+        assert all(not name.startswith('_') for name in package.__all__)
+
+
+def test_dir_lists_lazy_names_without_importing_them():
+    names = dir(motupy)
+    assert 'EDA' in names and 'timedecay' in names
+    code = "import sys, motupy; dir(motupy); print('motupy.utils.EDA' in sys.modules, 'motupy.timeseries.timedecay' in sys.modules)"
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert output.split() == ['False', 'False']
+
+
+def test_submodule_import_keeps_the_class():
+    ## importing the submodule of the same name first must not hide the class
+    code = ("import motupy.utils.describe, motupy.utils.mp_methods, motupy; from motupy.utils import describe, utils; import sys; "
+            "print(describe.__name__, utils.__name__, motupy.describe is describe, motupy.utils is utils, "
+            "isinstance(sys.modules['motupy.utils'].describe, type), isinstance(sys.modules['motupy.utils.describe'], type(sys)))")
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert output.split() == ['describe', 'utils', 'True', 'True', 'True', 'True']
@@ -0,0 +1,34 @@
+import numpy as np
+from motupy.dataprocessing.OTUnest import OTUnest
+from motupy.dataprocessing.sparse_matrix import nest_to_csr
+
+def test_nest_to_csr():
+    matrix, sample_ids, features = nest_to_csr({'s0': {562: 3, 2: 5}, 's1': {}, 's2': {1224: 1, 562: 2}})
+    assert list(sample_ids) == ['s0', 's1', 's2'] and list(features) == [2, 562, 1224]
+    assert matrix.dtype == np.int64
+    assert matrix.toarray().tolist() == [[5, 3, 0], [0, 0, 0], [0, 2, 1]]
+
+    matrix, _, features = nest_to_csr({'s0': {'b': '0.5', 'a': '2'}})
+    assert matrix.dtype == np.float64 and list(features) == ['a', 'b']
+    assert matrix.toarray().tolist() == [[2.0, 0.5]]
+
+    matrix, _, features = nest_to_csr({'s0': {}})
+    assert matrix.shape == (1, 0) and len(features) == 0
+
+def test_sparse_matches_dense(kaiju_folder, ncbi):
+    for kwargs in [dict(make_clade_relative=False, cumulate=True), dict()]: ## read counts, then relative abundance
+        nest = OTUnest(ncbi=ncbi)
+        dense = nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', **kwargs).sort_index(axis=1)
+
+        matrix, sample_ids, taxids = nest.to_scipy_sparse()
+        assert list(sample_ids) == list(dense.index) and list(taxids) == list(dense.columns)
+        assert np.allclose(matrix.toarray(), dense.fillna(0).to_numpy(dtype=float))
+
+        data = nest.to_dataframe(sparse=True)
+        assert list(data.columns) == list(dense.columns)
+        assert np.allclose(data.sparse.to_dense().fillna(0).to_numpy(dtype=float), dense.fillna(0).to_numpy(dtype=float))
+    assert data.dtypes.iloc[0].subtype == np.float64
+
+    nest = OTUnest(ncbi=ncbi)
+    nest.build_from_folder(kaiju_folder, 'kaiju', extension='.out', make_clade_relative=False, cumulate=True)
+    assert nest.to_dataframe(sparse=True).dtypes.iloc[0].subtype == np.int64 ## read counts stay integers